@@ -1,7 +1,6 @@
 from typing import Annotated, List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from datetime import date
 import os
 import aiohttp
@@ -11,12 +10,17 @@ from pydantic import BaseModel
 from app.models.user_models import User
 from app.schemas.schemas import ProductTreeNode, ReviewResponse, ReviewBulkCreate, ChangeChartResponse, ReviewsResponse, ReviewAnalysisResponse
 from app.repositories.repositories import ProductRepository, ClusterRepository, ReviewsForModelRepository
-from app.models.models import Product
 from app.services.parser_service import ParserService
 from app.models.user_models import UserRole
-from app.core.dependencies import get_current_user, DbSession, StatsServiceDep, get_db
+from app.core.dependencies import (
+    get_current_user, DbSession, ReadDbSession, StatsServiceDep, DashboardCacheDep, DashboardPageServiceDep,
+    JsonResponderDep, get_read_db, conditional_get
+)
 from app.services.stats_service import StatsService
 from app.schemas.schemas import ProductStatsResponse, MonthlyPieChartResponse, SmallBarChartsResponse, ClusterResponse, TonalityStackedBarsResponse
+from app.schemas.schemas import DashboardPageRequest, DashboardPageResponse
+from app.schemas.auth_schema import DashboardConfig
+from app.repositories.user_repositories import UserRepository
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "http://158.160.25.202:8002")
 ML_PREDICT_ENDPOINT = f"{ML_SERVICE_URL}/predict"
 ML_TIMEOUT = int(os.getenv("ML_TIMEOUT", 5))
@@ -26,16 +30,20 @@ logger = logging.getLogger(__name__)
 
 dashboards_router = APIRouter(prefix="/api/v1/dashboards", tags=["dashboards"])
 
-@dashboards_router.get("/product-stats", response_model=List[ProductStatsResponse])
+@dashboards_router.get("/product-stats", response_model=List[ProductStatsResponse], dependencies=[Depends(conditional_get)])
 async def get_product_stats(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
     start_date2: str = Query(..., description="Начальная дата второго периода в формате YYYY-MM-DD"),
     end_date2: str = Query(..., description="Конечная дата второго периода в формате YYYY-MM-DD"),
     product_id: Optional[int] = Query(None, description="ID продукта для фильтрации"),
-    source: Optional[str] = Query(None, description="Фильтр по источнику отзывов (например, 'Banki.ru', 'App Store', 'Google Play')")
+    source: Optional[str] = Query(None, description="Фильтр по источнику отзывов (например, 'Banki.ru', 'App Store', 'Google Play')"),
+    page: int = Query(0, ge=0, description="Номер страницы списка продуктов"),
+    size: int = Query(100, ge=1, le=500, description="Размер страницы списка продуктов")
 ):
     """
     Получение статистики по продуктам: количество отзывов, средний рейтинг, распределение по тональности.
@@ -48,6 +56,7 @@ async def get_product_stats(
       - `start_date2`: Начальная дата второго периода (опционально, формат YYYY-MM-DD, например, 2025-07-01).
       - `end_date2`: Конечная дата второго периода (опционально, формат YYYY-MM-DD, например, 2025-12-31).
       - `product_id`: ID продукта для фильтрации (опционально, например, 3 для карты "Мир"; если не указан, агрегируется по всем продуктам).
+      - `page`, `size`: Пагинация списка продуктов, отсортированного по названию (по умолчанию 0 и 100).
     - **Тело запроса**: Не требуется (GET-запрос).
 
     **Что получите в ответе**:
@@ -67,24 +76,28 @@ async def get_product_stats(
         ```
     """
     try:
-        data = await stats_service.get_product_stats(db, start_date, end_date, start_date2, end_date2, source=source)
-        if product_id:
-            result = await db.execute(select(Product).where(Product.id == product_id))
-            product = result.scalar_one_or_none()
-            if not product:
-                return []
-            data = [stat for stat in data if stat["product_name"] == product.name]
-        return [ProductStatsResponse(**stat) for stat in data]
+        data = await cache.get_or_compute(
+            "product-stats",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date,
+                 start_date2=start_date2, end_date2=end_date2, source=source, page=page, size=size),
+            lambda: stats_service.get_product_stats(
+                db, start_date, end_date, start_date2, end_date2, source=source,
+                product_id=product_id, page=page, size=size
+            ),
+        )
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении статистики продуктов: {str(e)}")
 
 
-@dashboards_router.get("/monthly-review-count", response_model=Dict[str, List[Dict[str, Any]]])
+@dashboards_router.get("/monthly-review-count", response_model=Dict[str, List[Dict[str, Any]]], dependencies=[Depends(conditional_get)])
 async def get_monthly_review_count(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(...),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
@@ -94,19 +107,66 @@ async def get_monthly_review_count(
     source: Optional[str] = Query(None, description="Фильтр по источнику отзывов (например, 'Banki.ru', 'App Store', 'Google Play')")
 ):
     try:
-        data = await stats_service.get_monthly_review_count(
-            db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source=source)
-        return data
+        data = await cache.get_or_compute(
+            "monthly-review-count",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date, start_date2=start_date2,
+                 end_date2=end_date2, aggregation_type=aggregation_type, source=source),
+            lambda: stats_service.get_monthly_review_count(
+                db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source=source),
+        )
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении количества месячных отзывов: {str(e)}")
     
 
-@dashboards_router.get("/bar_chart_changes", response_model=Dict[str, List[Dict[str, Any]]])
+@dashboards_router.get("/period-comparison", response_model=Dict[str, List[Dict[str, Any]]], dependencies=[Depends(conditional_get)])
+async def get_period_comparison(
+    db: ReadDbSession,
+    stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
+    product_id: int = Query(...),
+    periods: List[str] = Query(..., description="Периоды в формате START:END (YYYY-MM-DD или YYYY-MM для месячной агрегации); первый период — базовый"),
+    aggregation_type: str = Query(..., description="Тип агрегации: 'month', 'week', или 'day'"),
+    source: Optional[str] = Query(None, description="Фильтр по источнику отзывов (например, 'Banki.ru', 'App Store', 'Google Play')")
+):
+    """
+    Сравнение нескольких периодов одним запросом, например `periods=2025-06:2025-06&periods=2025-05:2025-05&periods=2024-06:2024-06`.
+
+    Возвращает:
+    - `periods`: для каждого периода список интервалов с общим количеством отзывов и тональностью.
+    - `changes`: для каждого периода кроме первого — изменения первого периода относительно него в процентах.
+    """
+    try:
+        if len(periods) > 12:
+            raise ValueError("Можно сравнить не больше 12 периодов")
+        parsed_periods = []
+        for period in periods:
+            bounds = period.split(":")
+            if len(bounds) != 2:
+                raise ValueError(f"Неправильный формат периода {period}. Ожидается START:END")
+            parsed_periods.append((bounds[0], bounds[1]))
+        data = await cache.get_or_compute(
+            "period-comparison",
+            dict(product_id=product_id, periods=tuple(parsed_periods),
+                 aggregation_type=aggregation_type, source=source),
+            lambda: stats_service.compare_periods(db, product_id, parsed_periods, aggregation_type, source=source),
+        )
+        return respond(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при сравнении периодов: {str(e)}")
+
+
+@dashboards_router.get("/bar_chart_changes", response_model=Dict[str, List[Dict[str, Any]]], dependencies=[Depends(conditional_get)])
 async def get_bar_chart_changes(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(...),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
@@ -116,19 +176,26 @@ async def get_bar_chart_changes(
     source: Optional[str] = Query(None, description="Фильтр по источнику отзывов (например, 'Banki.ru', 'App Store', 'Google Play')"),
 ):
     try:
-        data = await stats_service.get_bar_chart_changes(
-            db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source=source
+        data = await cache.get_or_compute(
+            "bar_chart_changes",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date, start_date2=start_date2,
+                 end_date2=end_date2, aggregation_type=aggregation_type, source=source),
+            lambda: stats_service.get_bar_chart_changes(
+                db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source=source
+            ),
         )
-        return data
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении количества месячных отзывов: {str(e)}")
     
-@dashboards_router.get("/monthly-pie-chart", response_model=MonthlyPieChartResponse)
+@dashboards_router.get("/monthly-pie-chart", response_model=MonthlyPieChartResponse, dependencies=[Depends(conditional_get)])
 async def get_monthly_pie_chart(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(..., description="ID продукта для фильтрации"),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD или YYYY-MM"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD или YYYY-MM"),
@@ -151,34 +218,47 @@ async def get_monthly_pie_chart(
     - JSON объект с 'period1', 'period2', и 'changes', содержащий метки, процентные данные, цвета и общее количество отзывов или изменения в процентных пунктах.
     """
     try:
-        data = await stats_service.get_monthly_pie_chart(
-            db, product_id, start_date, end_date, start_date2, end_date2, source
+        data = await cache.get_or_compute(
+            "monthly-pie-chart",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date,
+                 start_date2=start_date2, end_date2=end_date2, source=source),
+            lambda: stats_service.get_monthly_pie_chart(
+                db, product_id, start_date, end_date, start_date2, end_date2, source
+            ),
         )
-        return data
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении данных круговой диаграммы: {str(e)}")
 
-@dashboards_router.get("/small-bar-charts", response_model=List[SmallBarChartsResponse])
+@dashboards_router.get("/small-bar-charts", response_model=List[SmallBarChartsResponse], dependencies=[Depends(conditional_get)])
 async def get_small_bar_charts(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(...),
     start_date: date = Query(...),
     end_date: date = Query(...),
     cluster_id: Optional[int] = Query(None),
 ):
     try:
-        data = await stats_service.get_small_bar_charts(db, product_id, start_date, end_date, None, cluster_id)
-        return data
+        data = await cache.get_or_compute(
+            "small-bar-charts",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date, cluster_id=cluster_id),
+            lambda: stats_service.get_small_bar_charts(db, product_id, start_date, end_date, None, cluster_id),
+        )
+        return respond(data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении данных малых столбчатых диаграмм: {str(e)}")
 
-@dashboards_router.get("/monthly-stacked-bars", response_model=Dict[str, List[Dict[str, Any]]])
+@dashboards_router.get("/monthly-stacked-bars", response_model=Dict[str, List[Dict[str, Any]]], dependencies=[Depends(conditional_get)])
 async def get_monthly_stacked_bars(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(..., description="ID продукта для фильтрации"),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
@@ -205,19 +285,26 @@ async def get_monthly_stacked_bars(
     - JSON объект с 'period1', 'period2', и 'changes' списками, содержащими даты агрегации, количество отзывов по кластерам и процентные изменения.
     """
     try:
-        data = await stats_service.get_monthly_stacked_bars(
-            db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source, cluster_id
+        data = await cache.get_or_compute(
+            "monthly-stacked-bars",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date, start_date2=start_date2,
+                 end_date2=end_date2, aggregation_type=aggregation_type, source=source, cluster_id=cluster_id),
+            lambda: stats_service.get_monthly_stacked_bars(
+                db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source, cluster_id
+            ),
         )
-        return data
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении данных stacked bars: {str(e)}")
 
-@dashboards_router.get("/tonality-stacked-bars", response_model=TonalityStackedBarsResponse)
+@dashboards_router.get("/tonality-stacked-bars", response_model=TonalityStackedBarsResponse, dependencies=[Depends(conditional_get)])
 async def get_tonality_stacked_bars(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(...),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD или YYYY-MM для месячной агрегации"),
@@ -267,19 +354,26 @@ async def get_tonality_stacked_bars(
         ```
     """
     try:
-        data = await stats_service.get_tonality_stacked_bars(
-            db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source=source
+        data = await cache.get_or_compute(
+            "tonality-stacked-bars",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date, start_date2=start_date2,
+                 end_date2=end_date2, aggregation_type=aggregation_type, source=source),
+            lambda: stats_service.get_tonality_stacked_bars(
+                db, product_id, start_date, end_date, start_date2, end_date2, aggregation_type, source=source
+            ),
         )
-        return data
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении stacked bars по тональности: {str(e)}")
 
-@dashboards_router.get("/line-and-bar-pie-chart", response_model=MonthlyPieChartResponse)
+@dashboards_router.get("/line-and-bar-pie-chart", response_model=MonthlyPieChartResponse, dependencies=[Depends(conditional_get)])
 async def get_line_and_bar_pie_chart(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(..., description="ID продукта для фильтрации"),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
@@ -325,8 +419,15 @@ async def get_line_and_bar_pie_chart(
         ```
     """
     try:
-        data = await stats_service.get_tonality_pie_chart(db, product_id, start_date, end_date, start_date2, end_date2, source)
-        return data
+        data = await cache.get_or_compute(
+            "line-and-bar-pie-chart",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date,
+                 start_date2=start_date2, end_date2=end_date2, source=source),
+            lambda: stats_service.get_tonality_pie_chart(
+                db, product_id, start_date, end_date, start_date2, end_date2, source
+            ),
+        )
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -338,10 +439,11 @@ async def get_line_and_bar_pie_chart(
     response_model=List[ProductTreeNode],
     summary="Получить дерево иерархии продуктов (публичное)",
     description="Получить все продукты в виде иерархической древовидной структуры (категории → подкатегории → продукты) без аутентификации или параметров.",
-    response_description="Список корневых узлов, представляющих иерархию продуктов."
+    response_description="Список корневых узлов, представляющих иерархию продуктов.",
+    dependencies=[Depends(conditional_get)],
 )
 async def get_public_product_tree(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     product_repo: ProductRepository = Depends(lambda: ProductRepository())
 ):
     """
@@ -353,10 +455,12 @@ async def get_public_product_tree(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Не удалось получить дерево продуктов")
 
-@dashboards_router.get("/change-chart", response_model=ChangeChartResponse)
+@dashboards_router.get("/change-chart", response_model=ChangeChartResponse, dependencies=[Depends(conditional_get)])
 async def get_change_chart(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(..., description="ID продукта для фильтрации"),
     start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
     end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
@@ -388,17 +492,26 @@ async def get_change_chart(
         ```
     """
     try:
-        data = await stats_service.get_change_chart(db, product_id, start_date, end_date, start_date2, end_date2, source)
-        return data
+        data = await cache.get_or_compute(
+            "change-chart",
+            dict(product_id=product_id, start_date=start_date, end_date=end_date,
+                 start_date2=start_date2, end_date2=end_date2, source=source),
+            lambda: stats_service.get_change_chart(
+                db, product_id, start_date, end_date, start_date2, end_date2, source
+            ),
+        )
+        return respond(data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении графика изменений: {str(e)}")
     
-@dashboards_router.get("/reviews", response_model=ReviewsResponse)
+@dashboards_router.get("/reviews", response_model=ReviewsResponse, dependencies=[Depends(conditional_get)])
 async def get_reviews(
-    db: DbSession,
+    db: ReadDbSession,
     stats_service: StatsServiceDep,
+    cache: DashboardCacheDep,
+    respond: JsonResponderDep,
     product_id: int = Query(...),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
@@ -408,9 +521,15 @@ async def get_reviews(
     order_by: str = Query("desc", description="Сортировка по дате: 'asc' или 'desc'"),
     page: int = Query(0, ge=0),
     size: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы; если передан, page игнорируется"),
+    exact_total: bool = Query(False, description="Посчитать точное количество отзывов вместо оценки"),
 ):
     """
     Получение списка отзывов по продукту с опциональной фильтрацией по кластеру, дате, источнику и тональности, с пагинацией.
+
+    Для бесконечной прокрутки передавайте `cursor` из `next_cursor` предыдущего ответа: страница берётся по ключу
+    (date, id) и не замедляется с глубиной. Если `total_is_estimate` = true, `total` — оценка;
+    точное значение можно запросить через `exact_total=true` (оно кэшируется до следующей загрузки отзывов).
     """
     try:
         if order_by not in ["asc", "desc"]:
@@ -420,11 +539,23 @@ async def get_reviews(
             raise HTTPException(status_code=400, detail="sentiment must be 'positive', 'neutral', or 'negative'")
             
         data = await stats_service.get_reviews(
-            db, product_id, start_date, end_date, cluster_id, source, sentiment, order_by, page, size
+            db, product_id, start_date, end_date, cluster_id, source, sentiment, order_by, page, size, cursor
         )
-        return data
+        if exact_total and data["total_is_estimate"]:
+            data["total"] = await cache.get_or_compute(
+                "reviews-total",
+                dict(product_id=product_id, start_date=start_date, end_date=end_date,
+                     cluster_id=cluster_id, source=source, sentiment=sentiment),
+                lambda: stats_service.count_reviews(
+                    db, product_id, start_date, end_date, cluster_id, source, sentiment
+                ),
+            )
+            data["total_is_estimate"] = False
+        return respond(data)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении отзывов: {str(e)}")
     
@@ -433,10 +564,11 @@ async def get_reviews(
     response_model=List[ClusterResponse],
     summary="Получить список кластеров (публичное)",
     description="Получить все кластеры без аутентификации.",
-    response_description="Список кластеров с их ID, названиями и описаниями."
+    response_description="Список кластеров с их ID, названиями и описаниями.",
+    dependencies=[Depends(conditional_get)],
 )
 async def get_clusters(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     cluster_repo: ClusterRepository = Depends(lambda: ClusterRepository())
 ):
     """
@@ -448,6 +580,57 @@ async def get_clusters(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Не удалось получить кластеры")
     
+@dashboards_router.get(
+    "/cache-stats",
+    response_model=Dict[str, Any],
+    summary="Статистика кэша дашбордов",
+    description="Размер кэша результатов дашбордов, счётчики попаданий и промахов и текущая версия данных.",
+)
+async def get_dashboard_cache_stats(cache: DashboardCacheDep):
+    """
+    Получить состояние кэша результатов дашбордов.
+    """
+    return cache.stats()
+
+@dashboards_router.post(
+    "/page",
+    response_model=DashboardPageResponse,
+    summary="Получить данные всех графиков страницы дашборда",
+    description="Расчёт всех графиков страницы за один запрос: по переданной конфигурации страницы или по id страницы из конфига пользователя.",
+    response_description="Данные каждого графика страницы или текст ошибки для графика."
+)
+async def render_dashboard_page(
+    request_data: DashboardPageRequest,
+    db: DbSession,
+    page_service: DashboardPageServiceDep,
+    respond: JsonResponderDep,
+    current_user: User = Depends(get_current_user),
+    user_repo: UserRepository = Depends(lambda: UserRepository())
+):
+    """
+    Получить данные для всех графиков страницы дашборда одним запросом.
+
+    **Что передавать**:
+    - **Тело запроса** (JSON): либо `page` — конфигурация страницы (`PageConfig`),
+      либо `page_id` — id страницы из сохранённого конфига текущего пользователя.
+
+    **Что получите в ответе**:
+    - **Код 200 OK**: `page_id`, `name` и список `charts`, где у каждого графика есть `id`, `name`, `type`,
+      `data` (тот же ответ, что у отдельного эндпоинта графика) и `error` (если график посчитать не удалось).
+    - **Код 404 Not Found**: Если страница с `page_id` не найдена в конфиге пользователя.
+    """
+    page = request_data.page
+    if page is None:
+        config = await user_repo.get_dashboard_config(db, current_user.id)
+        pages = DashboardConfig(**config).pages if config else []
+        page = next((p for p in pages if p.id == request_data.page_id), None)
+        if page is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Страница не найдена")
+    try:
+        return respond(await page_service.render_page(page))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при расчёте страницы дашборда: {str(e)}")
+
 @dashboards_router.post(
     "/reviews",
     response_model=Dict[str, Any],
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from typing import List, Dict, Any
+import asyncio
+from fastapi import APIRouter, Depends, Query, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional
 from datetime import date
 from fastapi import Request
 from app.services.notification_service import NotificationService
-from app.core.dependencies import get_current_user, get_db
+from app.core.dependencies import get_current_user, get_db, NotificationHubDep
 from app.models.user_models import User
 from app.schemas.schemas import NotificationResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -32,6 +34,76 @@ async def get_notifications(
     notifications = await notification_service.get_user_notifications(session, current_user.id, is_read)
     return notifications
 
+def _sse_event(notification: Any) -> str:
+    """Событие SSE с уведомлением; id события — id уведомления, по нему клиент переподключается через Last-Event-ID"""
+    data = NotificationResponse.model_validate(notification)
+    return f"id: {data.id}\nevent: notification\ndata: {data.model_dump_json()}\n\n"
+
+@notifications_router.get("/stream", response_class=StreamingResponse)
+async def stream_notifications(
+    request: Request,
+    hub: NotificationHubDep,
+    last_event_id: Optional[str] = Header(None, description="ID последнего полученного уведомления"),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+    notification_service: NotificationService = Depends(get_notification_service),
+):
+    """
+    Поток новых уведомлений пользователя (Server-Sent Events) вместо опроса списка уведомлений.
+    
+    **Параметры**:
+    - `Last-Event-ID`: При переподключении сначала отдаются уведомления, созданные после указанного
+    
+    **Возвращает**:
+    - Поток событий `notification` с уведомлением в data; при простое — комментарии-heartbeat
+    """
+    user_id = current_user.id
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    heartbeat_seconds = request.app.state.settings.notification_stream_heartbeat_seconds
+    database_manager = request.app.state.database_manager
+    # Сессия проверки токена не нужна потоку: соединение возвращается в пул до начала трансляции
+    await session.close()
+
+    async def load_after(after: int) -> List[Any]:
+        """Уведомления пользователя новее after из таблицы, все страницы"""
+        notifications = []
+        async with database_manager.create_session() as stream_session:
+            while True:
+                page = await notification_service.get_notifications_after(stream_session, user_id, after)
+                notifications.extend(page)
+                if not page:
+                    return notifications
+                after = page[-1].id
+
+    async def events():
+        async with hub.subscribe(user_id) as queue:
+            yield f"retry: {int(heartbeat_seconds * 1000)}\n\n"
+            last_sent = after_id
+            if after_id is not None:
+                # Подписка уже оформлена, поэтому пропущенные уведомления не теряются между запросом и потоком
+                for notification in await load_after(after_id):
+                    yield _sse_event(notification)
+                    last_sent = notification.id
+            while not await request.is_disconnected():
+                try:
+                    signals = [await asyncio.wait_for(queue.get(), heartbeat_seconds)]
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                while not queue.empty():
+                    signals.append(queue.get_nowait())
+                # Сигнал несёт только id: уведомления читаются из таблицы, как и при переподключении,
+                # поэтому событие с одним id всегда содержит одни и те же данные
+                after = last_sent if last_sent is not None else min(signal["id"] for signal in signals) - 1
+                for notification in await load_after(after):
+                    yield _sse_event(notification)
+                    last_sent = notification.id
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @notifications_router.patch("/{notification_id}", response_model=Dict[str, str])
 async def mark_notification_as_read(
     notification_id: int,
@@ -0,0 +1,105 @@
+import logging
+import time
+from itertools import chain
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, от которых зависят ответы дашбордов: отзывы и их связи,
+# дерево продуктов и кластеры, а также построенные из них агрегаты
+DASHBOARD_SOURCE_TABLES = frozenset({
+    "reviews", "review_products", "review_clusters",
+    "products", "product_closure", "clusters",
+    "review_daily_facts", "monthly_stats", "cluster_stats",
+})
+
+_CHANGED_FLAG = "dashboard_data_changed"
+
+# Число строк data_watermark: параллельные коммиты увеличивают разные строки и не ждут блокировки одной
+DATA_WATERMARK_SLOTS = 16
+
+
+class DataVersion:
+    """
+    Процессный счётчик версии данных дашбордов.
+    Увеличивается после каждого коммита, изменившего таблицы из DASHBOARD_SOURCE_TABLES;
+    кэши включают версию в ключ и не отдают результаты, посчитанные до изменения.
+    Общая для всех процессов версия хранится в таблице data_watermark и увеличивается тем же коммитом
+    (см. DataWatermark).
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._bumped_at = float("-inf")
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        self._value += 1
+        self._bumped_at = time.monotonic()
+        logger.debug(f"Версия данных дашбордов увеличена до {self._value}")
+        return self._value
+
+    def changed_within(self, seconds: float) -> bool:
+        """Менялись ли данные за последние seconds секунд"""
+        return time.monotonic() - self._bumped_at < seconds
+
+
+data_version = DataVersion()
+
+
+def _statement_table_name(statement):
+    table = getattr(statement, "table", None)
+    return getattr(table, "name", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_writes(orm_execute_state):
+    """insert/update/delete через session.execute"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if _statement_table_name(orm_execute_state.statement) in DASHBOARD_SOURCE_TABLES:
+        orm_execute_state.session.info[_CHANGED_FLAG] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_objects(session, flush_context):
+    """Объекты, добавленные, изменённые или удалённые через unit of work"""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if getattr(obj, "__tablename__", None) in DASHBOARD_SOURCE_TABLES:
+            session.info[_CHANGED_FLAG] = True
+            return
+
+
+# Строка выбирается по серверному процессу соединения: одновременные коммиты разных соединений
+# обычно увеличивают разные строки и не выстраиваются в очередь за блокировкой одной строки
+_ADVANCE_WATERMARK = text(
+    "UPDATE data_watermark SET version = version + 1, updated_at = timezone('utc', now()) "
+    "WHERE id = mod(pg_backend_pid(), :slots) + 1"
+).bindparams(slots=DATA_WATERMARK_SLOTS)
+
+
+@event.listens_for(Session, "before_commit")
+def _advance_watermark(session):
+    """
+    Увеличить версию данных в базе в той же транзакции, что и изменения.
+    Изменения, ещё не отправленные в базу, сбрасываются заранее, чтобы флаг изменений был выставлен.
+    """
+    session.flush()
+    if session.info.get(_CHANGED_FLAG):
+        session.execute(_ADVANCE_WATERMARK)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    if session.info.pop(_CHANGED_FLAG, False):
+        data_version.bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop(_CHANGED_FLAG, None)
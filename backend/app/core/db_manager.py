@@ -1,37 +1,88 @@
+import itertools
 import logging
+import time
 from contextlib import asynccontextmanager
+from typing import List, Optional
 
+from sqlalchemy import exc, text
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
+from app.core.data_version import data_version
+from app.core.metrics import TimedAsyncQueuePool, register_pool
+from app.core.sql_metrics import instrument_engine
+
+# Отставание реплики в секундах: 0, если всё полученное WAL уже применено (или база не реплика)
+_REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     """Базовый класс для всех моделей SQLAlchemy"""
     pass
 
 
+class _Replica:
+    """Реплика для чтения и результат её последней проверки"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = None
+        self.sessionmaker = None
+        self.healthy = True
+        self.checked_at = float("-inf")
+
+
 class DatabaseManager:
     """Менеджер для работы с базой данных"""
     
-    def __init__(self, db_url: str):
+    def __init__(
+        self,
+        db_url: str,
+        replica_urls: Optional[List[str]] = None,
+        replica_max_lag_seconds: float = 5.0,
+        replica_check_interval_seconds: float = 5.0,
+        echo: bool = True,
+    ):
         """
         Инициализация менеджера базы данных
         
         Args:
             db_url: URL подключения к базе данных
+            replica_urls: URL реплик для сессий только на чтение
+            replica_max_lag_seconds: Допустимое отставание реплики; более отстающая реплика не используется
+            replica_check_interval_seconds: Как часто перепроверять доступность и отставание реплики
+            echo: Выводить каждый SQL-запрос в лог SQLAlchemy
         """
         self._db_url = db_url
         self._engine = None
         self._sessionmaker = None
+        self._replicas = [_Replica(url) for url in replica_urls or []]
+        self._replica_counter = itertools.count()
+        self._replica_max_lag_seconds = replica_max_lag_seconds
+        self._replica_check_interval_seconds = replica_check_interval_seconds
+        self._echo = echo
 
     async def initialize(self):
         """Инициализация подключения к базе данных и создание таблиц"""
         try:
-            self._engine = create_async_engine(self._db_url, echo=True)
+            self._engine = create_async_engine(self._db_url, echo=self._echo, poolclass=TimedAsyncQueuePool)
+            instrument_engine(self._engine.sync_engine)
+            register_pool("primary", self._engine)
             self._sessionmaker = async_sessionmaker(
                 self._engine, expire_on_commit=False, autoflush=False
             )
             logging.info(f"Успешное подключение к базе данных: {self._db_url}")
+            for number, replica in enumerate(self._replicas):
+                replica.engine = create_async_engine(replica.url, echo=self._echo, poolclass=TimedAsyncQueuePool)
+                instrument_engine(replica.engine.sync_engine)
+                register_pool(f"replica-{number}", replica.engine)
+                replica.sessionmaker = async_sessionmaker(
+                    replica.engine, expire_on_commit=False, autoflush=False
+                )
+                logging.info(f"Подключена реплика для чтения: {replica.engine.url}")
         except Exception as ex:
             logging.error(
                 f"Произошла ошибка при подключении к базе данных {self._db_url}", 
@@ -42,11 +93,15 @@ class DatabaseManager:
         from app.models.user_models import User
         from app.models.models import (
             Product, Review, Cluster, ReviewCluster, MonthlyStats, ClusterStats,
-            Notification, AuditLog, NotificationConfig 
+            Notification, AuditLog, NotificationConfig, ReviewDailyFact, ProductClosure, DataWatermark
         )
 
+        from app.core.migrations import apply_migrations, lock_schema
+
         async with self._engine.begin() as connection:
             try:
+                # Список таблиц читается под блокировкой: иначе параллельный воркер может создать их между чтением и create_all
+                await lock_schema(connection)
                 existing_tables = await connection.run_sync(
                     lambda conn: conn.dialect.get_table_names(conn)
                 )
@@ -54,7 +109,21 @@ class DatabaseManager:
                     await connection.run_sync(Base.metadata.create_all)
                     logging.info("Таблицы базы данных успешно созданы")
                 else:
-                    logging.info("Таблицы базы данных уже существуют, пропускаем создание")
+                    missing_tables = [
+                        table for name, table in Base.metadata.tables.items()
+                        if name not in existing_tables
+                    ]
+                    if missing_tables:
+                        await connection.run_sync(
+                            lambda conn: Base.metadata.create_all(conn, tables=missing_tables)
+                        )
+                        logging.info(
+                            f"Созданы недостающие таблицы: {', '.join(t.name for t in missing_tables)}"
+                        )
+                    else:
+                        logging.info("Таблицы базы данных уже существуют, пропускаем создание")
+
+                await apply_migrations(connection)
             except Exception as ex:
                 logging.error(
                     f"Произошла ошибка при создании таблиц базы данных для {self._db_url}",
@@ -64,6 +133,9 @@ class DatabaseManager:
 
     async def dispose(self):
         """Закрытие подключения к базе данных"""
+        for replica in self._replicas:
+            if replica.engine:
+                await replica.engine.dispose()
         if self._engine:
             await self._engine.dispose()
             logging.info(f"Закрыто подключение к базе данных: {self._db_url}")
@@ -94,6 +166,78 @@ class DatabaseManager:
                 await session.rollback()
                 raise ex
 
+    async def _replica_available(self, replica: _Replica) -> bool:
+        """Доступна ли реплика и укладывается ли её отставание в допуск; результат кэшируется на интервал проверки"""
+        now = time.monotonic()
+        if now - replica.checked_at < self._replica_check_interval_seconds:
+            return replica.healthy
+        replica.checked_at = now
+        try:
+            async with replica.engine.connect() as connection:
+                lag = float((await connection.execute(_REPLICA_LAG_QUERY)).scalar() or 0)
+            replica.healthy = lag <= self._replica_max_lag_seconds
+            if not replica.healthy:
+                logging.warning(f"Реплика {replica.engine.url} отстаёт на {lag:.1f} с, чтение идёт с основной базы")
+        except (exc.DBAPIError, OSError) as ex:
+            replica.healthy = False
+            logging.warning(f"Реплика {replica.engine.url} недоступна, чтение идёт с основной базы", exc_info=ex)
+        return replica.healthy
+
+    async def _choose_read_replica(self) -> Optional[_Replica]:
+        """Следующая по кругу доступная реплика или None"""
+        start = next(self._replica_counter)
+        for offset in range(len(self._replicas)):
+            replica = self._replicas[(start + offset) % len(self._replicas)]
+            if await self._replica_available(replica):
+                return replica
+        return None
+
+    @asynccontextmanager
+    async def create_read_session(self):
+        """
+        Асинхронный контекстный менеджер для сессии только на чтение.
+        Реплики выбираются по кругу; используется основная база, если реплик нет, все они недоступны
+        или отстают, а также пока после записи в этом процессе не прошло время допустимого отставания —
+        чтобы только что записанные данные не читались с реплики устаревшими.
+
+        Yields:
+            AsyncSession: Асинхронная сессия базы данных
+
+        Raises:
+            RuntimeError: Если менеджер не инициализирован
+        """
+        if not self._sessionmaker:
+            raise RuntimeError("DatabaseManager не инициализирован, сначала вызовите initialize()")
+        replica = None
+        if self._replicas and not data_version.changed_within(self._replica_max_lag_seconds):
+            replica = await self._choose_read_replica()
+        sessionmaker = replica.sessionmaker if replica else self._sessionmaker
+        async with sessionmaker() as session:
+            try:
+                yield session
+            except Exception as ex:
+                if replica and isinstance(ex, (exc.DBAPIError, OSError)):
+                    replica.healthy = False
+                    replica.checked_at = time.monotonic()
+                logging.error(
+                    "Произошла ошибка во время сессии чтения. Откат изменений",
+                    exc_info=ex,
+                )
+                await session.rollback()
+                raise ex
+
+    @property
+    def engine(self):
+        """
+        Engine основной базы для соединений вне сессий (например, держащих advisory-блокировку)
+
+        Raises:
+            RuntimeError: Если менеджер не инициализирован
+        """
+        if not self._engine:
+            raise RuntimeError("DatabaseManager не инициализирован, сначала вызовите initialize()")
+        return self._engine
+
     @property
     def async_session(self):
         """
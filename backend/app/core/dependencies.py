@@ -1,9 +1,15 @@
-from typing import Annotated, AsyncGenerator
-from fastapi import Depends, Request, HTTPException
+from typing import Annotated, Any, AsyncGenerator
+from fastapi import Depends, Request, Response, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.db_manager import DatabaseManager
+from app.core.responses import TrustedJSONResponse
+from app.core.http_cache import conditional_headers, is_not_modified, make_etag
+from app.core.notification_hub import NotificationHub
+from app.repositories.repositories import DataWatermarkRepository
 from app.services.auth_services import AuthService, TokenService, PasswordService
 from app.services.stats_service import StatsService
+from app.services.dashboard_cache import DashboardCacheView
+from app.services.dashboard_page_service import DashboardPageService
 from fastapi.security import OAuth2PasswordBearer
 from app.models.user_models import User
 
@@ -23,6 +29,20 @@ async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     async with db.create_session() as session:
         yield session
 
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Зависимость для получения сессии только на чтение: с реплики, если она доступна
+    
+    Args:
+        request: Запрос FastAPI
+    
+    Yields:
+        AsyncSession: Асинхронная сессия базы данных
+    """
+    db: DatabaseManager = request.app.state.database_manager
+    async with db.create_read_session() as session:
+        yield session
+
 def get_auth_service(request: Request) -> AuthService:
     """Получение сервиса аутентификации из состояния приложения"""
     if not hasattr(request.app.state, 'auth_service'):
@@ -35,6 +55,34 @@ def get_stats_service(request: Request) -> StatsService:
         raise HTTPException(status_code=500, detail="Сервис статистики не инициализирован")
     return request.app.state.stats_service
 
+async def get_data_watermark(session: Annotated[AsyncSession, Depends(get_read_db)]) -> Any:
+    """
+    Общая версия данных дашбордов (version, updated_at) из сессии чтения запроса; None до миграции.
+    Читается один раз за запрос: conditional_get и кэш дашбордов получают одно значение.
+    """
+    return await DataWatermarkRepository().get(session)
+
+def get_dashboard_cache(request: Request, watermark: Annotated[Any, Depends(get_data_watermark)]) -> DashboardCacheView:
+    """
+    Получение кэша результатов дашбордов из состояния приложения с версией данных запроса:
+    запись, сделанная другим воркером или скриптом, меняет версию и ключи кэша
+    """
+    if not hasattr(request.app.state, 'dashboard_cache'):
+        raise HTTPException(status_code=500, detail="Кэш дашбордов не инициализирован")
+    return request.app.state.dashboard_cache.at_version(watermark.version if watermark else None)
+
+def get_dashboard_page_service(request: Request) -> DashboardPageService:
+    """Получение сервиса расчёта страниц дашборда из состояния приложения"""
+    if not hasattr(request.app.state, 'dashboard_page_service'):
+        raise HTTPException(status_code=500, detail="Сервис страниц дашборда не инициализирован")
+    return request.app.state.dashboard_page_service
+
+def get_notification_hub(request: Request) -> NotificationHub:
+    """Получение рассылки уведомлений из состояния приложения"""
+    if not hasattr(request.app.state, 'notification_hub'):
+        raise HTTPException(status_code=500, detail="Рассылка уведомлений не инициализирована")
+    return request.app.state.notification_hub
+
 def get_password_service(request: Request) -> PasswordService:
     """Получение сервиса работы с паролями из состояния приложения"""
     if not hasattr(request.app.state, 'password_service'):
@@ -68,8 +116,56 @@ async def get_current_user(
     """
     return await auth_service.get_current_user(token, session)
 
+class JsonResponder:
+    """
+    Ответ эндпоинта из данных сервиса. В режиме fast_json_responses данные сериализуются orjson
+    без повторной проверки по response_model; заголовки, выставленные зависимостями, сохраняются.
+    """
+
+    def __init__(self, enabled: bool, response: Response):
+        self._enabled = enabled
+        self._response = response
+
+    def __call__(self, data: Any) -> Any:
+        if not self._enabled:
+            return data
+        return TrustedJSONResponse(data, headers=dict(self._response.headers))
+
+def get_json_responder(request: Request, response: Response) -> JsonResponder:
+    """Получение режима ответа из настроек приложения"""
+    if not hasattr(request.app.state, 'settings'):
+        raise HTTPException(status_code=500, detail="Настройки приложения не инициализированы")
+    return JsonResponder(request.app.state.settings.fast_json_responses, response)
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    watermark: Annotated[Any, Depends(get_data_watermark)],
+) -> None:
+    """
+    Условный GET по версии данных дашбордов: ответ получает ETag,
+    а при совпадении If-None-Match обработчик не вызывается и возвращается 304.
+    Версия читается в той же сессии, что и данные ответа, поэтому при отставании реплики
+    ETag соответствует данным реплики.
+    
+    Raises:
+        HTTPException: 304, если у клиента актуальная версия ответа
+    """
+    if watermark is None:
+        return
+    etag = make_etag(watermark.version, request)
+    headers = conditional_headers(etag)
+    if is_not_modified(request, etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
 DbSession = Annotated[AsyncSession, Depends(get_db)]
+ReadDbSession = Annotated[AsyncSession, Depends(get_read_db)]
 AuthServiceDep = Annotated[AuthService, Depends(get_auth_service)]
 PasswordServiceDep = Annotated[PasswordService, Depends(get_password_service)]
 TokenServiceDep = Annotated[TokenService, Depends(get_token_service)]
-StatsServiceDep = Annotated[StatsService, Depends(get_stats_service)]
\ No newline at end of file
+StatsServiceDep = Annotated[StatsService, Depends(get_stats_service)]
+DashboardCacheDep = Annotated[DashboardCacheView, Depends(get_dashboard_cache)]
+DashboardPageServiceDep = Annotated[DashboardPageService, Depends(get_dashboard_page_service)]
+JsonResponderDep = Annotated[JsonResponder, Depends(get_json_responder)]
+NotificationHubDep = Annotated[NotificationHub, Depends(get_notification_hub)]
\ No newline at end of file
@@ -0,0 +1,48 @@
+import hashlib
+from typing import Dict
+
+from starlette.requests import Request
+
+
+def normalized_query(request: Request) -> str:
+    """Параметры запроса без пустых значений, отсортированные по имени; порядок повторяющихся сохраняется"""
+    items = [(key, value.strip()) for key, value in request.query_params.multi_items()]
+    items = sorted((item for item in items if item[1]), key=lambda item: item[0])
+    return "&".join(f"{key}={value}" for key, value in items)
+
+
+def make_etag(version: int, request: Request) -> str:
+    """
+    Слабый ETag ответа: версия данных, версия приложения (формат ответа),
+    путь и нормализованные параметры запроса
+    """
+    digest = hashlib.sha1(
+        f"{request.app.version}|{request.url.path}|{normalized_query(request)}".encode()
+    ).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def conditional_headers(etag: str) -> Dict[str, str]:
+    """
+    ETag и требование перепроверять ответ при каждом обращении.
+    Last-Modified не отправляется: время изменения с точностью до секунды не различает коммиты
+    в одну секунду, и ответ по If-Modified-Since мог бы остаться устаревшим до следующей записи
+    """
+    return {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+    }
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Можно ли ответить 304: If-None-Match сравнивается слабым сравнением.
+    If-Modified-Since не учитывается — актуальность проверяется только по версии в ETag
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
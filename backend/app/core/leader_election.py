@@ -0,0 +1,122 @@
+import asyncio
+import functools
+import logging
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.metrics import SCHEDULER_LEADER
+
+logger = logging.getLogger(__name__)
+
+_TRY_LOCK = text("SELECT pg_try_advisory_lock(hashtext(:name))")
+_UNLOCK = text("SELECT pg_advisory_unlock(hashtext(:name))")
+_PING = text("SELECT 1")
+
+
+class LeaderElection:
+    """
+    Выбор одного процесса-лидера среди воркеров и реплик через advisory-блокировку Postgres.
+    Блокировка сессионная и держится на отдельном соединении, пока оно живо; каждые
+    renew_interval_seconds лидер проверяет соединение (продление аренды), остальные пытаются
+    взять блокировку. При падении процесса или обрыве соединения Postgres снимает блокировку,
+    и лидером становится следующий процесс, попытавшийся её взять.
+    """
+
+    def __init__(self, engine: AsyncEngine, name: str, renew_interval_seconds: float = 15.0):
+        self._engine = engine
+        self._name = name
+        self._renew_interval_seconds = renew_interval_seconds
+        self._connection: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        SCHEDULER_LEADER.labels(name).set(0)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._connection is not None
+
+    async def renew(self) -> bool:
+        """Продлить лидерство или попытаться его получить; возвращает, лидер ли процесс"""
+        async with self._lock:
+            return await self._renew()
+
+    async def _renew(self) -> bool:
+        if self._connection is not None:
+            try:
+                await self._connection.execute(_PING)
+                return True
+            except Exception as ex:
+                logger.warning(f"Потеряно соединение лидера '{self._name}', лидерство снято", exc_info=ex)
+                await self._drop_connection()
+                return False
+
+        connection = None
+        try:
+            connection = await self._engine.connect()
+            # Вне транзакции: соединение лидера не держит снимков и блокировок, кроме advisory
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = (await connection.execute(_TRY_LOCK, {"name": self._name})).scalar()
+        except Exception as ex:
+            logger.warning(f"Не удалось проверить лидерство '{self._name}'", exc_info=ex)
+            if connection is not None:
+                await connection.invalidate()
+                await connection.close()
+            return False
+        if not acquired:
+            await connection.close()
+            return False
+        self._connection = connection
+        SCHEDULER_LEADER.labels(self._name).set(1)
+        logger.info(f"Процесс стал лидером '{self._name}'")
+        return True
+
+    async def start(self) -> None:
+        """Первая попытка стать лидером и фоновое продление"""
+        await self.renew()
+        self._task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self) -> None:
+        """Остановить продление и отпустить блокировку, чтобы другой процесс сразу подхватил лидерство"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connection is not None:
+            try:
+                await self._connection.execute(_UNLOCK, {"name": self._name})
+            except Exception as ex:
+                logger.warning(f"Не удалось отпустить блокировку лидера '{self._name}'", exc_info=ex)
+            await self._drop_connection()
+            logger.info(f"Процесс отказался от лидерства '{self._name}'")
+
+    def only(self, job: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+        """Обёртка задачи планировщика: выполняется только в процессе-лидере"""
+        @functools.wraps(job)
+        async def wrapper():
+            if not await self.renew():
+                logger.debug(f"Задача {job.__name__} пропущена: процесс не лидер '{self._name}'")
+                return
+            await job()
+        return wrapper
+
+    async def _renew_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._renew_interval_seconds)
+            await self.renew()
+
+    async def _drop_connection(self) -> None:
+        """Закрыть соединение лидера, не возвращая его в пул: иначе блокировка останется на соединении пула"""
+        connection, self._connection = self._connection, None
+        SCHEDULER_LEADER.labels(self._name).set(0)
+        if connection is None:
+            return
+        try:
+            await connection.invalidate()
+            await connection.close()
+        except Exception as ex:
+            logger.debug(f"Ошибка при закрытии соединения лидера '{self._name}'", exc_info=ex)
@@ -0,0 +1,171 @@
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP-запросы в обработке", ["method", "route"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула", ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Длительность фоновых задач и задач парсера", ["job"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+JOB_RUNS = Counter("job_runs_total", "Запуски фоновых задач и задач парсера по результату", ["job", "outcome"])
+SCHEDULER_LEADER = Gauge("scheduler_leader", "1, если процесс — лидер и выполняет задачи планировщика", ["election"])
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание свободного соединения; имя пула — метка метрики"""
+
+    metrics_name = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+
+
+class _PoolCollector:
+    """Состояние пулов соединений на момент сбора метрик"""
+
+    def __init__(self):
+        self._pools: Dict[str, Any] = {}
+
+    def add(self, name: str, pool) -> None:
+        pool.metrics_name = name
+        self._pools[name] = pool
+
+    def collect(self):
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Выданные соединения", labels=["pool"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Соединения сверх размера пула", labels=["pool"])
+        size = GaugeMetricFamily("db_pool_size", "Размер пула", labels=["pool"])
+        for name, pool in self._pools.items():
+            checked_out.add_metric([name], pool.checkedout())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+            size.add_metric([name], pool.size())
+        return [checked_out, overflow, size]
+
+
+class _CacheCollector:
+    """Счётчики кэшей, у которых stats() возвращает hits, misses, evictions и entries"""
+
+    def __init__(self):
+        self._caches: Dict[str, Any] = {}
+
+    def add(self, name: str, cache) -> None:
+        self._caches[name] = cache
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Попадания в кэш", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Промахи кэша", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Вытеснения из кэша", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Записи в кэше", labels=["cache"])
+        for name, cache in self._caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            evictions.add_metric([name], stats["evictions"])
+            entries.add_metric([name], stats["entries"])
+        return [hits, misses, evictions, entries]
+
+
+_pools = _PoolCollector()
+_caches = _CacheCollector()
+REGISTRY.register(_pools)
+REGISTRY.register(_caches)
+
+
+def register_pool(name: str, engine) -> None:
+    """Публиковать состояние пула engine (AsyncEngine) под меткой name"""
+    _pools.add(name, engine.sync_engine.pool)
+
+
+def register_cache(name: str, cache) -> None:
+    """Публиковать счётчики кэша под меткой name"""
+    _caches.add(name, cache)
+
+
+class _JobOutcome:
+    def __init__(self):
+        self.outcome = "success"
+
+    def failed(self) -> None:
+        self.outcome = "error"
+
+
+@contextmanager
+def observe_job(job: str) -> Iterator[_JobOutcome]:
+    """Замер длительности и результата задачи; исключение или вызов failed() считаются ошибкой"""
+    result = _JobOutcome()
+    started = time.perf_counter()
+    try:
+        yield result
+    except BaseException:
+        result.failed()
+        raise
+    finally:
+        JOB_DURATION.labels(job).observe(time.perf_counter() - started)
+        JOB_RUNS.labels(job, result.outcome).inc()
+
+
+def timed_job(job: str) -> Callable:
+    """Декоратор асинхронной задачи для observe_job; ответ со status == "error" тоже считается ошибкой"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with observe_job(job) as outcome:
+                result = await func(*args, **kwargs)
+                if isinstance(result, dict) and result.get("status") == "error":
+                    outcome.failed()
+                return result
+        return wrapper
+    return decorator
+
+
+def _route_template(request: Request) -> str:
+    """Шаблон пути маршрута, чтобы метки не зависели от значений параметров пути"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+
+class HttpMetricsMiddleware(BaseHTTPMiddleware):
+    """Гистограмма времени ответа и число запросов в обработке по маршрутам"""
+
+    async def dispatch(self, request: Request, call_next):
+        route = _route_template(request)
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(request.method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            in_progress.dec()
+            HTTP_REQUEST_DURATION.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
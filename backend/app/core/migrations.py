@@ -0,0 +1,241 @@
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.data_version import DATA_WATERMARK_SLOTS
+
+
+# Изменения существующих таблиц. create_all создаёт только отсутствующие таблицы,
+# поэтому новые колонки и индексы для уже развёрнутых баз описываются здесь.
+# Каждая миграция применяется один раз и фиксируется в schema_migrations;
+# инструкции должны быть идемпотентными, так как на новой базе create_all уже создал схему.
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    ("0001_cluster_stats_review_count", [
+        "ALTER TABLE cluster_stats ADD COLUMN IF NOT EXISTS review_count INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_cluster_stats_product_month ON cluster_stats (product_id, month)",
+    ]),
+    ("0002_reviews_date_id", [
+        "CREATE INDEX IF NOT EXISTS idx_reviews_date_id ON reviews (date, id)",
+    ]),
+    # Покрывающие индексы под фильтр дашбордов "продукт из поддерева, период, источник, тональность":
+    # связи и атрибуты отзывов читаются из индекса без обращения к таблице.
+    # Одноколоночные индексы, ставшие префиксами новых, удаляются.
+    ("0003_dashboard_covering_indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_review_products_product_review "
+        "ON review_products (product_id, review_id) INCLUDE (sentiment)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_date_id_covering "
+        "ON reviews (date, id) INCLUDE (source, rating)",
+        "CREATE INDEX IF NOT EXISTS idx_review_clusters_cluster_review "
+        "ON review_clusters (cluster_id, review_id) INCLUDE (topic_weight, sentiment_contribution)",
+        "DROP INDEX IF EXISTS idx_review_products_product_id",
+        "DROP INDEX IF EXISTS idx_reviews_date",
+        "DROP INDEX IF EXISTS idx_reviews_date_id",
+        "DROP INDEX IF EXISTS idx_review_clusters_cluster_id",
+        "ANALYZE review_products",
+        "ANALYZE reviews",
+        "ANALYZE review_clusters",
+    ]),
+    # Месячные партиции reviews и review_products по дате отзыва. Ключ партиционирования входит
+    # в первичный ключ, поэтому связи ссылаются на отзыв парой (review_id, review_date).
+    # Существующие таблицы пересоздаются партиционированными с партициями на весь диапазон дат;
+    # на новой базе create_all уже создал партиционированные таблицы и перенос пропускается.
+    ("0004_partition_reviews", [
+        "ALTER TABLE review_products ADD COLUMN IF NOT EXISTS review_date DATE",
+        "UPDATE review_products SET review_date = reviews.date FROM reviews "
+        "WHERE reviews.id = review_products.review_id AND review_products.review_date IS NULL",
+        "ALTER TABLE review_products ALTER COLUMN review_date SET NOT NULL",
+        "ALTER TABLE review_clusters ADD COLUMN IF NOT EXISTS review_date DATE",
+        "UPDATE review_clusters SET review_date = reviews.date FROM reviews "
+        "WHERE reviews.id = review_clusters.review_id AND review_clusters.review_date IS NULL",
+        "ALTER TABLE review_clusters ALTER COLUMN review_date SET NOT NULL",
+        """
+        DO $$
+        DECLARE
+            cur_month DATE;
+            last_month DATE;
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'reviews'::regclass) THEN
+                RETURN;
+            END IF;
+
+            ALTER TABLE review_products DROP CONSTRAINT IF EXISTS review_products_review_id_fkey;
+            ALTER TABLE review_clusters DROP CONSTRAINT IF EXISTS review_clusters_review_id_fkey;
+
+            SELECT date_trunc('month', min(date))::date, date_trunc('month', max(date))::date
+                INTO cur_month, last_month FROM reviews;
+
+            ALTER SEQUENCE reviews_id_seq OWNED BY NONE;
+            ALTER TABLE reviews RENAME TO reviews_unpartitioned;
+            ALTER TABLE reviews_unpartitioned RENAME CONSTRAINT reviews_pkey TO reviews_unpartitioned_pkey;
+            DROP INDEX IF EXISTS idx_reviews_date_id_covering;
+            DROP INDEX IF EXISTS idx_reviews_sentiment;
+            CREATE TABLE reviews (
+                LIKE reviews_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                PRIMARY KEY (id, date)
+            ) PARTITION BY RANGE (date);
+            ALTER SEQUENCE reviews_id_seq OWNED BY reviews.id;
+
+            ALTER SEQUENCE review_products_id_seq OWNED BY NONE;
+            ALTER TABLE review_products RENAME TO review_products_unpartitioned;
+            ALTER TABLE review_products_unpartitioned
+                RENAME CONSTRAINT review_products_pkey TO review_products_unpartitioned_pkey;
+            DROP INDEX IF EXISTS idx_review_products_review_id;
+            DROP INDEX IF EXISTS idx_review_products_product_review;
+            DROP INDEX IF EXISTS idx_review_products_sentiment;
+            CREATE TABLE review_products (
+                LIKE review_products_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                PRIMARY KEY (id, review_date),
+                FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE
+            ) PARTITION BY RANGE (review_date);
+            ALTER SEQUENCE review_products_id_seq OWNED BY review_products.id;
+
+            WHILE cur_month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF reviews FOR VALUES FROM (%L) TO (%L)',
+                    'reviews_p' || to_char(cur_month, 'YYYYMM'), cur_month, (cur_month + interval '1 month')::date
+                );
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF review_products FOR VALUES FROM (%L) TO (%L)',
+                    'review_products_p' || to_char(cur_month, 'YYYYMM'), cur_month, (cur_month + interval '1 month')::date
+                );
+                cur_month := (cur_month + interval '1 month')::date;
+            END LOOP;
+
+            INSERT INTO reviews SELECT * FROM reviews_unpartitioned;
+            INSERT INTO review_products SELECT * FROM review_products_unpartitioned;
+            DROP TABLE review_products_unpartitioned;
+            DROP TABLE reviews_unpartitioned;
+        END $$
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reviews_date_id_covering ON reviews (date, id) INCLUDE (source, rating)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_sentiment ON reviews (sentiment)",
+        "CREATE INDEX IF NOT EXISTS idx_review_products_review_id ON review_products (review_id)",
+        "CREATE INDEX IF NOT EXISTS idx_review_products_product_review "
+        "ON review_products (product_id, review_id) INCLUDE (sentiment)",
+        "CREATE INDEX IF NOT EXISTS idx_review_products_sentiment ON review_products (sentiment)",
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'review_products_review_fkey') THEN
+                ALTER TABLE review_products ADD CONSTRAINT review_products_review_fkey
+                    FOREIGN KEY (review_id, review_date) REFERENCES reviews (id, date) ON DELETE CASCADE;
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'review_clusters_review_fkey') THEN
+                ALTER TABLE review_clusters ADD CONSTRAINT review_clusters_review_fkey
+                    FOREIGN KEY (review_id, review_date) REFERENCES reviews (id, date) ON DELETE CASCADE;
+            END IF;
+        END $$
+        """,
+        "ANALYZE reviews",
+        "ANALYZE review_products",
+    ]),
+    # Источник и рейтинг отзыва в review_products: подсчёты, тональность и рейтинг по продуктам
+    # считаются по одной таблице без соединения с reviews
+    ("0005_review_products_facts", [
+        "ALTER TABLE review_products ADD COLUMN IF NOT EXISTS review_source VARCHAR(50)",
+        "ALTER TABLE review_products ADD COLUMN IF NOT EXISTS review_rating INTEGER",
+        "UPDATE review_products SET review_source = reviews.source, review_rating = reviews.rating "
+        "FROM reviews WHERE reviews.id = review_products.review_id AND reviews.date = review_products.review_date",
+        "CREATE INDEX IF NOT EXISTS idx_review_products_product_date ON review_products (product_id, review_date) "
+        "INCLUDE (review_id, sentiment, review_source, review_rating)",
+        "ANALYZE review_products",
+    ]),
+    # Версия данных дашбордов в базе для ETag/Last-Modified; таблицу создаёт create_all
+    ("0006_data_watermark", [
+        "INSERT INTO data_watermark (id, version, updated_at) VALUES (1, 0, timezone('utc', now())) "
+        "ON CONFLICT (id) DO NOTHING",
+    ]),
+    # NOTIFY о каждом новом уведомлении для push-доставки всем воркерам; отправляется при коммите вставки.
+    # Полезная нагрузка NOTIFY ограничена 8000 байт, поэтому текст уведомления в ней укорочен
+    ("0007_notifications_notify", [
+        "CREATE OR REPLACE FUNCTION notify_new_notification() RETURNS trigger AS $$ "
+        "BEGIN "
+        "PERFORM pg_notify('notifications', json_build_object("
+        "'id', NEW.id, 'user_id', NEW.user_id, 'message', left(NEW.message, 1500), "
+        "'type', NEW.type, 'is_read', NEW.is_read, 'created_at', NEW.created_at)::text); "
+        "RETURN NEW; "
+        "END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS notifications_notify ON notifications",
+        "CREATE TRIGGER notifications_notify AFTER INSERT ON notifications "
+        "FOR EACH ROW EXECUTE FUNCTION notify_new_notification()",
+    ]),
+    # Версия данных разложена на строки: коммиты разных соединений увеличивают разные строки.
+    # Новые строки начинают с нуля, поэтому сумма версий продолжает прежний счётчик
+    ("0008_data_watermark_slots", [
+        "ALTER TABLE data_watermark DROP CONSTRAINT IF EXISTS data_watermark_id_check",
+        "ALTER TABLE data_watermark DROP CONSTRAINT IF EXISTS data_watermark_slot_check",
+        f"ALTER TABLE data_watermark ADD CONSTRAINT data_watermark_slot_check "
+        f"CHECK (id BETWEEN 1 AND {DATA_WATERMARK_SLOTS})",
+        f"INSERT INTO data_watermark (id, version, updated_at) "
+        f"SELECT slot, 0, timezone('utc', now()) FROM generate_series(1, {DATA_WATERMARK_SLOTS}) AS slot "
+        f"ON CONFLICT (id) DO NOTHING",
+    ]),
+    # Момент последнего обновления месячных агрегатов, общий для процессов; таблицу создаёт create_all.
+    # Уже заполненные агрегаты считаются актуальными, чтобы не пересчитывать их целиком
+    ("0009_aggregates_watermark", [
+        "INSERT INTO aggregates_watermark (id, refreshed_at) "
+        "SELECT 1, CASE WHEN EXISTS (SELECT 1 FROM monthly_stats) THEN localtimestamp END "
+        "ON CONFLICT (id) DO NOTHING",
+    ]),
+    # Обновление месячных агрегатов ищет новые отзывы и привязки к кластерам по created_at
+    ("0010_created_at_indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_reviews_created_at ON reviews (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_review_clusters_created_at ON review_clusters (created_at)",
+    ]),
+    # NOTIFY несёт только id и user_id: поток читает уведомление из таблицы целиком,
+    # поэтому живые события и события, дослатые по Last-Event-ID, совпадают
+    ("0011_notifications_notify_ids", [
+        "CREATE OR REPLACE FUNCTION notify_new_notification() RETURNS trigger AS $$ "
+        "BEGIN "
+        "PERFORM pg_notify('notifications', json_build_object('id', NEW.id, 'user_id', NEW.user_id)::text); "
+        "RETURN NEW; "
+        "END $$ LANGUAGE plpgsql",
+    ]),
+]
+
+
+async def lock_schema(connection: AsyncConnection) -> None:
+    """
+    Транзакционная advisory-блокировка изменений схемы: воркеры, стартующие одновременно,
+    создают таблицы и применяют миграции по очереди. Снимается при завершении транзакции;
+    повторный вызов в той же транзакции не блокирует.
+    """
+    await connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))"))
+
+
+async def apply_migrations(connection: AsyncConnection) -> List[str]:
+    """
+    Применить ещё не применённые миграции.
+    Применённые версии читаются под блокировкой схемы, поэтому воркер, дождавшийся блокировки,
+    видит миграции, применённые другим воркером, и не выполняет их повторно.
+
+    Args:
+        connection: Открытое соединение внутри транзакции
+
+    Returns:
+        List[str]: Версии, применённые при этом вызове
+    """
+    await lock_schema(connection)
+    await connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(100) PRIMARY KEY, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    result = await connection.execute(text("SELECT version FROM schema_migrations"))
+    applied_versions = {row[0] for row in result.all()}
+
+    applied_now = []
+    for version, statements in MIGRATIONS:
+        if version in applied_versions:
+            continue
+        for statement in statements:
+            await connection.execute(text(statement))
+        await connection.execute(
+            text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+            {"version": version}
+        )
+        applied_now.append(version)
+        logging.info(f"Применена миграция {version}")
+    return applied_now
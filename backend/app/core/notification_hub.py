@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Канал, в который триггер notifications_notify (миграция 0007) отправляет каждое новое уведомление
+NOTIFICATIONS_CHANNEL = "notifications"
+
+
+class NotificationHub:
+    """
+    Процессная рассылка сигналов о новых уведомлениях открытым потокам пользователей.
+    Сигналы приходят из Postgres через LISTEN: триггер на notifications отправляет NOTIFY с id и user_id
+    при коммите вставки, поэтому поток узнаёт только о сохранённых уведомлениях, записанных любым
+    воркером или репликой; само уведомление поток читает из таблицы. Каждый поток получает свою
+    очередь; при переполнении медленного потока самый старый сигнал отбрасывается.
+    """
+
+    def __init__(self, queue_size: int = 100, reconnect_interval_seconds: float = 5.0):
+        self._queue_size = queue_size
+        self._reconnect_interval_seconds = reconnect_interval_seconds
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._engine: Optional[AsyncEngine] = None
+        self._connection: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        """Очередь сигналов о новых уведомлениях пользователя на время открытого потока"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def publish(self, notification: Dict[str, Any]) -> None:
+        """Передать сигнал о новом уведомлении всем открытым потокам его пользователя"""
+        for queue in self._subscribers.get(notification.get("user_id"), ()):
+            if queue.full():
+                queue.get_nowait()
+                logger.warning(f"Поток уведомлений пользователя {notification['user_id']} не успевает, старое уведомление отброшено")
+            queue.put_nowait(notification)
+
+    async def start(self, engine: AsyncEngine) -> None:
+        """Подписаться на канал уведомлений и следить за соединением"""
+        self._engine = engine
+        await self._listen()
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close_connection()
+
+    async def _listen(self) -> bool:
+        try:
+            connection = await self._engine.connect()
+        except Exception as ex:
+            logger.warning("Не удалось подключиться для получения уведомлений", exc_info=ex)
+            return False
+        try:
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.add_listener(NOTIFICATIONS_CHANNEL, self._on_notify)
+        except Exception as ex:
+            logger.warning("Не удалось подписаться на канал уведомлений", exc_info=ex)
+            await connection.invalidate()
+            await connection.close()
+            return False
+        self._connection = connection
+        logger.info(f"Подписка на канал {NOTIFICATIONS_CHANNEL} установлена")
+        return True
+
+    async def _watch(self) -> None:
+        """Переподписка после обрыва соединения; уведомления за время обрыва клиенты добирают по Last-Event-ID"""
+        while True:
+            await asyncio.sleep(self._reconnect_interval_seconds)
+            if self._connection is not None and not await self._connection_closed():
+                continue
+            await self._close_connection()
+            await self._listen()
+
+    async def _connection_closed(self) -> bool:
+        raw = await self._connection.get_raw_connection()
+        return raw.driver_connection.is_closed()
+
+    async def _close_connection(self) -> None:
+        """Закрыть соединение подписки, не возвращая его в пул: LISTEN действует до конца сессии"""
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            await connection.invalidate()
+            await connection.close()
+        except Exception as ex:
+            logger.debug("Ошибка при закрытии соединения подписки на уведомления", exc_info=ex)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            notification = json.loads(payload)
+        except ValueError:
+            logger.error(f"Некорректное сообщение в канале {channel}: {payload[:200]}")
+            return
+        self.publish(notification)
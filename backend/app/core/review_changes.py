@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import FrozenSet, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReviewChange:
+    """Изменение отзывов: затронутые продукты и диапазон дат отзывов"""
+    product_ids: FrozenSet[int]
+    start_date: date
+    end_date: date
+
+    def merge(self, other: "ReviewChange") -> "ReviewChange":
+        return ReviewChange(
+            self.product_ids | other.product_ids,
+            min(self.start_date, other.start_date),
+            max(self.end_date, other.end_date),
+        )
+
+    def overlaps(self, start_date: date, end_date: date) -> bool:
+        return self.start_date <= end_date and start_date <= self.end_date
+
+
+class ReviewChangeFeed:
+    """
+    Процессная очередь изменений отзывов для проверки уведомлений.
+    Загрузка отзывов публикует изменение после коммита; потребитель забирает изменения пачкой,
+    дождавшись паузы в публикациях. При переполнении очереди изменение отбрасывается —
+    его подхватит плановая проверка всех конфигураций.
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def publish(self, product_ids: Iterable[int], dates: Iterable[date]) -> None:
+        product_ids = frozenset(product_ids)
+        dates = list(dates)
+        if not product_ids or not dates:
+            return
+        change = ReviewChange(product_ids, min(dates), max(dates))
+        try:
+            self._queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning("Очередь изменений отзывов переполнена, изменение отброшено до плановой проверки")
+            return
+        logger.debug(
+            f"Опубликовано изменение отзывов: продуктов {len(product_ids)}, даты {change.start_date} — {change.end_date}"
+        )
+
+    async def next_batch(self, debounce_seconds: float, max_delay_seconds: float) -> ReviewChange:
+        """
+        Дождаться изменения и объединить с ним все, что опубликованы до паузы в debounce_seconds,
+        но не дольше max_delay_seconds от первого изменения
+        """
+        change = await self._queue.get()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_delay_seconds
+        while True:
+            timeout = min(debounce_seconds, deadline - loop.time())
+            if timeout <= 0:
+                break
+            try:
+                change = change.merge(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return change
+
+
+review_change_feed = ReviewChangeFeed()
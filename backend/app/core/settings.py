@@ -4,9 +4,27 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class AppSettings(BaseSettings):
     model_config = SettingsConfigDict(secrets_dir="/run/secrets")
     db_url: str
+    db_replica_urls: list[str] = []
+    db_replica_max_lag_seconds: float = 5.0
+    sql_echo: bool = False
     cors_allowed_origins: list[str]
     auth_token_lifetime: int = 86400
     auth_token_secret_key: str
+    dashboard_cache_max_entries: int = 1024
+    dashboard_cache_ttl_seconds: float = 300.0
+    dashboard_page_max_concurrency: int = 4
+    review_partition_months_ahead: int = 3
+    review_retention_months: int | None = None
+    debug: bool = False
+    slow_request_ms: float = 1000.0
+    sql_repeated_statement_threshold: int = 10
+    fast_json_responses: bool = True
+    compression_minimum_size: int = 1000
+    notification_event_debounce_seconds: float = 30.0
+    notification_event_max_delay_seconds: float = 300.0
+    scheduler_leader_renew_seconds: float = 15.0
+    notification_stream_heartbeat_seconds: float = 15.0
+    notification_stream_queue_size: int = 100
 
     region: str
     aws_access_key_id: str
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 import os
@@ -14,16 +15,20 @@ from app.services.auth_services import (
     TokenService,
 )
 from app.services.stats_service import StatsService
+from app.services.dashboard_cache import DashboardCache
+from app.services.dashboard_page_service import DashboardPageService
 from app.services.parser_service import ParserService
 from app.services.notification_service import NotificationService
 from app.services.data_initializer import DataInitializer
 from app.scripts.jsonl_loader import JSONLLoader
 
 from app.repositories.user_repositories import UserRepository
+from app.repositories.product_hierarchy import product_hierarchy
 from app.repositories.repositories import (
     ProductRepository, ReviewRepository, MonthlyStatsRepository,
     ClusterRepository, ReviewClusterRepository, ClusterStatsRepository,
-    NotificationRepository, AuditLogRepository, NotificationConfigRepository, ReviewsForModelRepository
+    NotificationRepository, AuditLogRepository, NotificationConfigRepository, ReviewsForModelRepository,
+    ReviewDailyFactRepository, ReviewPartitionRepository, AggregatesWatermarkRepository
 )
 from app.core.exceptions import (
     AppException,
@@ -31,6 +36,13 @@ from app.core.exceptions import (
     handle_validation_exception,
 )
 from app.core.settings import AppSettings
+from app.core.data_version import data_version
+from app.core.review_changes import review_change_feed
+from app.core.leader_election import LeaderElection
+from app.core.notification_hub import NotificationHub
+from app.core.sql_metrics import SqlMetricsMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import HttpMetricsMiddleware, metrics_response, observe_job, register_cache
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -53,6 +65,9 @@ def create_app(settings: AppSettings | None = None) -> FastAPI:
         },
     )
     
+    # Сжатие gzip/brotli; добавляется первым, чтобы быть внутренним и получать тело ответа одним сообщением
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size)
+
     # Настройка CORS
     app.add_middleware(
         CORSMiddleware,
@@ -61,6 +76,17 @@ def create_app(settings: AppSettings | None = None) -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+
+    # Учёт SQL-запросов каждого HTTP-запроса: заголовки X-DB-* в debug, лог медленных запросов и N+1
+    app.add_middleware(
+        SqlMetricsMiddleware,
+        debug=settings.debug,
+        slow_request_ms=settings.slow_request_ms,
+        repeated_statement_threshold=settings.sql_repeated_statement_threshold,
+    )
+    # Время ответа и запросы в обработке по маршрутам для /metrics
+    app.add_middleware(HttpMetricsMiddleware)
+    app.add_api_route("/metrics", metrics_response, methods=["GET"], include_in_schema=False)
     
     logger.info("Настройка глобальных зависимостей")
     _setup_app_dependencies(app, settings)
@@ -91,21 +117,34 @@ def _setup_app_dependencies(app: FastAPI, settings: AppSettings):
     """Настройка зависимостей приложения"""
     logger.info("Инициализация менеджера базы данных")
     app.state.settings = settings
-    app.state.database_manager = DatabaseManager(settings.db_url)
+    app.state.database_manager = DatabaseManager(
+        settings.db_url,
+        replica_urls=settings.db_replica_urls,
+        replica_max_lag_seconds=settings.db_replica_max_lag_seconds,
+        echo=settings.sql_echo,
+    )
 
     logger.info("Инициализация репозиториев")
     user_repository = UserRepository()
     product_repository = ProductRepository()
-    review_repository = ReviewRepository()
+    review_daily_fact_repository = ReviewDailyFactRepository()
     monthly_stats_repository = MonthlyStatsRepository()
+    cluster_stats_repository = ClusterStatsRepository()
+    review_partition_repository = ReviewPartitionRepository(settings.review_retention_months)
+    review_repository = ReviewRepository(
+        review_daily_fact_repository, monthly_stats_repository, cluster_stats_repository,
+        review_partition_repository
+    )
     cluster_repository = ClusterRepository()
     review_cluster_repository = ReviewClusterRepository()
-    cluster_stats_repository = ClusterStatsRepository()
     notification_repository = NotificationRepository()
     audit_log_repository = AuditLogRepository()
     notification_config_repository = NotificationConfigRepository()
     reviews_for_model_repository = ReviewsForModelRepository()
 
+    logger.info("Инициализация индекса дерева продуктов")
+    app.state.product_hierarchy = product_hierarchy
+
     logger.info("Инициализация сервисов")
     password_service = PasswordService()
     token_service = TokenService(
@@ -122,9 +161,28 @@ def _setup_app_dependencies(app: FastAPI, settings: AppSettings):
     cluster_repo=cluster_repository,
     review_cluster_repo=review_cluster_repository,
     reviews_for_model_repo=reviews_for_model_repository,
+    review_daily_fact_repo=review_daily_fact_repository,
+    review_partition_repo=review_partition_repository,
+    aggregates_watermark_repo=AggregatesWatermarkRepository(),
+    product_hierarchy=product_hierarchy,
     )
     app.state.stats_service = stats_service
 
+    logger.info("Инициализация кэша дашбордов")
+    app.state.dashboard_cache = DashboardCache(
+        data_version,
+        max_entries=settings.dashboard_cache_max_entries,
+        ttl_seconds=settings.dashboard_cache_ttl_seconds,
+    )
+    register_cache("dashboard", app.state.dashboard_cache)
+    app.state.dashboard_page_service = DashboardPageService(
+        stats_service,
+        app.state.dashboard_cache,
+        app.state.database_manager,
+        product_hierarchy,
+        max_concurrency=settings.dashboard_page_max_concurrency,
+    )
+
     notification_service = NotificationService(
         notification_repo=notification_repository,
         audit_log_repo=audit_log_repository,
@@ -132,8 +190,11 @@ def _setup_app_dependencies(app: FastAPI, settings: AppSettings):
         product_repo=product_repository,
         review_repo=review_repository,
         monthly_stats_repo=monthly_stats_repository,
+        review_daily_fact_repo=review_daily_fact_repository,
+        product_hierarchy=product_hierarchy,
     )
     app.state.notification_service = notification_service
+    app.state.notification_hub = NotificationHub(queue_size=settings.notification_stream_queue_size)
     parser_service = ParserService(reviews_for_model_repository)
     app.state.parser_service = parser_service
     
@@ -150,8 +211,36 @@ async def _app_lifespan(app: FastAPI):
     await db.initialize()
     logger.info("База данных инициализирована")
 
+    settings: AppSettings = app.state.settings
+
+    # Задачи планировщика и разовое обслуживание при старте выполняет только процесс-лидер
+    # среди воркеров и реплик; остальные сразу обслуживают запросы
+    leader = LeaderElection(db.engine, "scheduler", renew_interval_seconds=settings.scheduler_leader_renew_seconds)
+    await leader.start()
+    run_startup_maintenance = await leader.renew()
+    if run_startup_maintenance:
+        # При старте партиции только создаются наперёд; удаление старых выполняет задача лидера maintain_partitions
+        async with db.async_session() as session:
+            await app.state.stats_service.maintain_review_partitions(session, settings.review_partition_months_ahead)
+        logger.info("Партиции отзывов подготовлены")
+
+        async with db.async_session() as session:
+            await app.state.stats_service.ensure_daily_facts(session)
+            await app.state.stats_service.refresh_monthly_aggregates(session)
+        logger.info("Дневные и месячные агрегаты отзывов готовы")
+    else:
+        logger.info("Обслуживание партиций и агрегатов при старте пропущено: его выполняет процесс-лидер")
+
+    async with db.async_session() as session:
+        await app.state.product_hierarchy.get(session)
+    logger.info("Индекс дерева продуктов построен")
+
+    await app.state.notification_hub.start(db.engine)
+
     # ЗАГРУЗКА ДАННЫХ ИЗ JSONL ПРИ СТАРТЕ
-    if os.getenv('SKIP_JSONL_LOAD', 'false').lower() != 'true':
+    if not run_startup_maintenance:
+        logger.info("Пропуск загрузки JSONL данных: её выполняет процесс-лидер")
+    elif os.getenv('SKIP_JSONL_LOAD', 'false').lower() != 'true':
         logger.info("Запуск инициализации данных из JSONL файлов")
         try:
             async with app.state.database_manager.async_session() as session:
@@ -171,21 +260,73 @@ async def _app_lifespan(app: FastAPI):
         async with app.state.database_manager.async_session() as session:
             service = app.state.notification_service
             logger.info("Запуск запланированной проверки уведомлений")
-            try:
-                await service.check_and_generate_notifications(session)
-            except Exception as e:
-                logger.error(f"Не удалось проверить уведомления: {str(e)}", exc_info=True)
+            with observe_job("run_checks") as job:
+                try:
+                    await service.check_and_generate_notifications(session)
+                except Exception as e:
+                    job.failed()
+                    logger.error(f"Не удалось проверить уведомления: {str(e)}", exc_info=True)
+
+    async def consume_review_changes():
+        """Проверка уведомлений, затронутых загруженными отзывами, после паузы в публикациях изменений"""
+        while True:
+            change = await review_change_feed.next_batch(
+                settings.notification_event_debounce_seconds, settings.notification_event_max_delay_seconds
+            )
+            async with app.state.database_manager.async_session() as session:
+                with observe_job("review_change_checks") as job:
+                    try:
+                        await app.state.notification_service.check_changed_configs(session, change)
+                    except Exception as e:
+                        job.failed()
+                        logger.error(f"Не удалось проверить уведомления по изменениям отзывов: {str(e)}", exc_info=True)
+
+    async def refresh_aggregates():
+        """Задача для обновления месячной статистики продуктов и кластеров"""
+        async with app.state.database_manager.async_session() as session:
+            with observe_job("refresh_aggregates") as job:
+                try:
+                    await app.state.stats_service.refresh_monthly_aggregates(session)
+                except Exception as e:
+                    job.failed()
+                    logger.error(f"Не удалось обновить месячную статистику: {str(e)}", exc_info=True)
 
-    # Запуск проверки каждые 10 минут
-    scheduler.add_job(run_checks, 'cron', minute='*/10')
+    async def maintain_partitions():
+        """Задача для создания партиций отзывов наперёд и удаления партиций старше срока хранения"""
+        async with app.state.database_manager.async_session() as session:
+            with observe_job("maintain_partitions") as job:
+                try:
+                    dropped = await app.state.stats_service.maintain_review_partitions(
+                        session, settings.review_partition_months_ahead, settings.review_retention_months
+                    )
+                    if dropped:
+                        logger.info(f"Удалены партиции отзывов за месяцы: {', '.join(m.strftime('%Y-%m') for m in dropped)}")
+                except Exception as e:
+                    job.failed()
+                    logger.error(f"Не удалось обслужить партиции отзывов: {str(e)}", exc_info=True)
+
+    # Полная проверка каждые 10 минут — страховка для изменений, не прошедших через очередь
+    scheduler.add_job(leader.only(run_checks), 'cron', minute='*/10')
+    # Подхват новых привязок отзывов к кластерам каждые 5 минут
+    scheduler.add_job(leader.only(refresh_aggregates), 'cron', minute='*/5')
+    # Партиции отзывов на следующие месяцы — раз в сутки
+    scheduler.add_job(leader.only(maintain_partitions), 'cron', hour=3, minute=30)
     scheduler.start()
-    logger.info("Планировщик запущен")
+    logger.info(f"Планировщик запущен, процесс {'лидер' if leader.is_leader else 'ожидает лидерства'}")
+    review_changes_task = asyncio.create_task(consume_review_changes())
 
     try:
         yield
     finally:
         logger.info("Остановка планировщика")
         scheduler.shutdown()
+        await leader.stop()
+        await app.state.notification_hub.stop()
+        review_changes_task.cancel()
+        try:
+            await review_changes_task
+        except asyncio.CancelledError:
+            pass
         logger.info("Закрытие подключения к базе данных")
         await db.dispose()
 
@@ -0,0 +1,125 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+_QUERY_START_KEY = "sql_metrics_query_start"
+# Приведение типа параметра, которое asyncpg-диалект добавляет к каждому параметру: $1::INTEGER, $2::VARCHAR(50)
+_CAST = r"(?:::\w+(?:\s+(?:WITH|WITHOUT)\s+TIME\s+ZONE|\s+PRECISION)?(?:\(\d+(?:\s*,\s*\d+)?\))?(?:\[\])?)?"
+_PARAMETER = re.compile(r"(?:\$\d+|%\(\w+\)s|%s|\?)" + _CAST)
+_PARAMETER_LIST = re.compile(r"\(\s*\?" + _CAST + r"(?:\s*,\s*\?" + _CAST + r")*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Форма запроса: параметры (с приведением типа) и списки параметров любой длины заменены на ?, пробелы схлопнуты"""
+    shape = _PARAMETER.sub("?", statement)
+    shape = _PARAMETER_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class RequestSqlStats:
+    """SQL-запросы одного HTTP-запроса: количество, суммарное время, самый медленный и повторы одной формы"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.query_count += 1
+        self.total_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Формы запросов, выполненные не меньше threshold раз — признак N+1"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+_current_stats: ContextVar[Optional[RequestSqlStats]] = ContextVar("_current_sql_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info[_QUERY_START_KEY].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get(_QUERY_START_KEY) if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключить учёт запросов к engine (для AsyncEngine — к его sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class SqlMetricsMiddleware(BaseHTTPMiddleware):
+    """
+    Сбор SQL-статистики HTTP-запроса. В debug-режиме статистика возвращается в заголовках X-DB-*;
+    медленные запросы и повторы запроса одной формы (N+1) пишутся в лог.
+    """
+
+    def __init__(self, app, debug: bool = False, slow_request_ms: float = 1000.0, repeated_statement_threshold: int = 10):
+        super().__init__(app)
+        self._debug = debug
+        self._slow_request_ms = slow_request_ms
+        self._repeated_statement_threshold = repeated_statement_threshold
+
+    async def dispatch(self, request: Request, call_next):
+        stats = RequestSqlStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current_stats.reset(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        endpoint = f"{request.method} {request.url.path}"
+
+        repeated = stats.repeated(self._repeated_statement_threshold)
+        for shape, count in repeated:
+            logger.warning(f"Возможный N+1 в {endpoint}: запрос выполнен {count} раз: {shape[:500]}")
+
+        if elapsed_ms >= self._slow_request_ms:
+            logger.warning(
+                f"Медленный запрос {endpoint}: {elapsed_ms:.0f} мс, SQL-запросов {stats.query_count}, "
+                f"время в БД {stats.total_seconds * 1000:.0f} мс, самый медленный "
+                f"{stats.slowest_seconds * 1000:.0f} мс: {(stats.slowest_statement or '')[:500]}"
+            )
+
+        if self._debug:
+            response.headers.update(self.debug_headers(stats, len(repeated)))
+        return response
+
+    @staticmethod
+    def debug_headers(stats: RequestSqlStats, repeated_count: int) -> Dict[str, str]:
+        return {
+            "X-DB-Query-Count": str(stats.query_count),
+            "X-DB-Time-Ms": f"{stats.total_seconds * 1000:.1f}",
+            "X-DB-Slowest-Ms": f"{stats.slowest_seconds * 1000:.1f}",
+            "X-DB-Repeated-Statements": str(repeated_count),
+        }
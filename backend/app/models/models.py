@@ -1,6 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, Date, Float, Boolean, JSON, Text,
-    CheckConstraint, Enum, TIMESTAMP, Index, DateTime
+    Column, Integer, BigInteger, String, ForeignKey, Date, Float, Boolean, JSON, Text,
+    CheckConstraint, Enum, TIMESTAMP, Index, DateTime, UniqueConstraint, ForeignKeyConstraint
 )
 from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -8,6 +8,7 @@ from sqlalchemy.sql import func
 from enum import Enum
 from datetime import date, datetime
 from app.core.db_manager import Base
+from app.core.data_version import DATA_WATERMARK_SLOTS
 from app.models.user_models import UserRole
 
 class ProductType(str, Enum):
@@ -38,22 +39,37 @@ class NotificationType(str, Enum):
     CLUSTER_ALERT = "cluster_alert"  # Изменение в конкретном кластере
 
 class ReviewProduct(Base):
-    """Связующая таблица между отзывами и продуктами (многие-ко-многим)"""
+    """Связующая таблица между отзывами и продуктами (многие-ко-многим).
+    Партиционирована по месяцам даты отзыва вместе с reviews; дата, источник и рейтинг
+    скопированы из отзыва, поэтому подсчёты по продуктам выполняются по одной этой таблице"""
     
     __tablename__ = "review_products"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    review_id: Mapped[int] = mapped_column(ForeignKey("reviews.id", ondelete="CASCADE"), nullable=False)
+    review_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    review_date: Mapped[date] = mapped_column(Date, primary_key=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
     sentiment: Mapped[Optional[Sentiment]] = mapped_column(String(20))
     sentiment_score: Mapped[Optional[float]] = mapped_column(Float)
+    # Копии полей отзыва для аналитики без соединения с reviews
+    review_source: Mapped[Optional[str]] = mapped_column(String(50))
+    review_rating: Mapped[Optional[int]] = mapped_column(Integer)
 
     __table_args__ = (
         CheckConstraint("sentiment IN ('positive', 'neutral', 'negative')"),
         CheckConstraint("sentiment_score BETWEEN -1 AND 1"),
         Index("idx_review_products_review_id", "review_id"),
-        Index("idx_review_products_product_id", "product_id"),
+        Index("idx_review_products_product_review", "product_id", "review_id", postgresql_include=["sentiment"]),
+        Index(
+            "idx_review_products_product_date", "product_id", "review_date",
+            postgresql_include=["review_id", "sentiment", "review_source", "review_rating"]
+        ),
         Index("idx_review_products_sentiment", "sentiment"),
+        ForeignKeyConstraint(
+            ["review_id", "review_date"], ["reviews.id", "reviews.date"],
+            ondelete="CASCADE", name="review_products_review_fkey"
+        ),
+        {"postgresql_partition_by": "RANGE (review_date)"},
     )
 
 class Product(Base):
@@ -83,13 +99,14 @@ class Product(Base):
     children = relationship("Product", back_populates="parent")
 
 class Review(Base):
-    """Модель отзыва"""
+    """Модель отзыва. Таблица партиционирована по месяцам даты отзыва,
+    поэтому дата входит в первичный ключ"""
     
     __tablename__ = "reviews"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)
-    date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    date: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
     rating: Mapped[Optional[int]] = mapped_column(Integer)
     sentiment: Mapped[Optional[Sentiment]] = mapped_column(String(20))
     sentiment_score: Mapped[Optional[float]] = mapped_column(Float)
@@ -102,8 +119,24 @@ class Review(Base):
         CheckConstraint("rating BETWEEN 1 AND 5"),
         CheckConstraint("sentiment IN ('positive', 'neutral', 'negative')"),
         CheckConstraint("sentiment_score BETWEEN -1 AND 1"),
-        Index("idx_reviews_date", "date"),
+        Index("idx_reviews_date_id_covering", "date", "id", postgresql_include=["source", "rating"]),
         Index("idx_reviews_sentiment", "sentiment"),
+        Index("idx_reviews_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
+class ProductClosure(Base):
+    """Транзитивное замыкание дерева продуктов: все пары (предок, потомок) с расстоянием между ними,
+    включая пару (узел, узел) с depth = 0"""
+
+    __tablename__ = "product_closure"
+
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("idx_product_closure_descendant_id", "descendant_id"),
     )
 
 class Cluster(Base):
@@ -124,7 +157,8 @@ class ReviewCluster(Base):
     __tablename__ = "review_clusters"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    review_id: Mapped[int] = mapped_column(ForeignKey("reviews.id", ondelete="CASCADE"), nullable=False)
+    review_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    review_date: Mapped[date] = mapped_column(Date, nullable=False)
     cluster_id: Mapped[int] = mapped_column(ForeignKey("clusters.id", ondelete="CASCADE"), nullable=False)
     topic_weight: Mapped[float] = mapped_column(Float, default=1.0)
     sentiment_contribution: Mapped[Optional[Sentiment]] = mapped_column(String(20))
@@ -134,7 +168,15 @@ class ReviewCluster(Base):
         CheckConstraint("topic_weight BETWEEN 0 AND 1"),
         CheckConstraint("sentiment_contribution IN ('positive', 'neutral', 'negative')"),
         Index("idx_review_clusters_review_id", "review_id"),
-        Index("idx_review_clusters_cluster_id", "cluster_id"),
+        Index("idx_review_clusters_created_at", "created_at"),
+        Index(
+            "idx_review_clusters_cluster_review", "cluster_id", "review_id",
+            postgresql_include=["topic_weight", "sentiment_contribution"]
+        ),
+        ForeignKeyConstraint(
+            ["review_id", "review_date"], ["reviews.id", "reviews.date"],
+            ondelete="CASCADE", name="review_clusters_review_fkey"
+        ),
     )
 
     review = relationship("Review", back_populates="clusters")
@@ -173,6 +215,7 @@ class ClusterStats(Base):
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
     month: Mapped[Optional[datetime.date]] = mapped_column(Date)
     weighted_review_count: Mapped[float] = mapped_column(Float, default=0.0)
+    review_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     positive_percent: Mapped[Optional[float]] = mapped_column(Float)
     neutral_percent: Mapped[Optional[float]] = mapped_column(Float)
     negative_percent: Mapped[Optional[float]] = mapped_column(Float)
@@ -181,11 +224,72 @@ class ClusterStats(Base):
     __table_args__ = (
         Index("idx_cluster_stats_cluster_id", "cluster_id"),
         Index("idx_cluster_stats_product_id", "product_id"),
+        Index("idx_cluster_stats_product_month", "product_id", "month"),
     )
 
     cluster = relationship("Cluster")
     product = relationship("Product")
 
+class ReviewDailyFact(Base):
+    """Дневной агрегат отзывов по узлу дерева продуктов, источнику и тональности.
+
+    Категории и подкатегории содержат отзывы всех потомков, каждый отзыв учитывается
+    в узле один раз. Строка с sentiment = 'all' хранит общее количество отзывов узла.
+    """
+    
+    __tablename__ = "review_daily_facts"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    day: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    source: Mapped[str] = mapped_column(String(50), nullable=False, default="")
+    sentiment: Mapped[str] = mapped_column(String(20), nullable=False)
+    review_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "day", "source", "sentiment", name="uq_review_daily_facts_key"),
+        CheckConstraint("sentiment IN ('positive', 'neutral', 'negative', 'all')"),
+        Index("idx_review_daily_facts_day", "day"),
+    )
+
+class DataWatermark(Base):
+    """Версия данных дашбордов в базе, разложенная на DATA_WATERMARK_SLOTS строк.
+
+    Транзакция, записавшая в таблицы дашбордов, увеличивает одну строку (по номеру своего
+    серверного процесса) тем же коммитом. Версия — сумма по строкам, время изменения — максимум;
+    обе одинаковы для всех процессов и реплик. updated_at хранится в UTC.
+    """
+
+    __tablename__ = "data_watermark"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP, server_default=func.timezone("utc", func.now()), nullable=False
+    )
+
+    __table_args__ = (
+        CheckConstraint(f"id BETWEEN 1 AND {DATA_WATERMARK_SLOTS}", name="data_watermark_slot_check"),
+    )
+
+class AggregatesWatermark(Base):
+    """Момент, по состоянию на который MonthlyStats и ClusterStats обновлены из отзывов.
+
+    Одна строка, общая для всех процессов: обновление агрегатов пересчитывает ячейки отзывов
+    и привязок к кластерам, созданных после этого момента. Время локальное, как created_at отзывов.
+    """
+
+    __tablename__ = "aggregates_watermark"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    refreshed_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP)
+
+    __table_args__ = (
+        CheckConstraint("id = 1", name="aggregates_watermark_single_row_check"),
+    )
+
 class Notification(Base):
     """Модель уведомлений для пользователей"""
     
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Cluster, Product, ProductType
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_COLORS = ["blue", "cyan", "pink", "purple", "green"]
+
+
+@dataclass(frozen=True)
+class ProductNode:
+    """Снимок узла дерева продуктов, не привязанный к сессии"""
+    id: int
+    name: str
+    type: ProductType
+    client_type: str
+    parent_id: Optional[int]
+    level: int
+
+
+@dataclass(frozen=True)
+class ClusterInfo:
+    """Снимок кластера для подписей и цветов графиков"""
+    id: int
+    name: str
+    color: str
+
+
+class ProductHierarchySnapshot:
+    """Неизменяемое состояние индекса для одной версии дерева"""
+
+    def __init__(self, version: int, products: List[Product], clusters: List[Cluster]):
+        self.version = version
+        self.nodes: Dict[int, ProductNode] = {
+            p.id: ProductNode(p.id, p.name, p.type, p.client_type, p.parent_id, p.level) for p in products
+        }
+        self.clusters: List[ClusterInfo] = [
+            ClusterInfo(c.id, c.name, CLUSTER_COLORS[c.id % len(CLUSTER_COLORS)]) for c in clusters
+        ]
+        self._clusters_by_id = {c.id: c for c in self.clusters}
+
+        children: Dict[int, List[int]] = {}
+        for node in self.nodes.values():
+            if node.parent_id is not None:
+                children.setdefault(node.parent_id, []).append(node.id)
+
+        self.ancestors: Dict[int, Tuple[int, ...]] = {}
+        for node_id in self.nodes:
+            path = []
+            parent_id = self.nodes[node_id].parent_id
+            while parent_id is not None and parent_id in self.nodes and parent_id not in path:
+                path.append(parent_id)
+                parent_id = self.nodes[parent_id].parent_id
+            self.ancestors[node_id] = tuple(reversed(path))
+
+        self.descendants: Dict[int, FrozenSet[int]] = {}
+        for node_id in self.nodes:
+            found = set()
+            stack = list(children.get(node_id, []))
+            while stack:
+                child_id = stack.pop()
+                if child_id in found:
+                    continue
+                found.add(child_id)
+                stack.extend(children.get(child_id, []))
+            self.descendants[node_id] = frozenset(found)
+
+    def get_node(self, product_id: int) -> Optional[ProductNode]:
+        return self.nodes.get(product_id)
+
+    def get_descendant_ids(self, product_id: int) -> FrozenSet[int]:
+        """Все потомки узла без самого узла"""
+        return self.descendants.get(product_id, frozenset())
+
+    def get_subtree_ids(self, product_id: int) -> List[int]:
+        """
+        ID продуктов, по которым считается статистика узла: категории и подкатегории
+        раскрываются во всех потомков, остальные узлы учитывают только себя
+        """
+        node = self.nodes.get(product_id)
+        if node and node.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
+            return list(self.get_descendant_ids(product_id)) + [product_id]
+        return [product_id]
+
+    def get_ancestor_path(self, product_id: int) -> Tuple[int, ...]:
+        """Путь от корня до родителя узла"""
+        return self.ancestors.get(product_id, ())
+
+    def get_cluster(self, cluster_id: int) -> Optional[ClusterInfo]:
+        return self._clusters_by_id.get(cluster_id)
+
+
+class ProductHierarchyIndex:
+    """
+    Процессный индекс дерева продуктов и списка кластеров.
+    Строится из базы при первом обращении после инвалидации; каждая пересборка получает
+    новую версию. max_age_seconds ограничивает устаревание, когда дерево меняет другой процесс.
+    """
+
+    def __init__(self, max_age_seconds: float = 300.0):
+        self._max_age_seconds = max_age_seconds
+        self._snapshot: Optional[ProductHierarchySnapshot] = None
+        self._built_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self) -> None:
+        """Сбросить индекс; следующий get пересоберёт его"""
+        self._version += 1
+        self._snapshot = None
+
+    async def get(self, session: AsyncSession) -> ProductHierarchySnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._built_at < self._max_age_seconds:
+            return snapshot
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._built_at < self._max_age_seconds:
+                return snapshot
+
+            if snapshot is not None:
+                self._version += 1
+            version = self._version
+            products = (await session.execute(select(Product))).scalars().all()
+            clusters = (await session.execute(select(Cluster).order_by(Cluster.name))).scalars().all()
+            snapshot = ProductHierarchySnapshot(version, products, clusters)
+            if version == self._version:
+                self._snapshot = snapshot
+                self._built_at = time.monotonic()
+            logger.info(f"Индекс дерева продуктов построен: версия {version}, узлов {len(snapshot.nodes)}")
+            return snapshot
+
+
+product_hierarchy = ProductHierarchyIndex()
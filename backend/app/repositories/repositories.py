@@ -1,13 +1,20 @@
-from sqlalchemy import exists, func, select, and_, case, cast, Float, literal, Any, update
+from sqlalchemy import exists, func, select, and_, or_, case, cast, Float, Date, Integer, BigInteger, TIMESTAMP, literal, Any, update, delete, insert, tuple_, text, values, column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql import func as sql_func
-from typing import List, Optional, Dict
-from datetime import date, datetime
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.ext.compiler import compiles
+from typing import Iterable, List, Optional, Dict, Set, Tuple
+from datetime import date, datetime, timedelta
+import json
 from app.schemas.schemas import ProductTreeNode
+from app.repositories.product_hierarchy import product_hierarchy
 from app.models.models import NotificationConfig, ReviewProduct
 
 from app.models.models import (
-    Product, Review, Cluster, ReviewCluster, MonthlyStats, ClusterStats, Notification, AuditLog, ReviewsForModel
+    Product, Review, Cluster, ReviewCluster, MonthlyStats, ClusterStats, Notification, AuditLog, ReviewsForModel,
+    ProductType, ReviewDailyFact, ProductClosure, DataWatermark, AggregatesWatermark
 )
 
 class ProductRepository:
@@ -27,11 +34,14 @@ class ProductRepository:
         return result.scalar()
 
     async def get_all(
-        self, session: AsyncSession, page: int = 0, size: int = 100, client_type: Optional[str] = None
+        self, session: AsyncSession, page: int = 0, size: int = 100, client_type: Optional[str] = None,
+        product_id: Optional[int] = None
     ) -> List[Product]:
         statement = select(Product).order_by(Product.name)
         if client_type:
             statement = statement.where(Product.client_type == client_type)
+        if product_id is not None:
+            statement = statement.where(Product.id == product_id)
         statement = statement.offset(page * size).limit(size)
         result = await session.execute(statement)
         return result.scalars().all()
@@ -44,13 +54,18 @@ class ProductRepository:
     async def save(self, session: AsyncSession, product: Product) -> Product:
         session.add(product)
         await session.flush()
+        await self._add_to_closure(session, product)
         await session.commit()
+        product_hierarchy.invalidate()
         await session.refresh(product)
         return product
 
     async def update(self, session: AsyncSession, product: Product) -> Product:
         await session.merge(product)
+        await session.flush()
+        await self.rebuild_closure(session)
         await session.commit()
+        product_hierarchy.invalidate()
         await session.refresh(product)
         return product
 
@@ -61,9 +76,64 @@ class ProductRepository:
         if product:
             await session.delete(product)
             await session.commit()
+            product_hierarchy.invalidate()
             return True
         return False
     
+    async def _add_to_closure(self, session: AsyncSession, product: Product) -> None:
+        """Добавить новый лист в product_closure: пути от всех предков родителя и пару (узел, узел)"""
+        if product.parent_id is not None:
+            parent_paths = select(
+                ProductClosure.ancestor_id,
+                literal(product.id),
+                ProductClosure.depth + 1
+            ).where(ProductClosure.descendant_id == product.parent_id)
+            await session.execute(
+                insert(ProductClosure).from_select(["ancestor_id", "descendant_id", "depth"], parent_paths)
+            )
+        await session.execute(
+            insert(ProductClosure).values(ancestor_id=product.id, descendant_id=product.id, depth=0)
+        )
+
+    async def rebuild_closure(self, session: AsyncSession) -> None:
+        """Полностью пересобрать product_closure по parent_id"""
+        closure = select(
+            Product.id.label("ancestor_id"),
+            Product.id.label("descendant_id"),
+            literal(0).label("depth")
+        ).cte("closure", recursive=True)
+        closure = closure.union_all(
+            select(closure.c.ancestor_id, Product.id, closure.c.depth + 1)
+            .join(closure, Product.parent_id == closure.c.descendant_id)
+        )
+        await session.execute(delete(ProductClosure))
+        await session.execute(
+            insert(ProductClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(closure.c.ancestor_id, closure.c.descendant_id, closure.c.depth)
+            )
+        )
+
+    async def ensure_closure(self, session: AsyncSession) -> None:
+        """Пересобрать product_closure, если в нём нет какого-либо продукта (база до появления таблицы)"""
+        missing = select(Product.id).where(
+            ~exists().where(ProductClosure.ancestor_id == Product.id, ProductClosure.descendant_id == Product.id)
+        ).limit(1)
+        if (await session.execute(missing)).scalar() is not None:
+            await self.rebuild_closure(session)
+            await session.commit()
+
+    def subtree_condition(self, product_id: int, expand: bool):
+        """
+        Условие на ReviewProduct.product_id для статистики узла: при expand — все потомки
+        через product_closure (один диапазон индекса по ancestor_id), иначе только сам узел
+        """
+        if expand:
+            return ReviewProduct.product_id.in_(
+                select(ProductClosure.descendant_id).where(ProductClosure.ancestor_id == product_id)
+            )
+        return ReviewProduct.product_id == product_id
+
     async def get_all_descendants(self, session: AsyncSession, product_id: int) -> List[Product]:
         product = await self.get_by_id(session, product_id)
         if not product:
@@ -149,10 +219,32 @@ class ProductRepository:
         return tree
 
 class ReviewRepository:
-    async def add_products_to_review(self, session: AsyncSession, review_id: int, product_ids: List[int]):
+    def __init__(
+        self,
+        daily_fact_repo: Optional["ReviewDailyFactRepository"] = None,
+        monthly_stats_repo: Optional["MonthlyStatsRepository"] = None,
+        cluster_stats_repo: Optional["ClusterStatsRepository"] = None,
+        partition_repo: Optional["ReviewPartitionRepository"] = None,
+    ):
+        self._daily_fact_repo = daily_fact_repo or ReviewDailyFactRepository()
+        self._monthly_stats_repo = monthly_stats_repo or MonthlyStatsRepository()
+        self._cluster_stats_repo = cluster_stats_repo or ClusterStatsRepository()
+        self._partition_repo = partition_repo or ReviewPartitionRepository()
+
+    @staticmethod
+    def product_link(
+        review: Review, product_id: int, sentiment: Optional[str] = None, sentiment_score: Optional[float] = None
+    ) -> ReviewProduct:
+        """Связь отзыва с продуктом с копиями даты, источника и рейтинга отзыва"""
+        return ReviewProduct(
+            review_id=review.id, review_date=review.date, product_id=product_id,
+            sentiment=sentiment, sentiment_score=sentiment_score,
+            review_source=review.source, review_rating=review.rating
+        )
+
+    async def add_products_to_review(self, session: AsyncSession, review: Review, product_ids: List[int]):
         for pid in product_ids:
-            rp = ReviewProduct(review_id=review_id, product_id=pid)
-            session.add(rp)
+            session.add(self.product_link(review, pid))
         await session.flush()
 
     async def get_by_id(self, session: AsyncSession, review_id: int) -> Review | None:
@@ -181,31 +273,198 @@ class ReviewRepository:
         return result.scalar_one()
 
     async def save(self, session: AsyncSession, review: Review) -> Review:
+        await self._partition_repo.ensure_months(session, [review.date])
         session.add(review)
         await session.flush()
         await session.commit()
         await session.refresh(review)
         return review
 
-    async def update(self, session: AsyncSession, review: Review) -> Review:
-        await session.merge(review)
+    async def update(self, session: AsyncSession, review: Review) -> Review | None:
+        """
+        Обновить отзыв review.id значениями review. Дата входит в первичный ключ и ключ партиции,
+        поэтому перенос на другую дату — удаление и вставка отзыва вместе со связями.
+        Вклад отзыва в дневные и месячные агрегаты вычитается до изменения и добавляется после
+        в той же транзакции.
+        """
+        existing = await self.get_by_id(session, review.id)
+        if existing is None:
+            return None
+        old_date = existing.date
+        if review.date != old_date:
+            # ensure_months фиксирует сессию, поэтому партиция создаётся до изменения агрегатов
+            await self._partition_repo.ensure_months(session, [review.date])
+
+        cells = set(await self._monthly_stats_repo.get_cells_for_reviews(session, [(review.id, old_date)]))
+        await self._daily_fact_repo.apply_reviews(session, [(review.id, old_date)], sign=-1)
+
+        if review.date != old_date:
+            product_links = (await session.execute(
+                select(ReviewProduct).where(ReviewProduct.review_id == review.id, ReviewProduct.review_date == old_date)
+            )).scalars().all()
+            cluster_links = (await session.execute(
+                select(ReviewCluster).where(ReviewCluster.review_id == review.id, ReviewCluster.review_date == old_date)
+            )).scalars().all()
+            product_rows = [
+                (link.product_id, link.sentiment, link.sentiment_score) for link in product_links
+            ]
+            cluster_rows = [
+                (link.cluster_id, link.topic_weight, link.sentiment_contribution, link.created_at) for link in cluster_links
+            ]
+            created_at = existing.created_at
+            # Связи удаляются каскадом по внешним ключам
+            await session.execute(delete(Review).where(Review.id == review.id, Review.date == old_date))
+            for obj in [existing, *product_links, *cluster_links]:
+                session.expunge(obj)
+
+            existing = Review(
+                id=review.id, text=review.text, date=review.date, rating=review.rating,
+                sentiment=review.sentiment, sentiment_score=review.sentiment_score,
+                source=review.source, created_at=created_at
+            )
+            session.add(existing)
+            await session.flush()
+            for product_id, sentiment, sentiment_score in product_rows:
+                session.add(self.product_link(existing, product_id, sentiment, sentiment_score))
+            for cluster_id, topic_weight, sentiment_contribution, link_created_at in cluster_rows:
+                session.add(ReviewCluster(
+                    review_id=existing.id, review_date=existing.date, cluster_id=cluster_id,
+                    topic_weight=topic_weight, sentiment_contribution=sentiment_contribution,
+                    created_at=link_created_at
+                ))
+        else:
+            existing.text = review.text
+            existing.rating = review.rating
+            existing.sentiment = review.sentiment
+            existing.sentiment_score = review.sentiment_score
+            existing.source = review.source
+            await session.execute(
+                update(ReviewProduct)
+                .where(ReviewProduct.review_id == review.id, ReviewProduct.review_date == old_date)
+                .values(review_source=review.source, review_rating=review.rating)
+            )
+        await session.flush()
+
+        await self._daily_fact_repo.apply_reviews(session, [(existing.id, existing.date)])
+        cells.update(await self._monthly_stats_repo.get_cells_for_reviews(session, [(existing.id, existing.date)]))
+        await self._monthly_stats_repo.refresh(session, list(cells))
+        await self._cluster_stats_repo.refresh(session, list(cells))
         await session.commit()
-        await session.refresh(review)
-        return review
+        await session.refresh(existing)
+        return existing
 
     async def delete(self, session: AsyncSession, review_id: int) -> bool:
         statement = select(Review).where(Review.id == review_id)
         result = await session.execute(statement)
         review = result.scalar_one_or_none()
         if review:
+            cells = await self._monthly_stats_repo.get_cells_for_reviews(session, [(review.id, review.date)])
+            await self._daily_fact_repo.apply_reviews(session, [(review.id, review.date)], sign=-1)
             await session.delete(review)
+            await session.flush()
+            await self._monthly_stats_repo.refresh(session, cells)
+            await self._cluster_stats_repo.refresh(session, cells)
             await session.commit()
             return True
         return False
 
-    async def bulk_create(self, session: AsyncSession, reviews: List[Review]) -> List[Review]:
+    async def get_keys_changed_since(self, session: AsyncSession, since: datetime) -> List[Tuple[int, date]]:
+        """
+        Пары (id, дата) отзывов, созданных или получивших привязку к кластеру начиная с since
+        (индексы по created_at)
+        """
+        statement = select(Review.id, Review.date).where(Review.created_at >= since).union(
+            select(ReviewCluster.review_id, ReviewCluster.review_date).where(ReviewCluster.created_at >= since)
+        )
+        result = await session.execute(statement)
+        return [(row[0], row[1]) for row in result.all()]
+
+    def feed_conditions(
+        self, subtree, start_date: Optional[date] = None, end_date: Optional[date] = None,
+        source: Optional[str] = None, sentiment: Optional[str] = None, cluster_id: Optional[int] = None
+    ) -> List[Any]:
+        """
+        Фильтры ленты отзывов узла. Привязка к поддереву и кластеру проверяется полусоединением (EXISTS),
+        поэтому отзыв с несколькими продуктами поддерева попадает в выборку один раз без DISTINCT.
+        """
+        link_conditions = [
+            ReviewProduct.review_id == Review.id, ReviewProduct.review_date == Review.date, subtree
+        ]
+        if sentiment:
+            link_conditions.append(ReviewProduct.sentiment == sentiment)
+        conditions = [exists().where(*link_conditions)]
+        if start_date:
+            conditions.append(Review.date >= start_date)
+        if end_date:
+            conditions.append(Review.date <= end_date)
+        if source:
+            conditions.append(Review.source == source)
+        if cluster_id:
+            conditions.append(exists().where(
+                ReviewCluster.review_id == Review.id, ReviewCluster.review_date == Review.date,
+                ReviewCluster.cluster_id == cluster_id
+            ))
+        return conditions
+
+    async def get_feed_page(
+        self, session: AsyncSession, conditions: List[Any], order_by: str = "desc", size: int = 30,
+        after: Optional[Tuple[date, int]] = None, offset: int = 0
+    ) -> List[Review]:
+        """
+        Страница ленты в порядке (date, id). after — ключ последнего отзыва предыдущей страницы:
+        следующая страница берётся диапазоном индекса idx_reviews_date_id_covering без OFFSET.
+        """
+        key = tuple_(Review.date, Review.id)
+        statement = select(Review).where(*conditions)
+        if order_by == "asc":
+            if after is not None:
+                statement = statement.where(key > tuple_(*after))
+            statement = statement.order_by(Review.date.asc(), Review.id.asc())
+        else:
+            if after is not None:
+                statement = statement.where(key < tuple_(*after))
+            statement = statement.order_by(Review.date.desc(), Review.id.desc())
+        if offset:
+            statement = statement.offset(offset)
+        result = await session.execute(statement.limit(size))
+        return result.scalars().all()
+
+    async def count_feed(self, session: AsyncSession, conditions: List[Any]) -> int:
+        """Точное количество отзывов ленты"""
+        statement = select(func.count()).select_from(Review).where(*conditions)
+        result = await session.execute(statement)
+        return result.scalar_one()
+
+    async def estimate_feed_count(self, session: AsyncSession, conditions: List[Any]) -> int:
+        """Оценка количества отзывов ленты по плану запроса, без выполнения самого подсчёта"""
+        statement = select(Review.id).where(*conditions)
+        result = await session.execute(_Explain(statement))
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def bulk_create(
+        self, session: AsyncSession, reviews: List[Review], product_ids: List[List[int]]
+    ) -> List[Review]:
+        """
+        Сохранить отзывы со связями с продуктами (product_ids[i] — продукты reviews[i]).
+        Вклад отзывов в дневные и месячные агрегаты фиксируется тем же коммитом, что и сами отзывы.
+        """
+        if not reviews:
+            return reviews
+        # ensure_months фиксирует сессию, поэтому партиции создаются до добавления отзывов
+        await self._partition_repo.ensure_months(session, [review.date for review in reviews])
         session.add_all(reviews)
         await session.flush()
+        for review, review_product_ids in zip(reviews, product_ids):
+            await self.add_products_to_review(session, review, review_product_ids)
+        review_keys = [(review.id, review.date) for review in reviews]
+        await self._daily_fact_repo.apply_reviews(session, review_keys)
+        cells = await self._monthly_stats_repo.get_cells_for_reviews(session, review_keys)
+        await self._monthly_stats_repo.refresh(session, cells)
+        await self._cluster_stats_repo.refresh(session, cells)
+        await session.commit()
         return reviews
 
     async def count_by_product_and_period(
@@ -214,13 +473,13 @@ class ReviewRepository:
     ) -> int:
         if not product_ids:
             return 0
-        statement = select(func.count(func.distinct(Review.id))).join(ReviewProduct).where(
+        statement = select(func.count(func.distinct(ReviewProduct.review_id))).where(
             ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date,
-            Review.date <= end_date
+            ReviewProduct.review_date >= start_date,
+            ReviewProduct.review_date <= end_date
         )
         if source:
-            statement = statement.where(Review.source == source)
+            statement = statement.where(ReviewProduct.review_source == source)
         if sentiment:
             statement = statement.where(ReviewProduct.sentiment == sentiment)
         result = await session.execute(statement)
@@ -234,15 +493,15 @@ class ReviewRepository:
             return {"positive": 0, "neutral": 0, "negative": 0}
         statement = select(
             ReviewProduct.sentiment,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
+            func.count(func.distinct(ReviewProduct.review_id)).label("count")
+        ).where(
             ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date,
-            Review.date <= end_date,
+            ReviewProduct.review_date >= start_date,
+            ReviewProduct.review_date <= end_date,
             ReviewProduct.sentiment.isnot(None)
         ).group_by(ReviewProduct.sentiment)
         if source:
-            statement = statement.where(Review.source == source)
+            statement = statement.where(ReviewProduct.review_source == source)
         result = await session.execute(statement)
         tonality = {row[0]: row[1] for row in result.all() if row[0]}
         return {
@@ -258,18 +517,18 @@ class ReviewRepository:
         if not product_ids:
             return 0.0
         statement = select(
-            func.avg(Review.rating).label("avg_rating")
-        ).join(ReviewProduct).where(
+            func.avg(ReviewProduct.review_rating).label("avg_rating")
+        ).where(
             ReviewProduct.product_id.in_(product_ids),
-            Review.rating.isnot(None)
+            ReviewProduct.review_rating.isnot(None)
         )
         
         if start_date:
-            statement = statement.where(Review.date >= start_date)
+            statement = statement.where(ReviewProduct.review_date >= start_date)
         if end_date:
-            statement = statement.where(Review.date <= end_date)
+            statement = statement.where(ReviewProduct.review_date <= end_date)
         if source:
-            statement = statement.where(Review.source == source)
+            statement = statement.where(ReviewProduct.review_source == source)
             
         result = await session.execute(statement)
         avg_rating = result.scalar() or 0.0
@@ -326,12 +585,14 @@ class ClusterRepository:
         session.add(cluster)
         await session.flush()
         await session.commit()
+        product_hierarchy.invalidate()
         await session.refresh(cluster)
         return cluster
 
     async def update(self, session: AsyncSession, cluster: Cluster) -> Cluster:
         await session.merge(cluster)
         await session.commit()
+        product_hierarchy.invalidate()
         await session.refresh(cluster)
         return cluster
 
@@ -342,6 +603,7 @@ class ClusterRepository:
         if cluster:
             await session.delete(cluster)
             await session.commit()
+            product_hierarchy.invalidate()
             return True
         return False
 
@@ -385,12 +647,12 @@ class ReviewClusterRepository:
         if not product_ids:
             return 0
         
-        statement = select(func.count(func.distinct(Review.id))).select_from(ReviewCluster)\
-            .join(Review).join(ReviewProduct).where(
+        statement = select(func.count(func.distinct(ReviewProduct.review_id))).select_from(ReviewCluster)\
+            .join(ReviewProduct, review_cluster_link()).where(
                 and_(
                     ReviewProduct.product_id.in_(product_ids),
-                    Review.date >= start_date,
-                    Review.date <= end_date,
+                    ReviewProduct.review_date >= start_date,
+                    ReviewProduct.review_date <= end_date,
                     ReviewCluster.cluster_id == cluster_id
                 )
             )
@@ -398,6 +660,398 @@ class ReviewClusterRepository:
         result = await session.execute(statement)
         return result.scalar() or 0
 
+# Ключ advisory-блокировки, сериализующей пересчёт месячных агрегатов
+_MONTHLY_AGGREGATES_LOCK_KEY = 7310001
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) для произвольного select с его параметрами"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def _next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+def _previous_month(month: date) -> date:
+    return date(month.year - 1, 12, 1) if month.month == 1 else date(month.year, month.month - 1, 1)
+
+
+# Ключ advisory-блокировки, сериализующей создание и удаление партиций отзывов
+_REVIEW_PARTITIONS_LOCK_KEY = 7310002
+
+
+class ReviewPartitionRepository:
+    """
+    Месячные партиции reviews и review_products (диапазон по дате отзыва).
+    Партиция месяца создаётся до вставки первого отзыва этого месяца; месяцы, для которых
+    партиции уже проверены, запоминаются, чтобы обычная вставка не выполняла DDL.
+    Партиции старше retention_months удаляет процесс-лидер, поэтому запомненные месяцы старше
+    срока хранения снова проверяются перед вставкой.
+    """
+    # Партиционированные таблицы в порядке создания: review_products ссылается на reviews
+    PARTITIONED_TABLES = ("reviews", "review_products")
+
+    def __init__(self, retention_months: Optional[int] = None):
+        self._retention_months = retention_months
+        self._known_months: Set[date] = set()
+
+    @staticmethod
+    def partition_name(table: str, month: date) -> str:
+        return f"{table}_p{month:%Y%m}"
+
+    @staticmethod
+    def retention_cutoff(today: date, retention_months: int) -> date:
+        """Первый месяц, партиции которого хранятся: более ранние удаляются"""
+        cutoff = _month_start(today)
+        for _ in range(retention_months):
+            cutoff = _month_start(cutoff - timedelta(days=1))
+        return cutoff
+
+    def missing_months(self, days: Iterable[date]) -> List[date]:
+        """Месяцы days, партиции которых этот экземпляр ещё не проверял; только для них ensure_months фиксирует сессию"""
+        known = self._known_months
+        if self._retention_months:
+            cutoff = self.retention_cutoff(date.today(), self._retention_months)
+            known = {month for month in known if month >= cutoff}
+        return sorted({_month_start(day) for day in days} - known)
+
+    async def ensure_months(self, session: AsyncSession, days: Iterable[date]) -> List[date]:
+        """
+        Создать недостающие партиции месяцев, в которые попадают days.
+        DDL фиксируется сразу, чтобы партиции не откатывались вместе с неудачной вставкой.
+
+        Returns:
+            List[date]: Месяцы, партиции которых проверялись при этом вызове
+        """
+        missing = self.missing_months(days)
+        if not missing:
+            return []
+        await session.execute(select(func.pg_advisory_xact_lock(_REVIEW_PARTITIONS_LOCK_KEY)))
+        for month in missing:
+            for table in self.PARTITIONED_TABLES:
+                await session.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {self.partition_name(table, month)} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+                ))
+        await session.commit()
+        self._known_months.update(missing)
+        return missing
+
+    async def ensure_ahead(self, session: AsyncSession, today: date, months_ahead: int) -> List[date]:
+        """Партиции текущего месяца и months_ahead следующих"""
+        months = [_month_start(today)]
+        for _ in range(months_ahead):
+            months.append(_next_month(months[-1]))
+        return await self.ensure_months(session, months)
+
+    async def get_months(self, session: AsyncSession) -> List[date]:
+        """Месяцы, для которых существуют партиции reviews"""
+        result = await session.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'reviews'::regclass"
+        ))
+        prefix = "reviews_p"
+        return sorted(
+            datetime.strptime(name[len(prefix):], "%Y%m").date()
+            for name in result.scalars().all() if name.startswith(prefix)
+        )
+
+    async def drop_months_before(self, session: AsyncSession, month: date) -> List[date]:
+        """
+        Удалить партиции месяцев раньше month вместе с отзывами и их привязками.
+        Вместо построчного DELETE партиции отсоединяются и удаляются целиком; привязки к кластерам
+        (непартиционированная review_clusters) удаляются диапазоном по review_date.
+        Дневные и месячные агрегаты не пересчитываются — история на дашбордах сохраняется.
+
+        Returns:
+            List[date]: Удалённые месяцы
+        """
+        await session.execute(select(func.pg_advisory_xact_lock(_REVIEW_PARTITIONS_LOCK_KEY)))
+        cutoff = _month_start(month)
+        dropped = [m for m in await self.get_months(session) if m < cutoff]
+        if not dropped:
+            return []
+        await session.execute(delete(ReviewCluster).where(ReviewCluster.review_date < cutoff))
+        for old_month in dropped:
+            for table in reversed(self.PARTITIONED_TABLES):
+                partition = self.partition_name(table, old_month)
+                await session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+                await session.execute(text(f"DROP TABLE {partition}"))
+        await session.commit()
+        self._known_months.difference_update(dropped)
+        return dropped
+
+def review_cluster_link():
+    """Условие соединения привязки к кластеру со связью отзыва с продуктом без таблицы reviews"""
+    return and_(
+        ReviewCluster.review_id == ReviewProduct.review_id,
+        ReviewCluster.review_date == ReviewProduct.review_date
+    )
+
+def review_links_condition(review_keys: Iterable[Tuple[int, date]]) -> List[Any]:
+    """
+    Фильтр связей review_products по парам (id, дата) отзывов. Условие на review_date позволяет
+    планировщику обращаться только к партициям этих дат, а не к индексу review_id каждой партиции.
+    """
+    review_keys = list(review_keys)
+    return [
+        ReviewProduct.review_id.in_(sorted({review_id for review_id, _ in review_keys})),
+        ReviewProduct.review_date.in_(sorted({review_date for _, review_date in review_keys})),
+    ]
+
+
+def _review_node_contributions(review_keys: Optional[List[Tuple[int, date]]] = None, *conditions):
+    """
+    CTE вклада отзывов в узлы дерева продуктов: строка на каждую пару
+    (связь review_products, узел), где узел — сам продукт связи или его предок-категория/подкатегория.
+    review_keys — пары (id, дата) отзывов; фильтр по датам отсекает лишние партиции review_products.
+    Колонки: product_id (узел), review_id, day, source, rating, sentiment.
+    """
+    ancestor = aliased(Product)
+    contributions = select(
+        ProductClosure.ancestor_id.label("product_id"),
+        ReviewProduct.review_id.label("review_id"),
+        ReviewProduct.review_date.label("day"),
+        func.coalesce(ReviewProduct.review_source, "").label("source"),
+        ReviewProduct.review_rating.label("rating"),
+        ReviewProduct.sentiment.label("sentiment")
+    ).select_from(ReviewProduct)\
+        .join(ProductClosure, ProductClosure.descendant_id == ReviewProduct.product_id)\
+        .join(ancestor, ancestor.id == ProductClosure.ancestor_id)\
+        .where(
+            (ProductClosure.depth == 0) |
+            ancestor.type.in_([ProductType.CATEGORY, ProductType.SUBCATEGORY]),
+            *conditions
+        )
+    if review_keys is not None:
+        contributions = contributions.where(*review_links_condition(review_keys))
+    return contributions.cte("review_contributions")
+
+class ReviewDailyFactRepository:
+    async def apply_reviews(self, session: AsyncSession, review_keys: List[Tuple[int, date]], sign: int = 1) -> None:
+        """
+        Добавить (sign=1) или вычесть (sign=-1) вклад отзывов (пары id, дата) в дневные агрегаты.
+        Отзывы и их связи с продуктами уже должны быть записаны в сессии.
+        """
+        if not review_keys:
+            return
+        await self._upsert(session, review_keys, sign)
+        if sign < 0:
+            await session.execute(delete(ReviewDailyFact).where(ReviewDailyFact.review_count <= 0))
+
+    async def rebuild(self, session: AsyncSession) -> None:
+        """Полностью пересчитать агрегаты по всем отзывам"""
+        await session.execute(delete(ReviewDailyFact))
+        await self._upsert(session, None, 1)
+
+    async def is_empty(self, session: AsyncSession) -> bool:
+        statement = select(~exists().where(ReviewDailyFact.id.isnot(None)))
+        result = await session.execute(statement)
+        return result.scalar()
+
+    async def _upsert(self, session: AsyncSession, review_keys: Optional[List[Tuple[int, date]]], sign: int) -> None:
+        contributions = _review_node_contributions(review_keys)
+
+        per_review = select(
+            contributions.c.product_id, contributions.c.review_id, contributions.c.day,
+            contributions.c.source, contributions.c.rating
+        ).distinct().subquery()
+        totals = select(
+            per_review.c.product_id,
+            per_review.c.day,
+            per_review.c.source,
+            literal("all").label("sentiment"),
+            (func.count() * sign).label("review_count"),
+            (func.coalesce(func.sum(per_review.c.rating), 0) * sign).label("rating_sum"),
+            (func.count(per_review.c.rating) * sign).label("rating_count")
+        ).group_by(per_review.c.product_id, per_review.c.day, per_review.c.source)
+
+        per_sentiment = select(
+            contributions.c.product_id, contributions.c.review_id, contributions.c.day,
+            contributions.c.source, contributions.c.rating, contributions.c.sentiment
+        ).where(contributions.c.sentiment.isnot(None)).distinct().subquery()
+        by_sentiment = select(
+            per_sentiment.c.product_id,
+            per_sentiment.c.day,
+            per_sentiment.c.source,
+            per_sentiment.c.sentiment,
+            (func.count() * sign).label("review_count"),
+            (func.coalesce(func.sum(per_sentiment.c.rating), 0) * sign).label("rating_sum"),
+            (func.count(per_sentiment.c.rating) * sign).label("rating_count")
+        ).group_by(
+            per_sentiment.c.product_id, per_sentiment.c.day, per_sentiment.c.source, per_sentiment.c.sentiment
+        )
+
+        columns = ["product_id", "day", "source", "sentiment", "review_count", "rating_sum", "rating_count"]
+        statement = pg_insert(ReviewDailyFact).from_select(columns, totals.union_all(by_sentiment))
+        statement = statement.on_conflict_do_update(
+            constraint="uq_review_daily_facts_key",
+            set_={
+                "review_count": ReviewDailyFact.review_count + statement.excluded.review_count,
+                "rating_sum": ReviewDailyFact.rating_sum + statement.excluded.rating_sum,
+                "rating_count": ReviewDailyFact.rating_count + statement.excluded.rating_count,
+            }
+        )
+        await session.execute(statement)
+
+    async def get_totals(
+        self, session: AsyncSession, product_id: int, start_date: date, end_date: date,
+        source: Optional[str] = None
+    ) -> Dict[str, int]:
+        """Количество отзывов и разбивка по тональности узла за период"""
+        def total_for(sentiment: str):
+            return func.coalesce(func.sum(case(
+                (ReviewDailyFact.sentiment == sentiment, ReviewDailyFact.review_count), else_=0
+            )), 0)
+
+        statement = select(
+            total_for("all").label("count"),
+            total_for("positive").label("positive"),
+            total_for("neutral").label("neutral"),
+            total_for("negative").label("negative")
+        ).where(
+            ReviewDailyFact.product_id == product_id,
+            ReviewDailyFact.day >= start_date,
+            ReviewDailyFact.day <= end_date
+        )
+        if source:
+            statement = statement.where(ReviewDailyFact.source == source)
+        row = (await session.execute(statement)).one()
+        return {"count": row.count, "positive": row.positive, "neutral": row.neutral, "negative": row.negative}
+
+    async def get_period_buckets(
+        self, session: AsyncSession, product_id: int, periods: List[Tuple[date, date]],
+        date_trunc: str, source: Optional[str] = None
+    ) -> List[Any]:
+        """
+        Интервалы агрегации узла сразу для нескольких периодов одним сканированием:
+        строка на (интервал, тональность), в колонке count_<i> — количество отзывов i-го периода.
+        Периоды могут пересекаться, каждый день учитывается в каждом периоде, куда попадает.
+        """
+        if not periods:
+            return []
+
+        in_periods = [
+            and_(ReviewDailyFact.day >= start, ReviewDailyFact.day <= end) for start, end in periods
+        ]
+        agg_date = func.date_trunc(date_trunc, ReviewDailyFact.day).label("agg_date")
+        statement = select(
+            agg_date,
+            ReviewDailyFact.sentiment,
+            *(
+                func.coalesce(func.sum(case((in_period, ReviewDailyFact.review_count), else_=0)), 0).label(f"count_{i}")
+                for i, in_period in enumerate(in_periods)
+            )
+        ).where(
+            ReviewDailyFact.product_id == product_id,
+            or_(*in_periods)
+        )
+        if source:
+            statement = statement.where(ReviewDailyFact.source == source)
+        statement = statement.group_by(agg_date, ReviewDailyFact.sentiment).order_by(agg_date)
+        result = await session.execute(statement)
+        return result.all()
+
+    async def get_stats_by_products(
+        self, session: AsyncSession, product_ids: List[int], start_date: date, end_date: date,
+        start_date2: date, end_date2: date, source: Optional[str] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Статистика для списка узлов одним сгруппированным запросом: количество и тональность
+        за первый период, количество за второй период и средний рейтинг за всё время.
+        """
+        if not product_ids:
+            return {}
+
+        in_period1 = and_(ReviewDailyFact.day >= start_date, ReviewDailyFact.day <= end_date)
+        in_period2 = and_(ReviewDailyFact.day >= start_date2, ReviewDailyFact.day <= end_date2)
+        is_total = ReviewDailyFact.sentiment == "all"
+
+        def total_for(condition, value=ReviewDailyFact.review_count):
+            return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+        statement = select(
+            ReviewDailyFact.product_id,
+            total_for(and_(is_total, in_period1)).label("count"),
+            total_for(and_(ReviewDailyFact.sentiment == "positive", in_period1)).label("positive"),
+            total_for(and_(ReviewDailyFact.sentiment == "neutral", in_period1)).label("neutral"),
+            total_for(and_(ReviewDailyFact.sentiment == "negative", in_period1)).label("negative"),
+            total_for(and_(is_total, in_period2)).label("prev_count"),
+            total_for(is_total, ReviewDailyFact.rating_sum).label("rating_sum"),
+            total_for(is_total, ReviewDailyFact.rating_count).label("rating_count")
+        ).where(ReviewDailyFact.product_id.in_(product_ids)).group_by(ReviewDailyFact.product_id)
+        if source:
+            statement = statement.where(ReviewDailyFact.source == source)
+
+        result = await session.execute(statement)
+        return {
+            row.product_id: {
+                "count": row.count,
+                "prev_count": row.prev_count,
+                "tonality": {"positive": row.positive, "neutral": row.neutral, "negative": row.negative},
+                "avg_rating": row.rating_sum / row.rating_count if row.rating_count else 0.0
+            }
+            for row in result.all()
+        }
+
+    async def get_metrics_by_ranges(
+        self, session: AsyncSession, ranges: List[Tuple[int, date, date]], chunk_size: int = 1000
+    ) -> Dict[Tuple[int, date, date], Dict[str, Any]]:
+        """
+        Количество отзывов, тональность и средний рейтинг для набора (узел, начало, конец) одним
+        сгруппированным запросом на chunk_size диапазонов. Узел включает отзывы всех потомков.
+        Диапазоны без отзывов в ответ не попадают.
+        """
+        metrics = {}
+        ranges = list(dict.fromkeys(ranges))
+        for offset in range(0, len(ranges), chunk_size):
+            chunk = ranges[offset:offset + chunk_size]
+            wanted = values(
+                column("range_index", Integer), column("product_id", Integer),
+                column("start_date", Date), column("end_date", Date),
+                name="wanted_ranges"
+            ).data([(offset + i, *item) for i, item in enumerate(chunk)])
+
+            def total_for(sentiment: str, value=ReviewDailyFact.review_count):
+                return func.coalesce(func.sum(case((ReviewDailyFact.sentiment == sentiment, value), else_=0)), 0)
+
+            statement = select(
+                wanted.c.range_index,
+                total_for("all").label("count"),
+                total_for("positive").label("positive"),
+                total_for("neutral").label("neutral"),
+                total_for("negative").label("negative"),
+                total_for("all", ReviewDailyFact.rating_sum).label("rating_sum"),
+                total_for("all", ReviewDailyFact.rating_count).label("rating_count")
+            ).join_from(
+                wanted, ReviewDailyFact,
+                and_(
+                    ReviewDailyFact.product_id == wanted.c.product_id,
+                    ReviewDailyFact.day >= wanted.c.start_date,
+                    ReviewDailyFact.day <= wanted.c.end_date
+                )
+            ).group_by(wanted.c.range_index)
+
+            for row in (await session.execute(statement)).all():
+                metrics[ranges[row.range_index]] = {
+                    "count": row.count,
+                    "tonality": {"positive": row.positive, "neutral": row.neutral, "negative": row.negative},
+                    "avg_rating": row.rating_sum / row.rating_count if row.rating_count else 0.0
+                }
+        return metrics
+
 class MonthlyStatsRepository:
     async def get_by_product_and_month(self, session: AsyncSession, product_id: int, month: date) -> MonthlyStats | None:
         statement = select(MonthlyStats).where(
@@ -426,6 +1080,109 @@ class MonthlyStatsRepository:
         await session.refresh(stats)
         return stats
 
+    async def get_cells_for_reviews(self, session: AsyncSession, review_keys: List[Tuple[int, date]]) -> List[tuple]:
+        """Ячейки (узел, месяц), в которые попадают отзывы (пары id, дата): узлы с их предками-категориями"""
+        if not review_keys:
+            return []
+        contributions = _review_node_contributions(review_keys)
+        month = cast(func.date_trunc("month", contributions.c.day), Date)
+        statement = select(contributions.c.product_id, month).distinct()
+        result = await session.execute(statement)
+        return [(row[0], row[1]) for row in result.all()]
+
+    async def refresh(self, session: AsyncSession, cells: Optional[List[tuple]] = None) -> None:
+        """
+        Пересчитать месячную статистику из дневных агрегатов.
+        cells — ячейки (узел, месяц); вместе с ними пересчитывается следующий месяц,
+        так как его count_change_percent зависит от изменившегося. None — полный пересчёт.
+        """
+        if cells is not None and not cells:
+            return
+        await session.execute(select(func.pg_advisory_xact_lock(_MONTHLY_AGGREGATES_LOCK_KEY)))
+
+        month = cast(func.date_trunc("month", ReviewDailyFact.day), Date).label("month")
+
+        def total_for(condition, value=ReviewDailyFact.review_count):
+            return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+        is_total = ReviewDailyFact.sentiment == "all"
+        statement = select(
+            ReviewDailyFact.product_id,
+            month,
+            total_for(is_total).label("review_count"),
+            total_for(ReviewDailyFact.sentiment == "positive").label("positive_count"),
+            total_for(ReviewDailyFact.sentiment == "neutral").label("neutral_count"),
+            total_for(ReviewDailyFact.sentiment == "negative").label("negative_count"),
+            total_for(is_total, ReviewDailyFact.rating_sum).label("rating_sum"),
+            total_for(is_total, ReviewDailyFact.rating_count).label("rating_count")
+        ).group_by(ReviewDailyFact.product_id, month)
+
+        if cells is None:
+            await session.execute(delete(MonthlyStats))
+        else:
+            target_cells = {(product_id, _month_start(cell_month)) for product_id, cell_month in cells}
+            target_cells |= {(product_id, _next_month(cell_month)) for product_id, cell_month in target_cells}
+            needed_cells = target_cells | {
+                (product_id, _previous_month(cell_month)) for product_id, cell_month in target_cells
+            }
+            await session.execute(
+                delete(MonthlyStats).where(
+                    tuple_(MonthlyStats.product_id, MonthlyStats.month).in_(list(target_cells))
+                )
+            )
+            statement = statement.where(
+                ReviewDailyFact.product_id.in_({product_id for product_id, _ in needed_cells}),
+                ReviewDailyFact.day >= min(cell_month for _, cell_month in needed_cells),
+                ReviewDailyFact.day < _next_month(max(cell_month for _, cell_month in needed_cells))
+            )
+
+        result = await session.execute(statement)
+        by_cell = {(row.product_id, row.month): row for row in result.all()}
+
+        rows = []
+        for (product_id, cell_month), row in by_cell.items():
+            if cells is not None and (product_id, cell_month) not in target_cells:
+                continue
+            if row.review_count <= 0:
+                continue
+            previous = by_cell.get((product_id, _previous_month(cell_month)))
+            prev_count = previous.review_count if previous else 0
+            count_change_percent = (
+                round(((row.review_count - prev_count) / prev_count * 100), 1)
+                if prev_count > 0
+                else 100.0 if row.review_count > 0 else 0.0
+            )
+            rows.append({
+                "product_id": product_id,
+                "month": cell_month,
+                "review_count": row.review_count,
+                "count_change_percent": count_change_percent,
+                "avg_rating": row.rating_sum / row.rating_count if row.rating_count else None,
+                "positive_count": row.positive_count,
+                "neutral_count": row.neutral_count,
+                "negative_count": row.negative_count,
+                "sentiment_trend": (row.positive_count - row.negative_count) / row.review_count,
+            })
+        if rows:
+            await session.execute(insert(MonthlyStats), rows)
+
+    async def is_empty(self, session: AsyncSession) -> bool:
+        statement = select(~exists().where(MonthlyStats.id.isnot(None)))
+        result = await session.execute(statement)
+        return result.scalar()
+
+    async def get_review_count(
+        self, session: AsyncSession, product_id: int, start_month: date, end_month: date
+    ) -> int:
+        """Количество отзывов узла за полные месяцы [start_month, end_month]"""
+        statement = select(func.coalesce(func.sum(MonthlyStats.review_count), 0)).where(
+            MonthlyStats.product_id == product_id,
+            MonthlyStats.month >= start_month,
+            MonthlyStats.month <= end_month
+        )
+        result = await session.execute(statement)
+        return result.scalar()
+
 class ClusterStatsRepository:
     async def get_by_cluster_and_product_and_month(
         self, session: AsyncSession, cluster_id: int, product_id: int, month: Optional[date] = None
@@ -445,6 +1202,139 @@ class ClusterStatsRepository:
         await session.refresh(stats)
         return stats
 
+    async def refresh(self, session: AsyncSession, cells: Optional[List[tuple]] = None) -> None:
+        """
+        Пересчитать статистику кластеров для ячеек (узел, месяц) по всем кластерам.
+        None — полный пересчёт.
+        """
+        if cells is not None and not cells:
+            return
+        await session.execute(select(func.pg_advisory_xact_lock(_MONTHLY_AGGREGATES_LOCK_KEY)))
+
+        conditions = []
+        target_cells = None
+        if cells is None:
+            await session.execute(delete(ClusterStats))
+        else:
+            target_cells = list({(product_id, _month_start(cell_month)) for product_id, cell_month in cells})
+            await session.execute(
+                delete(ClusterStats).where(tuple_(ClusterStats.product_id, ClusterStats.month).in_(target_cells))
+            )
+            conditions = [
+                ReviewProduct.review_date >= min(cell_month for _, cell_month in target_cells),
+                ReviewProduct.review_date < _next_month(max(cell_month for _, cell_month in target_cells))
+            ]
+
+        contributions = _review_node_contributions(None, *conditions)
+        month = cast(func.date_trunc("month", contributions.c.day), Date).label("month")
+        effective_sentiment = func.coalesce(ReviewCluster.sentiment_contribution, contributions.c.sentiment)
+
+        def weight_for(sentiment: str):
+            return func.coalesce(func.sum(case(
+                (effective_sentiment == sentiment, ReviewCluster.topic_weight), else_=0
+            )), 0)
+
+        weights = select(
+            ReviewCluster.cluster_id,
+            contributions.c.product_id,
+            month,
+            func.coalesce(func.sum(ReviewCluster.topic_weight), 0).label("weighted_review_count"),
+            weight_for("positive").label("positive_weight"),
+            weight_for("neutral").label("neutral_weight"),
+            weight_for("negative").label("negative_weight")
+        ).join(ReviewCluster, and_(
+            ReviewCluster.review_id == contributions.c.review_id, ReviewCluster.review_date == contributions.c.day
+        ))\
+            .group_by(ReviewCluster.cluster_id, contributions.c.product_id, month)
+
+        per_review = select(
+            ReviewCluster.cluster_id,
+            contributions.c.product_id,
+            month,
+            contributions.c.review_id,
+            contributions.c.rating
+        ).join(ReviewCluster, and_(
+            ReviewCluster.review_id == contributions.c.review_id, ReviewCluster.review_date == contributions.c.day
+        )).distinct().subquery()
+        reviews = select(
+            per_review.c.cluster_id,
+            per_review.c.product_id,
+            per_review.c.month,
+            func.count().label("review_count"),
+            func.avg(per_review.c.rating).label("avg_rating")
+        ).group_by(per_review.c.cluster_id, per_review.c.product_id, per_review.c.month)
+
+        if target_cells is not None:
+            weights = weights.where(tuple_(contributions.c.product_id, month).in_(target_cells))
+            reviews = reviews.where(tuple_(per_review.c.product_id, per_review.c.month).in_(target_cells))
+
+        review_rows = {
+            (row.cluster_id, row.product_id, row.month): row
+            for row in (await session.execute(reviews)).all()
+        }
+
+        rows = []
+        for row in (await session.execute(weights)).all():
+            review_row = review_rows.get((row.cluster_id, row.product_id, row.month))
+            tonality_weight = row.positive_weight + row.neutral_weight + row.negative_weight
+            rows.append({
+                "cluster_id": row.cluster_id,
+                "product_id": row.product_id,
+                "month": row.month,
+                "weighted_review_count": float(row.weighted_review_count),
+                "review_count": review_row.review_count if review_row else 0,
+                "positive_percent": round(row.positive_weight / tonality_weight * 100, 1) if tonality_weight else None,
+                "neutral_percent": round(row.neutral_weight / tonality_weight * 100, 1) if tonality_weight else None,
+                "negative_percent": round(row.negative_weight / tonality_weight * 100, 1) if tonality_weight else None,
+                "avg_rating": float(review_row.avg_rating) if review_row and review_row.avg_rating is not None else None,
+            })
+        if rows:
+            await session.execute(insert(ClusterStats), rows)
+
+    async def get_review_counts(
+        self, session: AsyncSession, product_id: int, cluster_ids: List[int], start_month: date, end_month: date
+    ) -> Dict[int, int]:
+        """Количество отзывов узла по кластерам за полные месяцы [start_month, end_month]"""
+        statement = select(
+            ClusterStats.cluster_id,
+            func.sum(ClusterStats.review_count).label("review_count")
+        ).where(
+            ClusterStats.product_id == product_id,
+            ClusterStats.cluster_id.in_(cluster_ids),
+            ClusterStats.month >= start_month,
+            ClusterStats.month <= end_month
+        ).group_by(ClusterStats.cluster_id)
+        result = await session.execute(statement)
+        return {row.cluster_id: row.review_count for row in result.all()}
+
+    async def get_monthly_review_counts(
+        self, session: AsyncSession, product_id: int, cluster_ids: List[int], start_month: date, end_month: date
+    ) -> List[Any]:
+        """Количество отзывов узла по месяцам и кластерам; строки (month, cluster_id, review_count)"""
+        statement = select(
+            ClusterStats.month,
+            ClusterStats.cluster_id,
+            ClusterStats.review_count
+        ).where(
+            ClusterStats.product_id == product_id,
+            ClusterStats.cluster_id.in_(cluster_ids),
+            ClusterStats.month >= start_month,
+            ClusterStats.month <= end_month
+        ).order_by(ClusterStats.month)
+        result = await session.execute(statement)
+        return result.all()
+
+    async def get_weighted_count(
+        self, session: AsyncSession, product_id: int, cluster_id: int, month: date
+    ) -> float:
+        statement = select(func.coalesce(func.sum(ClusterStats.weighted_review_count), 0.0)).where(
+            ClusterStats.product_id == product_id,
+            ClusterStats.cluster_id == cluster_id,
+            ClusterStats.month == month
+        )
+        result = await session.execute(statement)
+        return result.scalar()
+
 class NotificationRepository:
     async def get_by_user_id(self, session: AsyncSession, user_id: int, is_read: Optional[bool] = None) -> List[Notification]:
         statement = select(Notification).where(Notification.user_id == user_id).order_by(Notification.created_at.desc())
@@ -467,6 +1357,19 @@ class NotificationRepository:
         await session.refresh(notification)
         return notification
 
+    async def get_after(self, session: AsyncSession, user_id: int, after_id: int, limit: int = 100) -> List[Notification]:
+        """Уведомления пользователя новее after_id в порядке создания — пропущенные потоком за время переподключения"""
+        statement = select(Notification).where(
+            Notification.user_id == user_id, Notification.id > after_id
+        ).order_by(Notification.id).limit(limit)
+        result = await session.execute(statement)
+        return result.scalars().all()
+
+    async def save_many(self, session: AsyncSession, notifications: List[Dict[str, Any]]) -> None:
+        """Многострочная вставка уведомлений без коммита; коммит — на вызывающем"""
+        if notifications:
+            await session.execute(insert(Notification), notifications)
+
     async def update_read_status(self, session: AsyncSession, notification_id: int, user_id: int) -> bool:
         statement = select(Notification).where(
             and_(Notification.id == notification_id, Notification.user_id == user_id)
@@ -530,8 +1433,13 @@ class NotificationConfigRepository:
             return True
         return False
 
-    async def get_active_configs(self, session: AsyncSession) -> List[NotificationConfig]:
+    async def get_active_configs(
+        self, session: AsyncSession, product_ids: Optional[Iterable[int]] = None
+    ) -> List[NotificationConfig]:
+        """Активные конфигурации; product_ids ограничивает выборку конфигурациями этих узлов"""
         statement = select(NotificationConfig).where(NotificationConfig.active == True)
+        if product_ids is not None:
+            statement = statement.where(NotificationConfig.product_id.in_(list(product_ids)))
         result = await session.execute(statement)
         return result.scalars().all()
     
@@ -694,7 +1602,59 @@ class AuditLogRepository:
         await session.refresh(log)
         return log
 
+    async def save_many(self, session: AsyncSession, logs: List[Dict[str, Any]]) -> None:
+        """Многострочная вставка записей аудита без коммита; коммит — на вызывающем"""
+        if logs:
+            await session.execute(insert(AuditLog), logs)
+
     async def get_all_by_user(self, session: AsyncSession, user_id: int, page: int = 0, size: int = 100) -> List[AuditLog]:
         statement = select(AuditLog).where(AuditLog.user_id == user_id).order_by(AuditLog.timestamp.desc()).offset(page * size).limit(size)
         result = await session.execute(statement)
-        return result.scalars().all()
\ No newline at end of file
+        return result.scalars().all()
+
+class DataWatermarkRepository:
+    async def get(self, session: AsyncSession) -> Optional[Tuple[int, datetime]]:
+        """
+        Текущая версия данных дашбордов: строка с version (сумма по строкам data_watermark)
+        и updated_at (последнее изменение); None, если миграция ещё не создала строки
+        """
+        statement = select(
+            cast(func.sum(DataWatermark.version), BigInteger).label("version"),
+            func.max(DataWatermark.updated_at).label("updated_at")
+        )
+        row = (await session.execute(statement)).one()
+        return row if row.version is not None else None
+
+
+class AggregatesWatermarkRepository:
+    async def get(self, session: AsyncSession) -> Optional[datetime]:
+        """
+        Момент последнего обновления месячных агрегатов; None, если они ещё не обновлялись.
+        Строка блокируется до конца транзакции, поэтому одновременные обновления выполняются по очереди
+        """
+        statement = select(AggregatesWatermark.refreshed_at).where(AggregatesWatermark.id == 1).with_for_update()
+        result = await session.execute(statement)
+        return result.scalar_one_or_none()
+
+    async def get_safe_point(self, session: AsyncSession) -> datetime:
+        """
+        Момент, до которого все изменения уже видны: начало самой старой открытой транзакции в базе.
+        created_at отзывов и привязок — время начала записавшей их транзакции, поэтому транзакция,
+        начатая до обновления и зафиксированная после него, попадёт в следующее обновление
+        """
+        oldest_transaction = (
+            select(func.min(text("xact_start")))
+            .select_from(text("pg_stat_activity"))
+            .where(text("datname = current_database()"))
+            .scalar_subquery()
+        )
+        statement = select(func.least(func.localtimestamp(), cast(oldest_transaction, TIMESTAMP)))
+        result = await session.execute(statement)
+        return result.scalar_one()
+
+    async def set(self, session: AsyncSession, refreshed_at: datetime) -> None:
+        statement = pg_insert(AggregatesWatermark).values(id=1, refreshed_at=refreshed_at)
+        statement = statement.on_conflict_do_update(
+            index_elements=[AggregatesWatermark.id], set_={"refreshed_at": refreshed_at}
+        )
+        await session.execute(statement)
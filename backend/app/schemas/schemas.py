@@ -1,9 +1,10 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 from typing import Optional, List, Dict, Any, Literal
 from enum import StrEnum, Enum
 from datetime import date, datetime
 from app.utils.utils import NonEmptyStr
 from app.models.user_models import UserRole
+from app.schemas.auth_schema import PageConfig
 
 class ProductType(StrEnum):
     CATEGORY = "category"
@@ -111,6 +112,8 @@ class ReviewResponseWithArray(ReviewBase):
 
 class ReviewsResponse(BaseModel):
     total: int
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
     reviews: List[ReviewResponseWithArray]
     
     class Config:
@@ -337,4 +340,26 @@ class ReviewPrediction(BaseModel):
     sentiments: List[str]
 
 class ReviewAnalysisResponse(BaseModel):
-    predictions: List[ReviewPrediction]
\ No newline at end of file
+    predictions: List[ReviewPrediction]
+
+class DashboardPageRequest(BaseModel):
+    page: Optional[PageConfig] = None
+    page_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def validate_page_source(self):
+        if self.page is None and self.page_id is None:
+            raise ValueError("Нужно передать page или page_id")
+        return self
+
+class DashboardChartResult(BaseModel):
+    id: str
+    name: str
+    type: str
+    data: Optional[Any] = None
+    error: Optional[str] = None
+
+class DashboardPageResponse(BaseModel):
+    page_id: str
+    name: str
+    charts: List[DashboardChartResult]
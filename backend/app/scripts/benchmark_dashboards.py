@@ -0,0 +1,353 @@
+"""
+Нагрузочный прогон GET-эндпоинтов дашбордов с отчётом в JSON для сравнения между коммитами.
+
+Каждый эндпоинт вызывается --requests раз с --concurrency одновременными запросами. Продукт и период
+каждого запроса выбираются случайно (продукты — из /public-product-tree, периоды — внутри
+[--from-date, --to-date]), чтобы прогон не сводился к попаданиям в кэш дашбордов. В отчёте — p50/p95/p99
+и среднее время ответа, ошибки, размер ответа (после сжатия), процессорное время сервера на запрос
+(по process_cpu_seconds_total из /metrics; точно, если в это время нет другой нагрузки) и, если приложение
+запущено с debug, число SQL-запросов и время в БД на запрос (заголовки X-DB-*).
+
+    python -m app.scripts.benchmark_dashboards --base-url http://localhost:8000 --output before.json
+    python -m app.scripts.benchmark_dashboards --output after.json --compare before.json
+
+При --compare код возврата 1, если p95 какого-либо эндпоинта вырос больше чем на --threshold процентов.
+Сравнение путей сериализации на одной сборке: прогон с FAST_JSON_RESPONSES=false и с режимом по умолчанию.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1/dashboards"
+Params = List[Tuple[str, str]]
+
+
+def _leaf_ids(nodes: List[Dict[str, Any]]) -> List[int]:
+    ids = []
+    for node in nodes:
+        children = node.get("children") or []
+        ids.extend(_leaf_ids(children) if children else [node["id"]])
+    return ids
+
+
+class ParamsFactory:
+    """Случайные параметры запросов: продукт, два периода одинаковой длины и тип агрегации"""
+
+    def __init__(self, args: argparse.Namespace, product_ids: List[int], root_ids: List[int], cluster_ids: List[int]):
+        self._rng = random.Random(args.seed)
+        self._from = args.from_date
+        self._to = args.to_date
+        self._period_days = args.period_days
+        self._product_ids = product_ids
+        self._root_ids = root_ids
+        self._cluster_ids = cluster_ids
+        self._sources = args.sources
+
+    def _product(self) -> int:
+        # Корневые категории — самые тяжёлые запросы, их доля фиксирована
+        if self._root_ids and self._rng.random() < 0.2:
+            return self._rng.choice(self._root_ids)
+        return self._rng.choice(self._product_ids)
+
+    def _periods(self) -> Tuple[date, date, date, date]:
+        span = max((self._to - self._from).days - 2 * self._period_days, 0)
+        start2 = self._from + timedelta(days=self._rng.randint(0, span))
+        end2 = start2 + timedelta(days=self._period_days - 1)
+        start = end2 + timedelta(days=1)
+        return start, start + timedelta(days=self._period_days - 1), start2, end2
+
+    def _source(self, params: Params) -> Params:
+        if self._sources and self._rng.random() < 0.3:
+            params.append(("source", self._rng.choice(self._sources)))
+        return params
+
+    def days(self, aggregation: Optional[str] = None) -> Params:
+        start, end, start2, end2 = self._periods()
+        params = [("product_id", str(self._product()))]
+        if aggregation == "month":
+            dates = [value.strftime("%Y-%m") for value in (start, end, start2, end2)]
+        else:
+            dates = [value.isoformat() for value in (start, end, start2, end2)]
+        params += list(zip(("start_date", "end_date", "start_date2", "end_date2"), dates))
+        if aggregation:
+            params.append(("aggregation_type", aggregation))
+        return self._source(params)
+
+    def aggregated(self) -> Params:
+        return self.days(self._rng.choice(("month", "week", "day")))
+
+    def period_comparison(self) -> Params:
+        aggregation = self._rng.choice(("month", "week"))
+        params = [("product_id", str(self._product())), ("aggregation_type", aggregation)]
+        for _ in range(3):
+            start, end, _, _ = self._periods()
+            if aggregation == "month":
+                params.append(("periods", f"{start:%Y-%m}:{end:%Y-%m}"))
+            else:
+                params.append(("periods", f"{start.isoformat()}:{end.isoformat()}"))
+        return self._source(params)
+
+    def product_stats(self) -> Params:
+        params = [(key, value) for key, value in self.days() if key != "product_id"]
+        if self._rng.random() < 0.5:
+            params.append(("product_id", str(self._rng.choice(self._root_ids or self._product_ids))))
+        return params
+
+    def single_period(self) -> Params:
+        start, end, _, _ = self._periods()
+        params = [("product_id", str(self._product())), ("start_date", start.isoformat()), ("end_date", end.isoformat())]
+        if self._cluster_ids and self._rng.random() < 0.3:
+            params.append(("cluster_id", str(self._rng.choice(self._cluster_ids))))
+        return params
+
+    def reviews(self) -> Params:
+        params = self.single_period()
+        params.append(("size", "30"))
+        return self._source(params)
+
+    def none(self) -> Params:
+        return []
+
+
+def _endpoints(factory: ParamsFactory) -> Dict[str, Callable[[], Params]]:
+    return {
+        "product-stats": factory.product_stats,
+        "monthly-review-count": factory.aggregated,
+        "period-comparison": factory.period_comparison,
+        "bar_chart_changes": factory.aggregated,
+        "monthly-pie-chart": factory.days,
+        "small-bar-charts": factory.single_period,
+        "monthly-stacked-bars": factory.aggregated,
+        "tonality-stacked-bars": factory.aggregated,
+        "line-and-bar-pie-chart": factory.days,
+        "change-chart": factory.days,
+        "reviews": factory.reviews,
+        "public-product-tree": factory.none,
+        "clusters": factory.none,
+    }
+
+
+async def _server_cpu_seconds(http: aiohttp.ClientSession, base_url: str) -> Optional[float]:
+    """Процессорное время процесса приложения из /metrics; None, если метрика недоступна"""
+    try:
+        async with http.get(f"{base_url}/metrics") as response:
+            if response.status != 200:
+                return None
+            for line in (await response.text()).splitlines():
+                if line.startswith("process_cpu_seconds_total "):
+                    return float(line.split()[1])
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return None
+    return None
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    array = np.asarray(values, dtype="float64")
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+        "mean": round(float(array.mean()), 2), "max": round(float(array.max()), 2),
+    }
+
+
+async def _run_endpoint(
+    http: aiohttp.ClientSession, base_url: str, name: str, make_params: Callable[[], Params],
+    requests: int, concurrency: int
+) -> Dict[str, Any]:
+    url = f"{base_url}{API_PREFIX}/{name}"
+    latencies: List[float] = []
+    queries: List[int] = []
+    db_times: List[float] = []
+    sizes: List[int] = []
+    errors: Dict[str, int] = {}
+    pending = list(range(requests))
+
+    async def worker():
+        while pending:
+            pending.pop()
+            params = make_params()
+            started = time.perf_counter()
+            try:
+                async with http.get(url, params=params) as response:
+                    await response.read()
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    if response.status >= 400:
+                        errors[str(response.status)] = errors.get(str(response.status), 0) + 1
+                        continue
+                    latencies.append(elapsed_ms)
+                    if response.content_length is not None:
+                        sizes.append(response.content_length)
+                    if "X-DB-Query-Count" in response.headers:
+                        queries.append(int(response.headers["X-DB-Query-Count"]))
+                        db_times.append(float(response.headers["X-DB-Time-Ms"]))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    cpu_before = await _server_cpu_seconds(http, base_url)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_seconds = time.perf_counter() - started
+    cpu_after = await _server_cpu_seconds(http, base_url)
+    cpu_ms_per_request = None
+    if cpu_before is not None and cpu_after is not None and requests:
+        cpu_ms_per_request = round((cpu_after - cpu_before) * 1000 / requests, 3)
+    return {
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": _percentiles(latencies),
+        "server_cpu_ms_per_request": cpu_ms_per_request,
+        "response_bytes": _percentiles(sizes) if sizes else None,
+        "queries_per_request": _percentiles(queries) if queries else None,
+        "db_time_ms": _percentiles(db_times) if db_times else None,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    base_url = args.base_url.rstrip("/")
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector) as http:
+        async with http.get(f"{base_url}{API_PREFIX}/public-product-tree") as response:
+            response.raise_for_status()
+            tree = await response.json()
+        async with http.get(f"{base_url}{API_PREFIX}/clusters") as response:
+            response.raise_for_status()
+            cluster_ids = [cluster["id"] for cluster in await response.json()]
+        async with http.get(f"{base_url}{API_PREFIX}/cache-stats") as response:
+            cache_before = await response.json() if response.status == 200 else None
+
+        product_ids = _leaf_ids(tree)
+        if not product_ids:
+            raise ValueError("В базе нет продуктов: сначала загрузите данные (app.scripts.seed_synthetic)")
+        factory = ParamsFactory(args, product_ids, [node["id"] for node in tree], cluster_ids)
+        endpoints = _endpoints(factory)
+        selected = args.endpoints or list(endpoints)
+
+        results = {}
+        for name in selected:
+            results[name] = await _run_endpoint(
+                http, base_url, name, endpoints[name], args.requests, args.concurrency
+            )
+            latency = results[name]["latency_ms"]
+            logger.info(
+                f"{name}: p50 {latency['p50']} мс, p95 {latency['p95']} мс, p99 {latency['p99']} мс, "
+                f"ошибок {sum(results[name]['errors'].values())}"
+            )
+
+        async with http.get(f"{base_url}{API_PREFIX}/cache-stats") as response:
+            cache_after = await response.json() if response.status == 200 else None
+
+    return {
+        "captured_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "base_url": base_url,
+        "concurrency": args.concurrency,
+        "requests_per_endpoint": args.requests,
+        "period_days": args.period_days,
+        "seed": args.seed,
+        "cache_before": cache_before,
+        "cache_after": cache_after,
+        "endpoints": results,
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> bool:
+    """Напечатать сравнение p95 и процессорного времени двух отчётов; True, если есть регрессии по p95"""
+    regressed = False
+    print(
+        f"{'эндпоинт':<26} {'p95 до':>10} {'p95 после':>10} {'изм., %':>8} {'SQL до':>8} {'после':>8} "
+        f"{'CPU до, мс':>11} {'после':>8}"
+    )
+    for name, result in after["endpoints"].items():
+        previous = before["endpoints"].get(name)
+        p95 = result["latency_ms"]["p95"]
+        if previous is None or previous["latency_ms"]["p95"] is None or p95 is None:
+            print(f"{name:<26} {'—':>10} {p95 if p95 is not None else '—':>10}")
+            continue
+        base = previous["latency_ms"]["p95"]
+        change = (p95 - base) / base * 100 if base else 0.0
+        mark = ""
+        if change > threshold:
+            regressed = True
+            mark = "  РЕГРЕССИЯ"
+        queries_before = (previous.get("queries_per_request") or {}).get("mean")
+        queries_after = (result.get("queries_per_request") or {}).get("mean")
+        cpu_before = previous.get("server_cpu_ms_per_request")
+        cpu_after = result.get("server_cpu_ms_per_request")
+        print(
+            f"{name:<26} {base:>10.2f} {p95:>10.2f} {change:>8.1f} "
+            f"{queries_before if queries_before is not None else '—':>8} "
+            f"{queries_after if queries_after is not None else '—':>8} "
+            f"{cpu_before if cpu_before is not None else '—':>11} "
+            f"{cpu_after if cpu_after is not None else '—':>8}{mark}"
+        )
+    return regressed
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон эндпоинтов дашбордов")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", default=None, help="Bearer-токен, если эндпоинты закрыты авторизацией")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Таймаут запроса, с")
+    parser.add_argument("--endpoints", nargs="*", default=None, help="По умолчанию — все GET-эндпоинты дашбордов")
+    parser.add_argument("--from-date", type=date.fromisoformat, default=date.today() - timedelta(days=730))
+    parser.add_argument("--to-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--period-days", type=int, default=90, help="Длина каждого из двух сравниваемых периодов")
+    parser.add_argument("--sources", nargs="*", default=["Banki.ru", "Sravni.ru"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="dashboards_benchmark.json")
+    parser.add_argument("--compare", default=None, help="Отчёт, с которым сравнить текущий")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Допустимый рост p95, %%")
+    args = parser.parse_args()
+    known = set(_endpoints(ParamsFactory(args, [0], [], [])))
+    unknown = set(args.endpoints or []) - known
+    if unknown:
+        parser.error(f"Неизвестные эндпоинты: {', '.join(sorted(unknown))}")
+    return args
+
+
+async def main() -> int:
+    args = _parse_args()
+    report = await run_benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"Отчёт сохранён в {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            before = json.load(f)
+        return 1 if compare(before, report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,223 @@
+"""
+Снимок планов запросов StatsService: EXPLAIN (ANALYZE, BUFFERS) для каждого SQL-запроса графиков дашборда.
+
+Скрипт вызывает методы StatsService на заданных параметрах, перехватывает отправленные в базу SELECT-запросы
+и повторяет их под EXPLAIN. Миграции не применяются, поэтому снимок "до" снимается на текущей схеме:
+
+    python -m app.scripts.explain_stats_queries --output before.json
+    # применить миграции (запуск приложения)
+    python -m app.scripts.explain_stats_queries --output after.json --compare before.json
+
+При --compare печатается время выполнения и число прочитанных буферов до и после;
+код возврата 1, если какой-либо запрос замедлился больше чем на --threshold процентов.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.models import Product
+from app.repositories.product_hierarchy import product_hierarchy
+from app.repositories.repositories import (
+    AggregatesWatermarkRepository, ClusterRepository, ClusterStatsRepository, MonthlyStatsRepository, ProductRepository,
+    ReviewClusterRepository, ReviewDailyFactRepository, ReviewPartitionRepository, ReviewRepository,
+    ReviewsForModelRepository
+)
+from app.services.stats_service import StatsService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_current_method: ContextVar[Optional[str]] = ContextVar("_current_method", default=None)
+
+
+def _db_url() -> str:
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        try:
+            with open("/run/secrets/db_url", "r") as f:
+                db_url = f.read().strip()
+        except FileNotFoundError:
+            raise ValueError("DB_URL не задан или не найден")
+    if not db_url:
+        raise ValueError("DB_URL не задан")
+    return db_url
+
+
+def _build_stats_service() -> StatsService:
+    product_repository = ProductRepository()
+    review_daily_fact_repository = ReviewDailyFactRepository()
+    monthly_stats_repository = MonthlyStatsRepository()
+    cluster_stats_repository = ClusterStatsRepository()
+    return StatsService(
+        product_repo=product_repository,
+        review_repo=ReviewRepository(
+            review_daily_fact_repository, monthly_stats_repository, cluster_stats_repository
+        ),
+        monthly_stats_repo=monthly_stats_repository,
+        cluster_stats_repo=cluster_stats_repository,
+        cluster_repo=ClusterRepository(),
+        review_cluster_repo=ReviewClusterRepository(),
+        reviews_for_model_repo=ReviewsForModelRepository(),
+        review_daily_fact_repo=review_daily_fact_repository,
+        review_partition_repo=ReviewPartitionRepository(),
+        aggregates_watermark_repo=AggregatesWatermarkRepository(),
+        product_hierarchy=product_hierarchy,
+    )
+
+
+def _scenarios(stats: StatsService, args: argparse.Namespace, product_id: int) -> Dict[str, Any]:
+    """Вызовы StatsService в том виде, в каком их делают графики дашборда"""
+    day = dict(start_date=args.start_date, end_date=args.end_date,
+               start_date2=args.start_date2, end_date2=args.end_date2)
+    month = {key: value[:7] for key, value in day.items()}
+    return {
+        "get_product_stats": lambda s: stats.get_product_stats(s, **day, product_id=product_id),
+        "get_monthly_review_count": lambda s: stats.get_monthly_review_count(s, product_id, **month, aggregation_type="month"),
+        "get_bar_chart_changes": lambda s: stats.get_bar_chart_changes(s, product_id, **day, aggregation_type="week"),
+        "get_monthly_pie_chart": lambda s: stats.get_monthly_pie_chart(s, product_id, **month),
+        "get_tonality_pie_chart": lambda s: stats.get_tonality_pie_chart(s, product_id, **month),
+        "get_change_chart": lambda s: stats.get_change_chart(s, product_id, **month),
+        "get_monthly_stacked_bars": lambda s: stats.get_monthly_stacked_bars(s, product_id, **day, aggregation_type="day"),
+        "get_tonality_stacked_bars": lambda s: stats.get_tonality_stacked_bars(s, product_id, **month, aggregation_type="month"),
+        "get_small_bar_charts": lambda s: stats.get_small_bar_charts(
+            s, product_id, date.fromisoformat(args.start_date), date.fromisoformat(args.end_date), None
+        ),
+        "get_reviews": lambda s: stats.get_reviews(
+            s, product_id, date.fromisoformat(args.start_date), date.fromisoformat(args.end_date)
+        ),
+        "count_reviews": lambda s: stats.count_reviews(
+            s, product_id, date.fromisoformat(args.start_date), date.fromisoformat(args.end_date)
+        ),
+    }
+
+
+def _buffers(plan: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+    }
+
+
+async def collect_plans(args: argparse.Namespace) -> Dict[str, Any]:
+    engine = create_async_engine(_db_url())
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+    captured: List[Dict[str, Any]] = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        method = _current_method.get()
+        if method and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append({"method": method, "sql": statement, "parameters": parameters})
+
+    stats = _build_stats_service()
+    async with sessionmaker() as session:
+        product_id = args.product_id
+        if product_id is None:
+            product_id = (await session.execute(
+                select(Product.id).where(Product.parent_id.is_(None)).order_by(Product.id).limit(1)
+            )).scalar()
+        await product_hierarchy.get(session)
+
+        for method, call in _scenarios(stats, args, product_id).items():
+            token = _current_method.set(method)
+            try:
+                await call(session)
+            except Exception as e:
+                logger.error(f"{method}: {str(e)}")
+            finally:
+                _current_method.reset(token)
+        await session.rollback()
+
+    queries = []
+    counters: Dict[str, int] = {}
+    async with engine.connect() as conn:
+        for query in captured:
+            index = counters.get(query["method"], 0)
+            counters[query["method"]] = index + 1
+            result = await conn.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query["sql"], query["parameters"]
+            )
+            plan = result.scalar()
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]
+            queries.append({
+                "key": f"{query['method']}#{index}",
+                "method": query["method"],
+                "sql": query["sql"],
+                "planning_time_ms": plan.get("Planning Time"),
+                "execution_time_ms": plan.get("Execution Time"),
+                **_buffers(plan["Plan"]),
+                "plan": plan["Plan"],
+            })
+        await conn.rollback()
+
+    await engine.dispose()
+    return {
+        "captured_at": datetime.now().isoformat(),
+        "product_id": product_id,
+        "periods": [args.start_date, args.end_date, args.start_date2, args.end_date2],
+        "queries": queries,
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> bool:
+    """Напечатать сравнение двух снимков; True, если есть регрессии"""
+    old = {query["key"]: query for query in before["queries"]}
+    regressed = False
+    print(f"{'запрос':<32} {'до, мс':>10} {'после, мс':>10} {'изм., %':>8} {'буферы до':>10} {'после':>10}")
+    for query in after["queries"]:
+        previous = old.get(query["key"])
+        if previous is None:
+            print(f"{query['key']:<32} {'—':>10} {query['execution_time_ms']:>10.2f}")
+            continue
+        base = previous["execution_time_ms"] or 0.0
+        change = (query["execution_time_ms"] - base) / base * 100 if base else 0.0
+        mark = ""
+        if change > threshold:
+            regressed = True
+            mark = "  РЕГРЕССИЯ"
+        print(
+            f"{query['key']:<32} {base:>10.2f} {query['execution_time_ms']:>10.2f} {change:>8.1f} "
+            f"{previous['shared_hit'] + previous['shared_read']:>10} "
+            f"{query['shared_hit'] + query['shared_read']:>10}{mark}"
+        )
+    return regressed
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="EXPLAIN (ANALYZE, BUFFERS) запросов StatsService")
+    parser.add_argument("--product-id", type=int, default=None, help="По умолчанию — первая корневая категория")
+    parser.add_argument("--start-date", default="2025-01-01")
+    parser.add_argument("--end-date", default="2025-05-31")
+    parser.add_argument("--start-date2", default="2024-01-01")
+    parser.add_argument("--end-date2", default="2024-05-31")
+    parser.add_argument("--output", default="stats_query_plans.json")
+    parser.add_argument("--compare", default=None, help="Снимок, с которым сравнить текущий")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Допустимое замедление, %%")
+    return parser.parse_args()
+
+
+async def main() -> int:
+    args = _parse_args()
+    snapshot = await collect_plans(args)
+    with open(args.output, "w") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=2, default=str)
+    logger.info(f"Сохранено {len(snapshot['queries'])} планов в {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            before = json.load(f)
+        return 1 if compare(before, snapshot, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,305 @@
+"""
+Синтетический набор данных большого объёма для проверки дашбордов под нагрузкой.
+
+Скрипт добавляет в базу отдельное дерево продуктов (категории → подкатегории → продукты), кластеры
+и заданное число отзывов со связями review_products и review_clusters. Данные загружаются через COPY
+пачками по --batch-size отзывов, после загрузки пересобираются product_closure, дневные и месячные агрегаты
+и выполняется ANALYZE. Существующие данные не изменяются; повторный запуск добавляет ещё одно дерево.
+
+Распределения задаются параметрами:
+    --date-growth        во сколько раз отзывов в последний день периода больше, чем в первый
+    --sources            доли источников, например "Banki.ru:0.6,Sravni.ru:0.25,App Store:0.15"
+    --sentiments         доли тональностей
+    --product-skew       показатель закона Ципфа для популярности продуктов (0 — равномерно)
+    --fanout             распределение числа продуктов в отзыве, например "1:0.7,2:0.2,3:0.1"
+    --clusters-per-review распределение числа кластеров в отзыве
+
+    python -m app.scripts.seed_synthetic --reviews 5000000 --start-date 2023-01-01
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+import asyncpg
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app.core.db_manager import DatabaseManager
+from app.repositories.repositories import (
+    ClusterStatsRepository, MonthlyStatsRepository, ProductRepository, ReviewDailyFactRepository,
+    ReviewPartitionRepository
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SENTIMENT_SCORES = {"positive": (0.2, 1.0), "neutral": (-0.2, 0.2), "negative": (-1.0, -0.2)}
+SENTIMENT_RATINGS = {
+    "positive": ([4, 5], [0.3, 0.7]),
+    "neutral": ([2, 3, 4], [0.2, 0.6, 0.2]),
+    "negative": ([1, 2], [0.65, 0.35]),
+}
+SENTIMENT_PHRASES = {
+    "positive": "всё работает быстро, поддержка помогла",
+    "neutral": "в целом нормально, но есть вопросы к условиям",
+    "negative": "долго решали проблему, деньги вернули не сразу",
+}
+REVIEW_COLUMNS = ("id", "text", "date", "rating", "sentiment", "sentiment_score", "source")
+REVIEW_PRODUCT_COLUMNS = (
+    "review_id", "review_date", "product_id", "sentiment", "sentiment_score", "review_source", "review_rating"
+)
+REVIEW_CLUSTER_COLUMNS = ("review_id", "review_date", "cluster_id", "topic_weight", "sentiment_contribution")
+
+
+def _db_url() -> str:
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        try:
+            with open("/run/secrets/db_url", "r") as f:
+                db_url = f.read().strip()
+        except FileNotFoundError:
+            raise ValueError("DB_URL не задан или не найден")
+    if not db_url:
+        raise ValueError("DB_URL не задан")
+    return db_url
+
+
+def _distribution(value: str) -> Tuple[List[str], np.ndarray]:
+    """Разобрать "ключ:вес,ключ:вес" в ключи и нормированные вероятности"""
+    keys, weights = [], []
+    for item in value.split(","):
+        key, _, weight = item.rpartition(":")
+        if not key:
+            raise ValueError(f"Ожидается ключ:вес, получено {item!r}")
+        keys.append(key.strip())
+        weights.append(float(weight))
+    weights = np.asarray(weights, dtype="float64")
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError(f"Веса должны быть неотрицательными и не все нулевые: {value!r}")
+    return keys, weights / weights.sum()
+
+
+def _zipf_weights(count: int, skew: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, count + 1, dtype="float64") ** skew
+    return weights / weights.sum()
+
+
+def _month_starts(start: date, end: date) -> List[date]:
+    months = [start.replace(day=1)]
+    while True:
+        following = (months[-1] + timedelta(days=32)).replace(day=1)
+        if following > end:
+            return months
+        months.append(following)
+
+
+class SyntheticDataset:
+    """Генератор пачек отзывов и их связей с заданными распределениями"""
+
+    def __init__(self, args: argparse.Namespace, product_ids: Sequence[int], cluster_ids: Sequence[int]):
+        self._rng = np.random.default_rng(args.seed)
+        self._days = [
+            args.start_date + timedelta(days=offset) for offset in range((args.end_date - args.start_date).days + 1)
+        ]
+        position = np.linspace(0.0, 1.0, len(self._days))
+        day_weights = args.date_growth ** position
+        self._day_p = day_weights / day_weights.sum()
+        self._sources, self._source_p = _distribution(args.sources)
+        self._sentiments, self._sentiment_p = _distribution(args.sentiments)
+        fanout, self._fanout_p = _distribution(args.fanout)
+        self._fanout = np.asarray([int(k) for k in fanout])
+        clusters, self._clusters_p = _distribution(args.clusters_per_review)
+        self._clusters_count = np.asarray([int(k) for k in clusters])
+        self._product_ids = np.asarray(product_ids)
+        self._product_p = _zipf_weights(len(product_ids), args.product_skew)
+        self._cluster_ids = np.asarray(cluster_ids)
+        self._cluster_p = _zipf_weights(len(cluster_ids), args.cluster_skew)
+
+    @property
+    def days(self) -> List[date]:
+        return self._days
+
+    def batch(self, first_id: int, size: int) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+        """Отзывы с id first_id .. first_id + size - 1 и их связи с продуктами и кластерами"""
+        rng = self._rng
+        day_index = rng.choice(len(self._days), size=size, p=self._day_p)
+        source_index = rng.choice(len(self._sources), size=size, p=self._source_p)
+        sentiment_index = rng.choice(len(self._sentiments), size=size, p=self._sentiment_p)
+        fanout = rng.choice(self._fanout, size=size, p=self._fanout_p)
+        cluster_counts = rng.choice(self._clusters_count, size=size, p=self._clusters_p)
+        products = rng.choice(self._product_ids, size=int(fanout.sum()), p=self._product_p)
+        clusters = rng.choice(self._cluster_ids, size=int(cluster_counts.sum()), p=self._cluster_p)
+        weights = np.round(rng.uniform(0.1, 1.0, size=len(clusters)), 3)
+
+        ratings: Dict[str, np.ndarray] = {}
+        scores: Dict[str, np.ndarray] = {}
+        for sentiment in self._sentiments:
+            values, p = SENTIMENT_RATINGS[sentiment]
+            ratings[sentiment] = rng.choice(values, size=size, p=p)
+            scores[sentiment] = np.round(rng.uniform(*SENTIMENT_SCORES[sentiment], size=size), 3)
+
+        reviews, review_products, review_clusters = [], [], []
+        product_offset = cluster_offset = 0
+        for i in range(size):
+            review_id = first_id + i
+            day = self._days[day_index[i]]
+            source = self._sources[source_index[i]]
+            sentiment = self._sentiments[sentiment_index[i]]
+            rating = int(ratings[sentiment][i])
+            score = float(scores[sentiment][i])
+            reviews.append((
+                review_id, f"Синтетический отзыв {review_id}: {SENTIMENT_PHRASES[sentiment]}",
+                day, rating, sentiment, score, source
+            ))
+            for product_id in set(products[product_offset:product_offset + fanout[i]].tolist()):
+                review_products.append((review_id, day, product_id, sentiment, score, source, rating))
+            product_offset += fanout[i]
+            seen = set()
+            for j in range(cluster_offset, cluster_offset + cluster_counts[i]):
+                cluster_id = int(clusters[j])
+                if cluster_id not in seen:
+                    seen.add(cluster_id)
+                    review_clusters.append((review_id, day, cluster_id, float(weights[j]), sentiment))
+            cluster_offset += cluster_counts[i]
+        return reviews, review_products, review_clusters
+
+
+async def _reserve_ids(conn: asyncpg.Connection, table: str, count: int) -> int:
+    """Зарезервировать count значений последовательности id таблицы; возвращает первое"""
+    sequence = await conn.fetchval("SELECT pg_get_serial_sequence($1, 'id')", table)
+    first = await conn.fetchval("SELECT nextval($1::regclass)", sequence)
+    await conn.execute("SELECT setval($1::regclass, $2)", sequence, first + count - 1)
+    return first
+
+
+async def _create_products(conn: asyncpg.Connection, args: argparse.Namespace) -> List[int]:
+    """Дерево продуктов; возвращает id листьев, к которым привязываются отзывы"""
+    suffix = f"{args.seed}-{int(time.time())}"
+    total = args.categories * (1 + args.subcategories * (1 + args.products))
+    next_id = await _reserve_ids(conn, "products", total)
+    rows, leaves = [], []
+    client_types = ("individual", "business", "both")
+    for c in range(args.categories):
+        category_id = next_id
+        next_id += 1
+        rows.append((category_id, f"Синтетика {suffix} / категория {c + 1}", None, 0, "category", "both"))
+        for s in range(args.subcategories):
+            subcategory_id = next_id
+            next_id += 1
+            rows.append((
+                subcategory_id, f"Синтетика {suffix} / подкатегория {c + 1}.{s + 1}",
+                category_id, 1, "subcategory", "both"
+            ))
+            for p in range(args.products):
+                rows.append((
+                    next_id, f"Синтетика {suffix} / продукт {c + 1}.{s + 1}.{p + 1}",
+                    subcategory_id, 2, "product", client_types[p % len(client_types)]
+                ))
+                leaves.append(next_id)
+                next_id += 1
+    await conn.copy_records_to_table(
+        "products", records=rows, columns=("id", "name", "parent_id", "level", "type", "client_type")
+    )
+    return leaves
+
+
+async def _create_clusters(conn: asyncpg.Connection, count: int) -> List[int]:
+    first = await _reserve_ids(conn, "clusters", count)
+    ids = list(range(first, first + count))
+    await conn.copy_records_to_table(
+        "clusters", records=[(cluster_id, f"Синтетический кластер {cluster_id}") for cluster_id in ids],
+        columns=("id", "name")
+    )
+    return ids
+
+
+async def _load_reviews(conn: asyncpg.Connection, dataset: SyntheticDataset, args: argparse.Namespace) -> None:
+    first_id = await _reserve_ids(conn, "reviews", args.reviews)
+    loaded = 0
+    started = time.perf_counter()
+    while loaded < args.reviews:
+        size = min(args.batch_size, args.reviews - loaded)
+        reviews, review_products, review_clusters = dataset.batch(first_id + loaded, size)
+        async with conn.transaction():
+            await conn.copy_records_to_table("reviews", records=reviews, columns=REVIEW_COLUMNS)
+            await conn.copy_records_to_table(
+                "review_products", records=review_products, columns=REVIEW_PRODUCT_COLUMNS
+            )
+            await conn.copy_records_to_table(
+                "review_clusters", records=review_clusters, columns=REVIEW_CLUSTER_COLUMNS
+            )
+        loaded += size
+        elapsed = time.perf_counter() - started
+        logger.info(f"Загружено {loaded}/{args.reviews} отзывов, {loaded / elapsed:.0f} отзывов/с")
+
+
+async def seed_synthetic(args: argparse.Namespace) -> None:
+    db_manager = DatabaseManager(_db_url(), echo=False)
+    await db_manager.initialize()
+    try:
+        dataset_months = _month_starts(args.start_date, args.end_date)
+        async with db_manager.async_session() as session:
+            await ReviewPartitionRepository().ensure_months(session, dataset_months)
+
+        url = make_url(_db_url()).set(drivername="postgresql")
+        conn = await asyncpg.connect(url.render_as_string(hide_password=False))
+        try:
+            await conn.execute("SET synchronous_commit = off")
+            product_ids = await _create_products(conn, args)
+            cluster_ids = await _create_clusters(conn, args.clusters)
+            logger.info(f"Создано {len(product_ids)} продуктов и {len(cluster_ids)} кластеров")
+            await _load_reviews(conn, SyntheticDataset(args, product_ids, cluster_ids), args)
+        finally:
+            await conn.close()
+
+        logger.info("Пересчёт product_closure и агрегатов")
+        async with db_manager.async_session() as session:
+            await ProductRepository().rebuild_closure(session)
+            await ReviewDailyFactRepository().rebuild(session)
+            await MonthlyStatsRepository().refresh(session)
+            await ClusterStatsRepository().refresh(session)
+            await session.commit()
+
+            for table in ("products", "product_closure", "clusters", "reviews", "review_products",
+                          "review_clusters", "review_daily_facts", "monthly_stats", "cluster_stats"):
+                await session.execute(text(f"ANALYZE {table}"))
+            await session.commit()
+        logger.info("Синтетические данные загружены")
+    finally:
+        await db_manager.dispose()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Загрузка синтетических отзывов большого объёма через COPY")
+    parser.add_argument("--reviews", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--subcategories", type=int, default=4, help="Подкатегорий в категории")
+    parser.add_argument("--products", type=int, default=6, help="Продуктов в подкатегории")
+    parser.add_argument("--clusters", type=int, default=30)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date.today() - timedelta(days=730))
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--date-growth", type=float, default=3.0)
+    parser.add_argument("--sources", default="Banki.ru:0.55,Sravni.ru:0.25,App Store:0.12,Google Play:0.08")
+    parser.add_argument("--sentiments", default="positive:0.35,neutral:0.2,negative:0.45")
+    parser.add_argument("--product-skew", type=float, default=1.1)
+    parser.add_argument("--cluster-skew", type=float, default=0.8)
+    parser.add_argument("--fanout", default="1:0.7,2:0.2,3:0.08,5:0.02")
+    parser.add_argument("--clusters-per-review", default="1:0.55,2:0.3,3:0.15")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if args.start_date > args.end_date:
+        parser.error("--start-date должна быть не позже --end-date")
+    unknown = set(_distribution(args.sentiments)[0]) - set(SENTIMENT_SCORES)
+    if unknown:
+        parser.error(f"Неизвестные тональности: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(seed_synthetic(_parse_args()))
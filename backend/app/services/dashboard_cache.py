@@ -0,0 +1,116 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.data_version import DataVersion
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardCache:
+    """
+    LRU-кэш результатов дашбордов с ограничением размера и временем жизни записей.
+    Ключ — имя графика, нормализованные параметры запроса и версия данных на момент расчёта:
+    общая версия из data_watermark, прочитанная в сессии запроса, и процессный счётчик.
+    Поэтому после записи отзывов или привязок к кластерам в любом процессе старые записи не отдаются.
+    """
+
+    def __init__(self, data_version: DataVersion, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self._data_version = data_version
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            value = value.strip()
+            return value or None
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def make_key(self, name: str, params: Dict[str, Any], shared_version: Optional[int] = None) -> Hashable:
+        """Ключ кэша: пустой источник и None совпадают, порядок параметров не важен"""
+        normalized = tuple(sorted((k, self._normalize(v)) for k, v in params.items()))
+        return name, normalized, shared_version, self._data_version.value
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if key[3] != self._data_version.value:
+            # Данные изменились во время расчёта — такой результат сразу устарел
+            return
+        self._entries[key] = (time.monotonic() + self._ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(
+        self, name: str, params: Dict[str, Any], compute: Callable[[], Awaitable[Any]],
+        shared_version: Optional[int] = None
+    ) -> Any:
+        """
+        Вернуть результат из кэша или посчитать и сохранить его.
+        shared_version — версия из data_watermark, прочитанная до расчёта; исключения compute не кэшируются.
+        """
+        key = self.make_key(name, params, shared_version)
+        found, value = self.get(key)
+        if found:
+            return value
+        value = await compute()
+        self.put(key, value)
+        return value
+
+    def at_version(self, shared_version: Optional[int]) -> "DashboardCacheView":
+        """Кэш для одного запроса с уже прочитанной общей версией данных"""
+        return DashboardCacheView(self, shared_version)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "data_version": self._data_version.value,
+        }
+
+
+class DashboardCacheView:
+    """Кэш дашбордов с общей версией данных, прочитанной в сессии запроса"""
+
+    def __init__(self, cache: DashboardCache, shared_version: Optional[int]):
+        self._cache = cache
+        self.shared_version = shared_version
+
+    async def get_or_compute(
+        self, name: str, params: Dict[str, Any], compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        return await self._cache.get_or_compute(name, params, compute, self.shared_version)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {**self._cache.stats(), "shared_data_version": self.shared_version}
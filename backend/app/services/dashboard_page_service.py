@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.db_manager import DatabaseManager
+from app.repositories.product_hierarchy import ProductHierarchyIndex
+from app.repositories.repositories import DataWatermarkRepository
+from app.schemas.auth_schema import ChartConfig, PageConfig
+from app.services.dashboard_cache import DashboardCache
+from app.services.stats_service import StatsService
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardPageService:
+    """
+    Расчёт всех графиков страницы дашборда за один запрос.
+    Дерево продуктов и параметры графиков разбираются один раз, графики считаются параллельно,
+    каждый в своей сессии чтения; число одновременно занятых соединений ограничено max_concurrency.
+    Результаты кладутся в тот же кэш и под теми же ключами, что и у отдельных эндпоинтов.
+    """
+
+    def __init__(
+        self,
+        stats_service: StatsService,
+        dashboard_cache: DashboardCache,
+        database_manager: DatabaseManager,
+        product_hierarchy: ProductHierarchyIndex,
+        max_concurrency: int = 4,
+    ):
+        self._stats_service = stats_service
+        self._cache = dashboard_cache
+        self._database_manager = database_manager
+        self._product_hierarchy = product_hierarchy
+        self._max_concurrency = max_concurrency
+
+    @staticmethod
+    def _format_date(value: date, aggregation_type: Optional[str]) -> str:
+        return value.strftime("%Y-%m") if aggregation_type == "month" else value.isoformat()
+
+    @staticmethod
+    def _second_period(chart: ChartConfig) -> Tuple[date, date]:
+        """Второй период графика; если он не задан — такой же по длине период перед первым"""
+        attrs = chart.attributes
+        if attrs.date_start_2 and attrs.date_end_2:
+            return attrs.date_start_2, attrs.date_end_2
+        length = attrs.date_end_1 - attrs.date_start_1
+        end = attrs.date_start_1 - timedelta(days=1)
+        return end - length, end
+
+    def _build_job(self, chart: ChartConfig) -> Tuple[str, Dict[str, Any], Callable[[Any], Awaitable[Any]]]:
+        """Имя графика в кэше, его параметры и функция расчёта в переданной сессии"""
+        stats = self._stats_service
+        attrs = chart.attributes
+        agg = attrs.aggregation_type
+        product_id = None if attrs.product_id == "all" else attrs.product_id
+        source = attrs.source or None
+        start2, end2 = self._second_period(chart)
+        start_date = self._format_date(attrs.date_start_1, agg)
+        end_date = self._format_date(attrs.date_end_1, agg)
+        start_date2 = self._format_date(start2, agg)
+        end_date2 = self._format_date(end2, agg)
+
+        if chart.type == "product_stats":
+            day_dates = [d.isoformat() for d in (attrs.date_start_1, attrs.date_end_1, start2, end2)]
+            params = dict(product_id=product_id, start_date=day_dates[0], end_date=day_dates[1],
+                          start_date2=day_dates[2], end_date2=day_dates[3], source=source, page=0, size=100)
+            return "product-stats", params, lambda session: stats.get_product_stats(
+                session, *day_dates, source=source, product_id=product_id
+            )
+
+        if product_id is None:
+            raise ValueError(f"График {chart.type} требует конкретный product_id")
+
+        if chart.type == "small-bar-charts":
+            params = dict(product_id=product_id, start_date=attrs.date_start_1,
+                          end_date=attrs.date_end_1, cluster_id=None)
+            return "small-bar-charts", params, lambda session: stats.get_small_bar_charts(
+                session, product_id, attrs.date_start_1, attrs.date_end_1, None, None
+            )
+
+        params = dict(product_id=product_id, start_date=start_date, end_date=end_date,
+                      start_date2=start_date2, end_date2=end_date2, source=source)
+        if chart.type == "monthly-review-count":
+            params["aggregation_type"] = agg
+            return "monthly-review-count", params, lambda session: stats.get_monthly_review_count(
+                session, product_id, start_date, end_date, start_date2, end_date2, agg, source=source
+            )
+        if chart.type == "monthly-stacked-bars":
+            params.update(aggregation_type=agg, cluster_id=None)
+            return "monthly-stacked-bars", params, lambda session: stats.get_monthly_stacked_bars(
+                session, product_id, start_date, end_date, start_date2, end_date2, agg, source, None
+            )
+        if chart.type == "monthly-pie-chart":
+            return "monthly-pie-chart", params, lambda session: stats.get_monthly_pie_chart(
+                session, product_id, start_date, end_date, start_date2, end_date2, source
+            )
+        if chart.type == "line-and-bar-pie-chart":
+            return "line-and-bar-pie-chart", params, lambda session: stats.get_tonality_pie_chart(
+                session, product_id, start_date, end_date, start_date2, end_date2, source
+            )
+        if chart.type == "change-chart":
+            return "change-chart", params, lambda session: stats.get_change_chart(
+                session, product_id, start_date, end_date, start_date2, end_date2, source
+            )
+        raise ValueError(f"Тип графика {chart.type} не поддерживается")
+
+    async def render_page(self, page: PageConfig) -> Dict[str, Any]:
+        """
+        Посчитать все графики страницы.
+        Ошибка одного графика не прерывает остальные: она возвращается в поле error этого графика.
+        """
+        async with self._database_manager.create_read_session() as session:
+            await self._product_hierarchy.get(session)
+            watermark = await DataWatermarkRepository().get(session)
+        shared_version = watermark.version if watermark else None
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def render_chart(chart: ChartConfig) -> Dict[str, Any]:
+            result = {"id": chart.id, "name": chart.name, "type": chart.type, "data": None, "error": None}
+            try:
+                name, params, compute = self._build_job(chart)
+
+                async def run_in_session():
+                    async with semaphore:
+                        async with self._database_manager.create_read_session() as session:
+                            return await compute(session)
+
+                result["data"] = await self._cache.get_or_compute(name, params, run_in_session, shared_version)
+            except ValueError as e:
+                result["error"] = str(e)
+            except Exception as e:
+                logger.error(f"Ошибка при расчёте графика {chart.id} ({chart.type}): {str(e)}", exc_info=True)
+                result["error"] = f"Ошибка при расчёте графика: {str(e)}"
+            return result
+
+        charts: List[Dict[str, Any]] = await asyncio.gather(*(render_chart(chart) for chart in page.charts))
+        return {"page_id": page.id, "name": page.name, "charts": charts}
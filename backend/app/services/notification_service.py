@@ -1,10 +1,15 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta, datetime
-from app.repositories.repositories import NotificationConfigRepository, ProductRepository, ReviewRepository, MonthlyStatsRepository, NotificationRepository, AuditLogRepository
+from app.repositories.repositories import (
+    NotificationConfigRepository, ProductRepository, ReviewRepository, MonthlyStatsRepository, NotificationRepository,
+    AuditLogRepository, ReviewDailyFactRepository
+)
+from app.repositories.product_hierarchy import ProductHierarchyIndex
 from app.models.user_models import User
 from app.models.models import Notification, NotificationConfig, NotificationType
 from app.schemas.schemas import NotificationConfigCreate
 from app.core.exceptions import EntityNotFoundException
+from app.core.review_changes import ReviewChange
 from typing import List, Dict, Any, Tuple, Optional
 from dateutil.relativedelta import relativedelta
 import logging
@@ -20,6 +25,8 @@ class NotificationService:
         product_repo: ProductRepository,
         review_repo: ReviewRepository,
         monthly_stats_repo: MonthlyStatsRepository,
+        review_daily_fact_repo: ReviewDailyFactRepository,
+        product_hierarchy: ProductHierarchyIndex,
     ):
         self._notification_repo = notification_repo
         self._audit_log_repo = audit_log_repo
@@ -27,6 +34,8 @@ class NotificationService:
         self._product_repo = product_repo
         self._review_repo = review_repo
         self._monthly_stats_repo = monthly_stats_repo
+        self._review_daily_fact_repo = review_daily_fact_repo
+        self._product_hierarchy = product_hierarchy
 
     async def create_config(self, session: AsyncSession, user_id: int, config_data: NotificationConfigCreate) -> NotificationConfig:
         config = NotificationConfig(user_id=user_id, **config_data.model_dump())
@@ -97,81 +106,149 @@ class NotificationService:
         logger.warning(f"Unknown period type: {period}")
         return None, None, None, None
 
-    async def get_period_data(self, session: AsyncSession, product_ids: List[int], start_date: date, end_date: date) -> Dict[str, Any]:
-        """Получает все данные для указанного периода"""
-        review_count = await self._review_repo.count_by_product_and_period(
-            session, product_ids, start_date, end_date
-        )
-        
-        tonality_counts = await self._review_repo.get_tonality_counts_by_product_and_period(
-            session, product_ids, start_date, end_date
-        )
-        
-        avg_rating = await self._review_repo.get_avg_rating_by_products(
-            session, product_ids, start_date, end_date
-        )
-        
+    @staticmethod
+    def _period_data(metrics: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Данные периода в формате проверок порогов; metrics — результат get_metrics_by_ranges или None"""
+        if metrics is None:
+            tonality_counts = {"positive": 0, "neutral": 0, "negative": 0}
+            return {'review_count': 0, 'tonality_counts': tonality_counts, 'avg_rating': 0.0, 'total_reviews': 0}
         return {
-            'review_count': review_count,
-            'tonality_counts': tonality_counts,
-            'avg_rating': avg_rating,
-            'total_reviews': sum(tonality_counts.values())
+            'review_count': metrics["count"],
+            'tonality_counts': metrics["tonality"],
+            'avg_rating': float(metrics["avg_rating"]),
+            'total_reviews': sum(metrics["tonality"].values())
         }
 
     async def check_and_generate_notifications(self, session: AsyncSession):
-        """Основной метод проверки и генерации уведомлений"""
+        """
+        Основной метод проверки и генерации уведомлений.
+        Конфигурации группируются по (узел, период): метрики текущего и предыдущего периодов всех
+        различных групп считаются одним сгруппированным запросом по дневным агрегатам,
+        пороги каждой конфигурации проверяются в памяти по общим результатам.
+        """
         configs = await self._config_repo.get_active_configs(session)
         logger.info(f"Checking {len(configs)} active notification configs")
-        
-        notifications_generated = 0
-        
+        hierarchy = await self._product_hierarchy.get(session)
+        periods = {period: self.get_comparison_periods(period) for period in {config.period for config in configs}}
+        await self._evaluate_configs(session, configs, hierarchy, periods)
+
+    async def check_changed_configs(self, session: AsyncSession, change: ReviewChange):
+        """
+        Проверка только конфигураций, затронутых изменением отзывов: узел конфигурации — изменённый
+        продукт или его предок (дневные агрегаты узла покрывают всё поддерево), и один из сравниваемых
+        периодов пересекается с датами изменения
+        """
+        hierarchy = await self._product_hierarchy.get(session)
+        if any(hierarchy.get_node(product_id) is None for product_id in change.product_ids):
+            # Загрузка создала новые продукты — без них не найти всех предков
+            self._product_hierarchy.invalidate()
+            hierarchy = await self._product_hierarchy.get(session)
+
+        affected_ids = set(change.product_ids)
+        for product_id in change.product_ids:
+            affected_ids.update(hierarchy.get_ancestor_path(product_id))
+
+        configs = await self._config_repo.get_active_configs(session, product_ids=affected_ids)
+        periods = {period: self.get_comparison_periods(period) for period in {config.period for config in configs}}
+        configs = [
+            config for config in configs
+            if all(periods[config.period]) and (
+                change.overlaps(*periods[config.period][:2]) or change.overlaps(*periods[config.period][2:])
+            )
+        ]
+        logger.info(
+            f"Checking {len(configs)} notification configs affected by review changes "
+            f"({len(change.product_ids)} products, {change.start_date} to {change.end_date})"
+        )
+        await self._evaluate_configs(session, configs, hierarchy, periods)
+
+    async def _evaluate_configs(
+        self, session: AsyncSession, configs: List[NotificationConfig], hierarchy: Any,
+        periods: Dict[str, Tuple[Optional[date], Optional[date], Optional[date], Optional[date]]]
+    ):
+        """
+        Метрики всех различных (узел, период) конфигураций одним запросом и проверка порогов в памяти.
+        Уведомления и записи аудита копятся за весь проход и записываются в конце одной транзакцией;
+        ошибка проверки одной конфигурации не мешает остальным.
+        """
+        checks = []
         for config in configs:
-            try:
-                product = await self._product_repo.get_by_id(session, config.product_id)
-                if not product:
-                    logger.warning(f"Product {config.product_id} not found for config {config.id}")
-                    continue
+            product = hierarchy.get_node(config.product_id)
+            if not product:
+                logger.warning(f"Product {config.product_id} not found for config {config.id}")
+                continue
+            if not all(periods[config.period]):
+                logger.warning(f"Could not determine periods for config {config.id} with period {config.period}")
+                continue
+            checks.append((config, product))
 
-                descendants = await self._product_repo.get_all_descendants(session, config.product_id)
-                product_ids = [config.product_id] + [d.id for d in descendants]
-                
-                logger.info(f"Checking config {config.id} for product {product.name} (IDs: {product_ids})")
+        if not checks:
+            logger.info("Notification check completed. No configs to check")
+            return
 
-                current_start, current_end, prev_start, prev_end = self.get_comparison_periods(config.period)
-                
-                if not all([current_start, current_end, prev_start, prev_end]):
-                    logger.warning(f"Could not determine periods for config {config.id} with period {config.period}")
-                    continue
+        ranges = set()
+        for config, _ in checks:
+            current_start, current_end, prev_start, prev_end = periods[config.period]
+            ranges.add((config.product_id, current_start, current_end))
+            ranges.add((config.product_id, prev_start, prev_end))
+        metrics = await self._review_daily_fact_repo.get_metrics_by_ranges(session, sorted(ranges))
+        logger.info(f"Computed metrics for {len(ranges)} (product, period) groups")
+
+        notifications: List[Dict[str, Any]] = []
+        audit_logs: List[Dict[str, Any]] = []
 
-                current_data = await self.get_period_data(session, product_ids, current_start, current_end)
-                prev_data = await self.get_period_data(session, product_ids, prev_start, prev_end)
+        for config, product in checks:
+            try:
+                current_start, current_end, prev_start, prev_end = periods[config.period]
+                current_data = self._period_data(metrics.get((config.product_id, current_start, current_end)))
+                prev_data = self._period_data(metrics.get((config.product_id, prev_start, prev_end)))
                 
-                logger.info(f"Config {config.id} - Current: {current_data}, Previous: {prev_data}")
+                logger.debug(f"Config {config.id} - Current: {current_data}, Previous: {prev_data}")
 
-                notification_generated = await self.check_config_thresholds(
-                    session, config, product, current_data, prev_data, current_start, current_end
+                message = await self.check_config_thresholds(
+                    config, product, current_data, prev_data, current_start, current_end
                 )
                 
-                if notification_generated:
-                    notifications_generated += 1
+                if message:
+                    notifications.append({"user_id": config.user_id, "message": message, "type": config.notification_type})
+                    audit_logs.append({
+                        "user_id": config.user_id,
+                        "action": f"Generated {config.notification_type} notification for {product.name}"
+                    })
                     
             except Exception as e:
                 logger.error(f"Error processing config {config.id}: {str(e)}", exc_info=True)
                 continue
-        
-        logger.info(f"Notification check completed. Generated {notifications_generated} notifications")
+
+        await self._save_generated(session, notifications, audit_logs)
+
+    async def _save_generated(self, session: AsyncSession, notifications: List[Dict[str, Any]], audit_logs: List[Dict[str, Any]]):
+        """Запись уведомлений и аудита прохода проверки: по одной многострочной вставке на таблицу, один коммит"""
+        if not notifications:
+            logger.info("Notification check completed. Generated 0 notifications")
+            return
+        try:
+            await self._notification_repo.save_many(session, notifications)
+            await self._audit_log_repo.save_many(session, audit_logs)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Failed to save {len(notifications)} generated notifications: {str(e)}", exc_info=True)
+            raise
+        for notification in notifications:
+            logger.info(f"Generated notification for user {notification['user_id']}: {notification['message']}")
+        logger.info(f"Notification check completed. Generated {len(notifications)} notifications")
 
     async def check_config_thresholds(
         self, 
-        session: AsyncSession, 
         config: NotificationConfig, 
         product: Any,
         current_data: Dict[str, Any], 
         prev_data: Dict[str, Any],
         current_start: date,
         current_end: date
-    ) -> bool:
-        """Проверяет конкретную конфигурацию на превышение порогов"""
+    ) -> Optional[str]:
+        """Проверяет конкретную конфигурацию на превышение порогов; возвращает текст уведомления или None"""
         
         message = None
         period_label = self.get_period_label(config.period, current_start, current_end)
@@ -188,13 +265,7 @@ class NotificationService:
         elif config.notification_type == NotificationType.NEGATIVE_SPIKE:
             message = await self.check_negative_spike(config, product, current_data, prev_data, period_label)
 
-        if message:
-            await self.generate_notification(session, config.user_id, message, config.notification_type)
-            await self._audit_log_repo.save(session, config.user_id, 
-                                          f"Generated {config.notification_type} notification for {product.name}")
-            return True
-        
-        return False
+        return message
 
     async def check_review_spike(self, config: NotificationConfig, product: Any, 
                                current_data: Dict, prev_data: Dict, period_label: str) -> Optional[str]:
@@ -289,6 +360,9 @@ class NotificationService:
     async def get_user_notifications(self, session: AsyncSession, user_id: int, is_read: bool = False) -> List[Notification]:
         return await self._notification_repo.get_by_user_id(session, user_id, is_read)
 
+    async def get_notifications_after(self, session: AsyncSession, user_id: int, after_id: int) -> List[Notification]:
+        return await self._notification_repo.get_after(session, user_id, after_id)
+
     async def mark_as_read(self, session: AsyncSession, notification_id: int, user_id: int) -> bool:
         return await self._notification_repo.update_read_status(session, notification_id, user_id)
 
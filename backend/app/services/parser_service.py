@@ -6,13 +6,20 @@ from datetime import date, datetime
 from app.services.parser_config import ParserConfig
 from app.services.banki_parser import BankiRuParser
 from app.repositories.repositories import ReviewsForModelRepository
+from app.repositories.product_hierarchy import product_hierarchy
+from app.core.metrics import timed_job
+from app.core.review_changes import review_change_feed
 
 logger = logging.getLogger(__name__)
 
+# Отзывов в одной транзакции обработки: отзывы, связи, агрегаты и отметка об обработке фиксируются вместе
+PROCESS_BATCH_SIZE = 500
+
 class ParserService:
     def __init__(self, reviews_for_model_repo: ReviewsForModelRepository):
         self._reviews_for_model_repo = reviews_for_model_repo
 
+    @timed_job("parser_banki")
     async def run_parser(
         self, 
         session: AsyncSession, 
@@ -81,6 +88,7 @@ class ParserService:
             "last_parsed": None
         }
     
+    @timed_job("parser_process_reviews")
     async def process_parsed_reviews(
         self,
         session: AsyncSession,
@@ -116,13 +124,47 @@ class ParserService:
                     "message": "No unprocessed reviews found for specified bank and product"
                 }
             
-            from app.repositories.repositories import ProductRepository, ReviewRepository
+            from app.repositories.repositories import (
+                ProductRepository, ReviewRepository, ReviewDailyFactRepository,
+                MonthlyStatsRepository, ClusterStatsRepository, ReviewPartitionRepository
+            )
             product_repo = ProductRepository()
             review_repo = ReviewRepository()
+            daily_fact_repo = ReviewDailyFactRepository()
+            monthly_stats_repo = MonthlyStatsRepository()
+            cluster_stats_repo = ClusterStatsRepository()
+            partition_repo = ReviewPartitionRepository()
             
             reviews_created = 0
             review_ids_to_mark = []
+            created_review_keys = []
+            changed_product_ids = set()
+            changed_dates = set()
             products_created_count = 0
+
+            async def commit_batch():
+                """
+                Отзывы пачки, их вклад в дневные и месячные агрегаты и отметка об обработке
+                фиксируются одним коммитом: отзыв не бывает сохранён без агрегатов
+                """
+                nonlocal reviews_created, review_ids_to_mark, created_review_keys, changed_product_ids, changed_dates
+                if not created_review_keys:
+                    return
+                logger.info(f"Updating daily and monthly aggregates for {len(created_review_keys)} reviews")
+                await daily_fact_repo.apply_reviews(session, created_review_keys)
+                cells = await monthly_stats_repo.get_cells_for_reviews(session, created_review_keys)
+                await monthly_stats_repo.refresh(session, cells)
+                await cluster_stats_repo.refresh(session, cells)
+                if mark_processed:
+                    logger.info(f"Marking {len(review_ids_to_mark)} reviews as processed")
+                    await self._reviews_for_model_repo.mark_bulk_as_processed(session, review_ids_to_mark)
+                else:
+                    await session.commit()
+                # Проверка уведомлений только по затронутым продуктам и датам
+                review_change_feed.publish(changed_product_ids, changed_dates)
+                reviews_created += len(created_review_keys)
+                review_ids_to_mark, created_review_keys = [], []
+                changed_product_ids, changed_dates = set(), set()
             
             for i, parsed_review in enumerate(filtered_reviews):
                 try:
@@ -181,7 +223,7 @@ class ParserService:
                     
                     logger.info(f"Aggregated sentiment: {aggregated_sentiment}, score: {sentiment_score}")
                     
-                    from app.models.models import Review, ReviewProduct
+                    from app.models.models import Review
                     
                     review = Review(
                         text=parsed_review.review_text,
@@ -192,9 +234,7 @@ class ParserService:
                         source=primary_source
                     )
                     
-                    saved_review = await review_repo.save(session, review)
-                    logger.info(f"Created review in main table: ID {saved_review.id}")
-                    
+                    links = []
                     for topic_index, topic in enumerate(topics):
                         russian_topic_name = self._translate_product_name(topic)
                         logger.info(f"Processing topic {topic_index + 1}/{len(topics)}: '{topic}' -> '{russian_topic_name}'")
@@ -203,7 +243,9 @@ class ParserService:
                         
                         if not product:
                             from app.models.models import Product, ProductType, ClientType
-                        
+
+                            # Создание продукта фиксирует сессию — сначала фиксируется накопленная пачка с агрегатами
+                            await commit_batch()
                             parent_product = await self._get_or_create_parent_product(session, product_repo, russian_topic_name)
                             
                             product_type, level = self._determine_product_type_and_level(russian_topic_name, parent_product)
@@ -233,31 +275,46 @@ class ParserService:
                                 topic_sentiment_score = self._calculate_sentiment_score(topic_sentiment)
                                 logger.info(f"Using topic-specific sentiment: {topic_sentiment}")
                         
-                        review_product = ReviewProduct(
-                            review_id=saved_review.id,
-                            product_id=product.id,
-                            sentiment=topic_sentiment,
-                            sentiment_score=topic_sentiment_score
-                        )
-                        session.add(review_product)
-                        await session.flush()
-                        logger.info(f"Created review_product link: review_id={saved_review.id}, product_id={product.id}, sentiment={topic_sentiment}")
+                        links.append((product.id, topic_sentiment, topic_sentiment_score))
+
+                    if partition_repo.missing_months([review_date]):
+                        # Создание партиции тоже фиксирует сессию
+                        await commit_batch()
+                        await partition_repo.ensure_months(session, [review_date])
+
+                    try:
+                        # Точка сохранения: ошибка вставки откатывает только этот отзыв, а не всю пачку
+                        async with session.begin_nested():
+                            session.add(review)
+                            await session.flush()
+                            for product_id, topic_sentiment, topic_sentiment_score in links:
+                                session.add(review_repo.product_link(review, product_id, topic_sentiment, topic_sentiment_score))
+                            await session.flush()
+                    except Exception as e:
+                        logger.error(f"Error saving review {parsed_review.id}: {str(e)}", exc_info=True)
+                        continue
+                    logger.info(f"Created review in main table: ID {review.id} with {len(links)} product links")
                     
-                    reviews_created += 1
                     review_ids_to_mark.append(parsed_review.id)
+                    created_review_keys.append((review.id, review.date))
+                    changed_product_ids.update(product_id for product_id, _, _ in links)
+                    changed_dates.add(review.date)
+                    if len(created_review_keys) >= PROCESS_BATCH_SIZE:
+                        await commit_batch()
                     
                 except Exception as e:
                     logger.error(f"Error processing review {parsed_review.id}: {str(e)}", exc_info=True)
+                    # Незафиксированная пачка откатывается целиком и останется необработанной до следующего запуска
+                    await session.rollback()
+                    if created_review_keys:
+                        logger.warning(f"Rolled back {len(created_review_keys)} uncommitted reviews, they stay unprocessed")
+                    review_ids_to_mark, created_review_keys = [], []
+                    changed_product_ids, changed_dates = set(), set()
                     continue
                 
+            await commit_batch()
             logger.info(f"Successfully processed {reviews_created} reviews")
             
-            if mark_processed and review_ids_to_mark:
-                logger.info(f"Marking {len(review_ids_to_mark)} reviews as processed")
-                await self._reviews_for_model_repo.mark_bulk_as_processed(
-                    session, review_ids_to_mark
-                )
-            
             return {
                 "status": "success",
                 "bank_slug": bank_slug,
@@ -270,6 +327,7 @@ class ParserService:
             
         except Exception as e:
             logger.error(f"Error processing parsed reviews: {str(e)}", exc_info=True)
+            await session.rollback()
             return {
                 "status": "error",
                 "message": f"Processing failed: {str(e)}"
@@ -523,6 +581,7 @@ class ParserService:
                 parent_id=None
             )
             parent_product = await product_repo.save(session, parent_product)
+            product_hierarchy.invalidate()
             logger.info(f"Created parent product: {parent_name}")
         
         return parent_product
@@ -629,6 +688,7 @@ class ParserService:
         }
         return scores.get(sentiment, 0.0)
 
+    @timed_job("parser_sravni")
     async def run_sravni_parser(
         self, 
         session: AsyncSession, 
@@ -1,18 +1,30 @@
+import base64
+import logging
+import numpy as np
 import pandas as pd
 from fastapi import HTTPException
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import date, timedelta, datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, func
+from sqlalchemy import and_, or_, case, func
 from calendar import monthrange
 from sqlalchemy import select
 from app.repositories.repositories import (
     ProductRepository, ReviewRepository, MonthlyStatsRepository, ClusterStatsRepository,
-    ClusterRepository, ReviewClusterRepository, ReviewCluster, Review, ReviewsForModelRepository
+    ClusterRepository, ReviewClusterRepository, ReviewCluster, ReviewsForModelRepository,
+    ReviewDailyFactRepository, ReviewPartitionRepository, AggregatesWatermarkRepository, review_cluster_link,
+    review_links_condition
 )
+from app.repositories.product_hierarchy import ProductHierarchyIndex, ProductNode
 from app.models.user_models import User
 from app.schemas.schemas import ReviewResponse, ClusterResponse, ReviewBulkCreate, ReviewsResponse, ReviewResponseWithArray
 from app.models.models import ProductType, Sentiment, ReviewProduct, ReviewsForModel
+from app.utils.time_series import (
+    SENTIMENTS, align_periods, bucket_labels, check_aggregation_type, dense_frame,
+    parse_period_date, parse_periods, percentage_change, rows_frame, shares
+)
+
+logger = logging.getLogger(__name__)
 
 class StatsService:
     def __init__(
@@ -24,6 +36,10 @@ class StatsService:
         cluster_repo: ClusterRepository,
         review_cluster_repo: ReviewClusterRepository,
         reviews_for_model_repo: ReviewsForModelRepository,
+        review_daily_fact_repo: ReviewDailyFactRepository,
+        review_partition_repo: ReviewPartitionRepository,
+        aggregates_watermark_repo: AggregatesWatermarkRepository,
+        product_hierarchy: ProductHierarchyIndex,
     ):
         self._product_repo = product_repo
         self._review_repo = review_repo
@@ -32,6 +48,110 @@ class StatsService:
         self._cluster_repo = cluster_repo
         self._review_cluster_repo = review_cluster_repo
         self._reviews_for_model_repo = reviews_for_model_repo
+        self._review_daily_fact_repo = review_daily_fact_repo
+        self._review_partition_repo = review_partition_repo
+        self._aggregates_watermark_repo = aggregates_watermark_repo
+        self._product_hierarchy = product_hierarchy
+
+    async def ensure_daily_facts(self, session: AsyncSession) -> None:
+        """Заполнить дневные агрегаты отзывов, если таблица ещё пуста (первый запуск после миграции)"""
+        await self._product_repo.ensure_closure(session)
+        if await self._review_daily_fact_repo.is_empty(session):
+            await self._review_daily_fact_repo.rebuild(session)
+            await session.commit()
+
+    async def refresh_monthly_aggregates(self, session: AsyncSession) -> None:
+        """
+        Обновить MonthlyStats и ClusterStats — только ячейки отзывов, созданных или привязанных
+        к кластерам после прошлого обновления. Момент обновления хранится в базе и общий для процессов;
+        целиком таблицы пересчитываются, только если они ещё пусты.
+        """
+        started_at = await self._aggregates_watermark_repo.get_safe_point(session)
+        refreshed_at = await self._aggregates_watermark_repo.get(session)
+        if refreshed_at is not None:
+            review_keys = await self._review_repo.get_keys_changed_since(session, refreshed_at)
+            cells = await self._monthly_stats_repo.get_cells_for_reviews(session, review_keys)
+            await self._monthly_stats_repo.refresh(session, cells)
+            await self._cluster_stats_repo.refresh(session, cells)
+        elif await self._monthly_stats_repo.is_empty(session):
+            await self._monthly_stats_repo.refresh(session)
+            await self._cluster_stats_repo.refresh(session)
+        await self._aggregates_watermark_repo.set(session, started_at)
+        await session.commit()
+
+    async def maintain_review_partitions(
+        self, session: AsyncSession, months_ahead: int, retention_months: Optional[int] = None
+    ) -> List[date]:
+        """
+        Создать партиции отзывов текущего месяца и months_ahead следующих. Если задан retention_months,
+        удалить партиции месяцев старше этого срока.
+
+        Returns:
+            List[date]: Удалённые месяцы
+        """
+        today = date.today()
+        await self._review_partition_repo.ensure_ahead(session, today, months_ahead)
+        if not retention_months:
+            return []
+        cutoff = self._review_partition_repo.retention_cutoff(today, retention_months)
+        return await self._review_partition_repo.drop_months_before(session, cutoff)
+
+    def _subtree_condition(self, product: ProductNode):
+        """Фильтр связей отзывов по узлу: категории и подкатегории раскрываются во всех потомков"""
+        return self._product_repo.subtree_condition(
+            product.id, product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]
+        )
+
+    @staticmethod
+    def _split_whole_months(start: date, end: date):
+        """
+        Разбить период на полные календарные месяцы (первый и последний месяц или None)
+        и список неполных краёв [(start, end), ...].
+        """
+        first_whole = start if start.day == 1 else (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        last_whole_end = end if end.day == monthrange(end.year, end.month)[1] else end.replace(day=1) - timedelta(days=1)
+        if first_whole > last_whole_end:
+            return None, [(start, end)]
+
+        partial = []
+        if start < first_whole:
+            partial.append((start, first_whole - timedelta(days=1)))
+        if end > last_whole_end:
+            partial.append((last_whole_end + timedelta(days=1), end))
+        return (first_whole, last_whole_end.replace(day=1)), partial
+
+    async def _load_period_frames(
+        self, session: AsyncSession, product_id: int, periods: List[Tuple[date, date]],
+        aggregation_type: str, source: Optional[str] = None
+    ) -> List[pd.DataFrame]:
+        """
+        Плотные таблицы интервалы × (all, positive, neutral, negative) для каждого периода,
+        посчитанные одним запросом к дневным агрегатам
+        """
+        rows = await self._review_daily_fact_repo.get_period_buckets(
+            session, product_id, periods, aggregation_type, source=source
+        )
+        count_columns = [f"count_{i}" for i in range(len(periods))]
+        frame = rows_frame(rows, ["agg_date", "sentiment", *count_columns])
+        return [
+            dense_frame(
+                frame, "agg_date", "sentiment", column,
+                bucket_labels(start, end, aggregation_type), ("all", *SENTIMENTS), aggregation_type
+            )
+            for column, (start, end) in zip(count_columns, periods)
+        ]
+
+    @staticmethod
+    def _tonality_series(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Интервалы периода с общим количеством и тональностью"""
+        return [
+            {
+                "aggregation": label,
+                "tonality": {sentiment: values[sentiment] for sentiment in SENTIMENTS},
+                "total_count": values["all"]
+            }
+            for label, values in frame.to_dict("index").items()
+        ]
 
     async def get_product_stats(
         self, 
@@ -40,64 +160,36 @@ class StatsService:
         end_date: str,
         start_date2: str, 
         end_date2: str,
-        source: Optional[str] = None
+        source: Optional[str] = None,
+        product_id: Optional[int] = None,
+        page: int = 0,
+        size: int = 100
     ) -> List[Dict[str, Any]]:
-        def parse_date(date_str: str) -> date:
-            """Parse date string in YYYY-MM-DD format."""
-            try:
-                return datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат {date_str}. Ожидается YYYY-MM-DD") from e
+        start_date_parsed, end_date_parsed, start_date2_parsed, end_date2_parsed = parse_periods(
+            start_date, end_date, start_date2, end_date2, "day"
+        )
 
-        try:
-            start_date_parsed = parse_date(start_date)
-            end_date_parsed = parse_date(end_date)
-            start_date2_parsed = parse_date(start_date2)
-            end_date2_parsed = parse_date(end_date2)
-        except ValueError as e:
-            raise ValueError(str(e))
+        products = await self._product_repo.get_all(session, page=page, size=size, product_id=product_id)
+        subtree_stats = await self._review_daily_fact_repo.get_stats_by_products(
+            session, [product.id for product in products], start_date_parsed, end_date_parsed,
+            start_date2_parsed, end_date2_parsed, source=source
+        )
 
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        empty_stats = {"count": 0, "prev_count": 0, "tonality": {"positive": 0, "neutral": 0, "negative": 0}, "avg_rating": 0.0}
+        product_stats = [subtree_stats.get(product.id, empty_stats) for product in products]
+        change_percents = percentage_change(
+            [stat["count"] for stat in product_stats], [stat["prev_count"] for stat in product_stats]
+        ).tolist()
 
-        products = await self._product_repo.get_all(session)
         stats = []
-        for product in products:
-            if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-                descendants = await self._product_repo.get_all_descendants(session, product.id)
-                product_ids = [p.id for p in descendants] + [product.id]
-            else:
-                product_ids = [product.id]
-
-            total_count = await self._review_repo.count_by_product_and_period(
-                session, product_ids, start_date_parsed, end_date_parsed, source=source
-            )
-            tonality = await self._review_repo.get_tonality_counts_by_product_and_period(
-                session, product_ids, start_date_parsed, end_date_parsed, source=source
-            )
-            avg_rating = await self._review_repo.get_avg_rating_by_products(
-                session, product_ids, source=source
-            ) if total_count > 0 else 0.0
-
-            prev_count = await self._review_repo.count_by_product_and_period(
-                session, product_ids, start_date2_parsed, end_date2_parsed, source=source
-            )
-
-            change_percent = (
-                round(((total_count - prev_count) / prev_count * 100), 1)
-                if prev_count > 0
-                else 100.0 if total_count > 0 else 0.0
-            )
-            change_color = "green" if change_percent >= 0 else "red"
-
+        for product, stat, change_percent in zip(products, product_stats, change_percents):
+            avg_rating = stat["avg_rating"] if stat["count"] > 0 else 0.0
             stats.append({
                 "product_name": product.name,
                 "change_percent": change_percent,
-                "change_color": change_color,
-                "count": total_count,
-                "tonality": tonality,
+                "change_color": "green" if change_percent >= 0 else "red",
+                "count": stat["count"],
+                "tonality": stat["tonality"],
                 "avg_rating": round(avg_rating, 1) if avg_rating else 0.0
             })
         return stats
@@ -106,422 +198,109 @@ class StatsService:
         self, session: AsyncSession, product_id: int, start_date: str, end_date: str,
         start_date2: str, end_date2: str, aggregation_type: str, source: Optional[str] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        def parse_date(date_str: str, agg_type: str, is_start_date: bool) -> datetime.date:
-            """Parse date string based on aggregation type and whether it's a start or end date."""
-            try:
-                if agg_type == "month":
-                    year, month = map(int, date_str.split("-"))
-                    if is_start_date:
-                        parsed_date = datetime(year, month, 1).date()
-                    else:
-                        _, last_day = monthrange(year, month)
-                        parsed_date = datetime(year, month, last_day).date()
-                else:
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                return parsed_date
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат {date_str}. Ожидается {'YYYY-MM' if agg_type == 'month' else 'YYYY-MM-DD'}") from e
+        check_aggregation_type(aggregation_type)
+        start, end, start2, end2 = parse_periods(start_date, end_date, start_date2, end_date2, aggregation_type)
 
-        try:
-            start_date_parsed = parse_date(start_date, aggregation_type, is_start_date=True)
-            end_date_parsed = parse_date(end_date, aggregation_type, is_start_date=False)
-            start_date2_parsed = parse_date(start_date2, aggregation_type, is_start_date=True)
-            end_date2_parsed = parse_date(end_date2, aggregation_type, is_start_date=False)
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
-
-        product = await self._product_repo.get_by_id(session, product_id)
-        if not product:
+        hierarchy = await self._product_hierarchy.get(session)
+        if not hierarchy.get_node(product_id):
             return {"period1": [], "period2": [], "changes": []}
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
-
-        if aggregation_type not in ["month", "week", "day"]:
-            raise ValueError("Неправильный aggregation type. Должно быть 'month', 'week', или 'day'.")
-
-        if aggregation_type == "month":
-            date_trunc = "month"
-            date_format = "%Y-%m"
-        elif aggregation_type == "week":
-            date_trunc = "week"
-            date_format = "%Y-%m-%d"
-        else:
-            date_trunc = "day"
-            date_format = "%Y-%m-%d"
-
-        agg_date = func.date_trunc(date_trunc, Review.date).label("agg_date")
-        
-        total_period1_query = select(
-            agg_date,
-            func.count(func.distinct(Review.id)).label("total_count")
-        ).join(ReviewProduct).where(
-            ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date_parsed,
-            Review.date <= end_date_parsed
+        frame1, frame2 = await self._load_period_frames(
+            session, product_id, [(start, end), (start2, end2)], aggregation_type, source=source
         )
-        
-        if source:
-            total_period1_query = total_period1_query.where(Review.source == source)
-        
-        total_period1_query = total_period1_query.group_by(agg_date).order_by(agg_date)
-        total_period1_result = await session.execute(total_period1_query)
-        total_period1_data = total_period1_result.all()
-        
-        total_period1_dict = {row.agg_date.strftime(date_format): row.total_count for row in total_period1_data}
+        labels, current, previous = align_periods(frame1[list(SENTIMENTS)], frame2[list(SENTIMENTS)])
+        changes = percentage_change(current, previous).tolist()
 
-        tonality_period1_query = select(
-            agg_date,
-            ReviewProduct.sentiment,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
-            ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date_parsed,
-            Review.date <= end_date_parsed,
-            ReviewProduct.sentiment.isnot(None)
-        )
-        
-        if source:
-            tonality_period1_query = tonality_period1_query.where(Review.source == source)
-        
-        tonality_period1_query = tonality_period1_query.group_by(agg_date, ReviewProduct.sentiment).order_by(agg_date)
-        tonality_period1_result = await session.execute(tonality_period1_query)
-        tonality_period1_data = tonality_period1_result.all()
-
-        period1_dict = {}
-        for row in tonality_period1_data:
-            agg_date_str = row.agg_date.strftime(date_format)
-            if agg_date_str not in period1_dict:
-                period1_dict[agg_date_str] = {"positive": 0, "neutral": 0, "negative": 0}
-            period1_dict[agg_date_str][row.sentiment] = row.count
-
-        total_period2_query = select(
-            agg_date,
-            func.count(func.distinct(Review.id)).label("total_count")
-        ).join(ReviewProduct).where(
-            ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date2_parsed,
-            Review.date <= end_date2_parsed
-        )
-        
-        if source:
-            total_period2_query = total_period2_query.where(Review.source == source)
-        
-        total_period2_query = total_period2_query.group_by(agg_date).order_by(agg_date)
-        total_period2_result = await session.execute(total_period2_query)
-        total_period2_data = total_period2_result.all()
-        
-        total_period2_dict = {row.agg_date.strftime(date_format): row.total_count for row in total_period2_data}
+        return {
+            "period1": self._tonality_series(frame1),
+            "period2": self._tonality_series(frame2),
+            "changes": [
+                {"aggregation": label, "percentage_change": dict(zip(SENTIMENTS, row))}
+                for label, row in zip(labels, changes)
+            ]
+        }
 
-        tonality_period2_query = select(
-            agg_date,
-            ReviewProduct.sentiment,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
-            ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date2_parsed,
-            Review.date <= end_date2_parsed,
-            ReviewProduct.sentiment.isnot(None)
-        )
-        
-        if source:
-            tonality_period2_query = tonality_period2_query.where(Review.source == source)
-        
-        tonality_period2_query = tonality_period2_query.group_by(agg_date, ReviewProduct.sentiment).order_by(agg_date)
-        tonality_period2_result = await session.execute(tonality_period2_query)
-        tonality_period2_data = tonality_period2_result.all()
-
-        period2_dict = {}
-        for row in tonality_period2_data:
-            agg_date_str = row.agg_date.strftime(date_format)
-            if agg_date_str not in period2_dict:
-                period2_dict[agg_date_str] = {"positive": 0, "neutral": 0, "negative": 0}
-            period2_dict[agg_date_str][row.sentiment] = row.count
-
-        def generate_date_range(start: datetime.date, end: datetime.date, agg_type: str) -> List[str]:
-            result = []
-            current = start
-            if agg_type == "week":
-                days_to_monday = current.weekday()
-                current = current - timedelta(days=days_to_monday)
-            while current <= end:
-                if agg_type == "month":
-                    month_str = current.strftime("%Y-%m")
-                    result.append(month_str)
-                    if current.month == 12:
-                        current = date(current.year + 1, 1, 1)
-                    else:
-                        current = date(current.year, current.month + 1, 1)
-                elif agg_type == "week":
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=7)
-                else:
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=1)
-            return result
-
-        period1_dates = generate_date_range(start_date_parsed, end_date_parsed, aggregation_type)
-        period2_dates = generate_date_range(start_date2_parsed, end_date2_parsed, aggregation_type)
-
-        period1 = [
-            {
-                "aggregation": date,
-                "tonality": period1_dict.get(date, {"positive": 0, "neutral": 0, "negative": 0}),
-                "total_count": total_period1_dict.get(date, 0)
-            }
-            for date in period1_dates
-        ]
-        period2 = [
-            {
-                "aggregation": date,
-                "tonality": period2_dict.get(date, {"positive": 0, "neutral": 0, "negative": 0}),
-                "total_count": total_period2_dict.get(date, 0)
-            }
-            for date in period2_dates
+    async def compare_periods(
+        self, session: AsyncSession, product_id: int, periods: List[Tuple[str, str]],
+        aggregation_type: str, source: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Сравнение произвольного числа периодов (например, текущий месяц, прошлый месяц и тот же месяц
+        год назад). Интервалы всех периодов считаются одним запросом; изменения каждого следующего
+        периода считаются относительно первого, интервалы сопоставляются по порядковому номеру.
+        """
+        check_aggregation_type(aggregation_type)
+        if len(periods) < 2:
+            raise ValueError("Для сравнения нужно хотя бы два периода")
+
+        parsed_periods = []
+        for start_str, end_str in periods:
+            start = parse_period_date(start_str, aggregation_type, is_start_date=True)
+            end = parse_period_date(end_str, aggregation_type, is_start_date=False)
+            if start > end:
+                raise ValueError(f"Начало периода {start_str} должно быть до или равно концу {end_str}")
+            parsed_periods.append((start, end))
+
+        hierarchy = await self._product_hierarchy.get(session)
+        if not hierarchy.get_node(product_id):
+            return {"periods": [], "changes": []}
+
+        frames = await self._load_period_frames(session, product_id, parsed_periods, aggregation_type, source=source)
+        series = [
+            {"start_date": start.isoformat(), "end_date": end.isoformat(), "buckets": self._tonality_series(frame)}
+            for (start, end), frame in zip(parsed_periods, frames)
         ]
 
+        columns = ["all", *SENTIMENTS]
+        base = frames[0]
         changes = []
-        min_length = min(len(period1), len(period2))
-        
-        for i in range(min_length):
-            period1_item = period1[i]
-            period2_item = period2[i]
-            
-            period1_tonality = period1_item["tonality"]
-            period2_tonality = period2_item["tonality"]
-            
-            def safe_percentage_change(current, previous):
-                if previous > 0:
-                    return round(((current - previous) / previous * 100), 1)
-                elif current > 0:
-                    return 100.0 
-                elif previous > 0 and current == 0:
-                    return -100.0 
-                else:
-                    return 0.0
-
-            percentage_change = {
-                "positive": safe_percentage_change(period1_tonality["positive"], period2_tonality["positive"]),
-                "neutral": safe_percentage_change(period1_tonality["neutral"], period2_tonality["neutral"]),
-                "negative": safe_percentage_change(period1_tonality["negative"], period2_tonality["negative"])
-            }
-            
+        for index, other in enumerate(frames[1:], start=1):
+            length = min(len(base), len(other))
+            change = percentage_change(
+                base[columns].to_numpy()[:length], other[columns].to_numpy()[:length]
+            ).tolist()
             changes.append({
-                "aggregation": period1_item["aggregation"],
-                "percentage_change": percentage_change
-            })
-
-        if len(period1) > min_length:
-            for i in range(min_length, len(period1)):
-                changes.append({
-                    "aggregation": period1[i]["aggregation"],
-                    "percentage_change": {
-                        "positive": 100.0 if period1[i]["tonality"]["positive"] > 0 else 0.0,
-                        "neutral": 100.0 if period1[i]["tonality"]["neutral"] > 0 else 0.0,
-                        "negative": 100.0 if period1[i]["tonality"]["negative"] > 0 else 0.0
-                    }
-                })
-        elif len(period2) > min_length:
-            for i in range(min_length, len(period2)):
-                changes.append({
-                    "aggregation": period2[i]["aggregation"],
-                    "percentage_change": {
-                        "positive": -100.0 if period2[i]["tonality"]["positive"] > 0 else 0.0,
-                        "neutral": -100.0 if period2[i]["tonality"]["neutral"] > 0 else 0.0,
-                        "negative": -100.0 if period2[i]["tonality"]["negative"] > 0 else 0.0
+                "period": index,
+                "buckets": [
+                    {
+                        "aggregation": base_label,
+                        "compared_to": other_label,
+                        "change_percent": row[0],
+                        "tonality_change_percent": dict(zip(SENTIMENTS, row[1:]))
                     }
-                })
+                    for base_label, other_label, row in zip(base.index[:length], other.index[:length], change)
+                ]
+            })
 
-        return {
-            "period1": period1,
-            "period2": period2,
-            "changes": changes
-        }
+        return {"periods": series, "changes": changes}
 
     async def get_bar_chart_changes(
         self, session: AsyncSession, product_id: int, start_date: str, end_date: str,
         start_date2: str, end_date2: str, aggregation_type: str, source: Optional[str] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        def parse_date(date_str: str, agg_type: str, is_start_date: bool) -> datetime.date:
-            try:
-                if agg_type == "month":
-                    year, month = map(int, date_str.split("-"))
-                    if is_start_date:
-                        parsed_date = datetime(year, month, 1).date()
-                    else:
-                        _, last_day = monthrange(year, month)
-                        parsed_date = datetime(year, month, last_day).date()
-                else:
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                return parsed_date
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат даты {date_str}. Ожидается {'YYYY-MM' if agg_type == 'month' else 'YYYY-MM-DD'}") from e
-
-        try:
-            start_date_parsed = parse_date(start_date, aggregation_type, is_start_date=True)
-            end_date_parsed = parse_date(end_date, aggregation_type, is_start_date=False)
-            start_date2_parsed = parse_date(start_date2, aggregation_type, is_start_date=True)
-            end_date2_parsed = parse_date(end_date2, aggregation_type, is_start_date=False)
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        check_aggregation_type(aggregation_type)
+        start, end, start2, end2 = parse_periods(start_date, end_date, start_date2, end_date2, aggregation_type)
 
-        product = await self._product_repo.get_by_id(session, product_id)
-        if not product:
+        hierarchy = await self._product_hierarchy.get(session)
+        if not hierarchy.get_node(product_id):
             return {"period1": [], "period2": [], "changes": []}
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
-
-        if aggregation_type not in ["month", "week", "day"]:
-            raise ValueError("Неправильный aggregation type. Должно быть 'month', 'week', или 'day'.")
-
-        if aggregation_type == "month":
-            date_trunc = "month"
-            date_format = "%Y-%m"
-        elif aggregation_type == "week":
-            date_trunc = "week"
-            date_format = "%Y-%m-%d"
-        else:
-            date_trunc = "day"
-            date_format = "%Y-%m-%d"
-
-        agg_date = func.date_trunc(date_trunc, Review.date).label("agg_date")
-        period1_query = select(
-            agg_date,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
-            and_(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date_parsed,
-                Review.date <= end_date_parsed
-            )
-        )
-        if source:
-            period1_query = period1_query.where(Review.source == source)
-        period1_query = period1_query.group_by(agg_date).order_by(agg_date)
-        period1_result = await session.execute(period1_query)
-        period1_data = period1_result.all()
-
-        period1_dict = {}
-        for row in period1_data:
-            agg_date_str = row.agg_date.strftime(date_format)
-            period1_dict[agg_date_str] = row.count
-        
-        period2_query = select(
-            agg_date,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
-            and_(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date2_parsed,
-                Review.date <= end_date2_parsed
-            )
+        frame1, frame2 = await self._load_period_frames(
+            session, product_id, [(start, end), (start2, end2)], aggregation_type, source=source
         )
-        if source:
-            period2_query = period2_query.where(Review.source == source)
-        period2_query = period2_query.group_by(agg_date).order_by(agg_date)
-        period2_result = await session.execute(period2_query)
-        period2_data = period2_result.all()
-
-        period2_dict = {}
-        for row in period2_data:
-            agg_date_str = row.agg_date.strftime(date_format)
-            period2_dict[agg_date_str] = row.count
-        
-        def generate_date_range(start: datetime.date, end: datetime.date, agg_type: str) -> List[str]:
-            result = []
-            current = start
-            if agg_type == "week":
-                days_to_monday = current.weekday()
-                current = current - timedelta(days=days_to_monday)
-            while current <= end:
-                if agg_type == "month":
-                    month_str = current.strftime("%Y-%m")
-                    result.append(month_str)
-                    if current.month == 12:
-                        current = date(current.year + 1, 1, 1)
-                    else:
-                        current = date(current.year, current.month + 1, 1)
-                elif agg_type == "week":
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=7)
-                else:
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=1)
-            return result
-
-        period1_dates = generate_date_range(start_date_parsed, end_date_parsed, aggregation_type)
-        period2_dates = generate_date_range(start_date2_parsed, end_date2_parsed, aggregation_type)
-
-        period1 = [
-            {
-                "aggregation": date,
-                "count": period1_dict.get(date, 0)
-            }
-            for date in period1_dates
-        ]
-        period2 = [
-            {
-                "aggregation": date,
-                "count": period2_dict.get(date, 0)
-            }
-            for date in period2_dates
-        ]
-
-        changes = []
-        min_length = min(len(period1), len(period2))
-        
-        for i in range(min_length):
-            period1_count = period1[i]["count"]
-            period2_count = period2[i]["count"]
-
-            if period2_count > 0:
-                change_percent = round(((period1_count - period2_count) / period2_count * 100), 1)
-            elif period1_count > 0:
-                change_percent = 100.0
-            elif period2_count > 0 and period1_count == 0:
-                change_percent = -100.0
-            else:
-                change_percent = 0.0
-            
-            changes.append({
-                "aggregation": period1[i]["aggregation"],
-                "change_percent": change_percent
-            })
-
-        if len(period1) > min_length:
-            for i in range(min_length, len(period1)):
-                changes.append({
-                    "aggregation": period1[i]["aggregation"],
-                    "change_percent": 100.0 if period1[i]["count"] > 0 else 0.0
-                })
-        elif len(period2) > min_length:
-            for i in range(min_length, len(period2)):
-                changes.append({
-                    "aggregation": period2[i]["aggregation"],
-                    "change_percent": -100.0 if period2[i]["count"] > 0 else 0.0
-                })
+        labels, current, previous = align_periods(frame1[["all"]], frame2[["all"]])
+        changes = percentage_change(current[:, 0], previous[:, 0]).tolist()
 
         return {
-            "period1": period1,
-            "period2": period2,
-            "changes": changes
+            "period1": [
+                {"aggregation": label, "count": count} for label, count in zip(frame1.index, frame1["all"].tolist())
+            ],
+            "period2": [
+                {"aggregation": label, "count": count} for label, count in zip(frame2.index, frame2["all"].tolist())
+            ],
+            "changes": [
+                {"aggregation": label, "change_percent": change} for label, change in zip(labels, changes)
+            ]
         }
 
     async def get_monthly_pie_chart(
@@ -529,36 +308,12 @@ class StatsService:
         start_date2: str, end_date2: str, source: Optional[str] = None
     ) -> Dict[str, Any]:
 
-        def parse_date(date_str: str, is_start_date: bool) -> datetime.date:
-            """Parse date string in YYYY-MM-DD or YYYY-MM format."""
-            try:
-                if len(date_str.split("-")) == 2:
-                    year, month = map(int, date_str.split("-"))
-                    if is_start_date:
-                        parsed_date = datetime(year, month, 1).date()
-                    else:
-                        _, last_day = monthrange(year, month)
-                        parsed_date = datetime(year, month, last_day).date()
-                else:
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                return parsed_date
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат даты {date_str}. Ожидается YYYY-MM-DD или YYYY-MM") from e
-
-        try:
-            start_date_parsed = parse_date(start_date, is_start_date=True)
-            end_date_parsed = parse_date(end_date, is_start_date=False)
-            start_date2_parsed = parse_date(start_date2, is_start_date=True) if start_date2 else None
-            end_date2_parsed = parse_date(end_date2, is_start_date=False) if end_date2 else None
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed and end_date2_parsed and start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        start_date_parsed, end_date_parsed, start_date2_parsed, end_date2_parsed = parse_periods(
+            start_date, end_date, start_date2, end_date2, second_required=False
+        )
 
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             return {
                 "period1": {"labels": [], "data": [], "colors": [], "total": 0},
@@ -566,13 +321,9 @@ class StatsService:
                 "changes": {"labels": [], "percentage_point_changes": [], "relative_percentage_changes": []}
             }
         
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
+        subtree = self._subtree_condition(product)
 
-        clusters = await self._cluster_repo.get_all(session)
+        clusters = hierarchy.clusters
         if not clusters:
             return {
                 "period1": {"labels": [], "data": [], "colors": [], "total": 0},
@@ -582,101 +333,68 @@ class StatsService:
 
         cluster_names = [c.name for c in clusters]
         cluster_ids = [c.id for c in clusters]
-        colors = [self._get_color_for_cluster(c.id) for c in clusters]
-
-        period1_total_query = select(func.count(func.distinct(Review.id)).label("total")) \
-            .join(ReviewProduct, ReviewProduct.review_id == Review.id) \
-            .where(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date_parsed,
-                Review.date <= end_date_parsed
-            )
-        if source:
-            period1_total_query = period1_total_query.where(Review.source == source)
-        period1_total_result = await session.execute(period1_total_query)
-        period1_total = period1_total_result.scalar() or 0
+        colors = [c.color for c in clusters]
 
-        period1_query = select(
-            ReviewCluster.cluster_id,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(Review, ReviewCluster.review_id == Review.id) \
-        .join(ReviewProduct, ReviewProduct.review_id == Review.id) \
-        .where(
-            ReviewProduct.product_id.in_(product_ids),
-            Review.date >= start_date_parsed,
-            Review.date <= end_date_parsed,
-            ReviewCluster.cluster_id.in_(cluster_ids)
-        )
-        if source:
-            period1_query = period1_query.where(Review.source == source)
-        period1_query = period1_query.group_by(ReviewCluster.cluster_id)
-        period1_result = await session.execute(period1_query)
-        period1_data = period1_result.all()
-
-        period1_counts = {c.id: 0 for c in clusters}
-        for row in period1_data:
-            period1_counts[row.cluster_id] = row.count
-        period1_percentages = [
-            round((period1_counts[c.id] / period1_total * 100), 1) if period1_total > 0 else 0.0
-            for c in clusters
-        ]
-
-        period2_total = 0
-        period2_percentages = [0.0] * len(clusters)
-        if start_date2_parsed and end_date2_parsed:
-            period2_total_query = select(func.count(func.distinct(Review.id)).label("total")) \
-                .join(ReviewProduct, ReviewProduct.review_id == Review.id) \
+        async def count_period(period_start: date, period_end: date):
+            """Общее количество и количество по кластерам: полные месяцы из агрегатов, края — из отзывов"""
+            if source:
+                whole_months, partial_ranges = None, [(period_start, period_end)]
+            else:
+                whole_months, partial_ranges = self._split_whole_months(period_start, period_end)
+
+            total = 0
+            counts = {c.id: 0 for c in clusters}
+            if whole_months:
+                total += await self._monthly_stats_repo.get_review_count(session, product_id, *whole_months)
+                cluster_counts = await self._cluster_stats_repo.get_review_counts(
+                    session, product_id, cluster_ids, *whole_months
+                )
+                for cluster_id, count in cluster_counts.items():
+                    counts[cluster_id] += count
+
+            for range_start, range_end in partial_ranges:
+                total_query = select(func.count(func.distinct(ReviewProduct.review_id)).label("total")) \
+                    .where(
+                        subtree,
+                        ReviewProduct.review_date >= range_start,
+                        ReviewProduct.review_date <= range_end
+                    )
+                if source:
+                    total_query = total_query.where(ReviewProduct.review_source == source)
+                total_result = await session.execute(total_query)
+                total += total_result.scalar() or 0
+
+                clusters_query = select(
+                    ReviewCluster.cluster_id,
+                    func.count(func.distinct(ReviewProduct.review_id)).label("count")
+                ).join(ReviewProduct, review_cluster_link()) \
                 .where(
-                    ReviewProduct.product_id.in_(product_ids),
-                    Review.date >= start_date2_parsed,
-                    Review.date <= end_date2_parsed
+                    subtree,
+                    ReviewProduct.review_date >= range_start,
+                    ReviewProduct.review_date <= range_end,
+                    ReviewCluster.cluster_id.in_(cluster_ids)
                 )
-            if source:
-                period2_total_query = period2_total_query.where(Review.source == source)
-            period2_total_result = await session.execute(period2_total_query)
-            period2_total = period2_total_result.scalar() or 0
+                if source:
+                    clusters_query = clusters_query.where(ReviewProduct.review_source == source)
+                clusters_query = clusters_query.group_by(ReviewCluster.cluster_id)
+                clusters_result = await session.execute(clusters_query)
+                for row in clusters_result.all():
+                    counts[row.cluster_id] += row.count
+            return total, counts
 
-            period2_query = select(
-                ReviewCluster.cluster_id,
-                func.count(func.distinct(Review.id)).label("count")
-            ).join(Review, ReviewCluster.review_id == Review.id) \
-            .join(ReviewProduct, ReviewProduct.review_id == Review.id) \
-            .where(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date2_parsed,
-                Review.date <= end_date2_parsed,
-                ReviewCluster.cluster_id.in_(cluster_ids)
-            )
-            if source:
-                period2_query = period2_query.where(Review.source == source)
-            period2_query = period2_query.group_by(ReviewCluster.cluster_id)
-            period2_result = await session.execute(period2_query)
-            period2_data = period2_result.all()
-
-            period2_counts = {c.id: 0 for c in clusters}
-            for row in period2_data:
-                period2_counts[row.cluster_id] = row.count
-            period2_percentages = [
-                round((period2_counts[c.id] / period2_total * 100), 1) if period2_total > 0 else 0.0
-                for c in clusters
-            ]
+        period1_total, period1_counts = await count_period(start_date_parsed, end_date_parsed)
+        period1_shares = shares([period1_counts[c.id] for c in clusters], period1_total)
 
-        percentage_point_changes = [
-            round(period2_percentages[i] - period1_percentages[i], 1)
-            for i in range(len(clusters))
-        ]
+        period2_total = 0
+        period2_shares = np.zeros(len(clusters))
+        if start_date2_parsed and end_date2_parsed:
+            period2_total, period2_counts = await count_period(start_date2_parsed, end_date2_parsed)
+            period2_shares = shares([period2_counts[c.id] for c in clusters], period2_total)
 
-        relative_percentage_changes = []
-        for i in range(len(clusters)):
-            p1 = period1_percentages[i]
-            p2 = period2_percentages[i]
-            if p1 > 0:
-                change = round(((p2 - p1) / p1) * 100, 1)
-            elif p2 > 0:
-                change = 100.0
-            else:
-                change = 0.0
-            relative_percentage_changes.append(change)
+        period1_percentages = period1_shares.tolist()
+        period2_percentages = period2_shares.tolist()
+        percentage_point_changes = np.round(period2_shares - period1_shares, 1).tolist()
+        relative_percentage_changes = percentage_change(period2_shares, period1_shares).tolist()
 
         result = {
             "period1": {
@@ -704,39 +422,22 @@ class StatsService:
         self, session: AsyncSession, product_id: int, start_date: str, end_date: str,
         start_date2: str, end_date2: str, source: Optional[str] = None
     ) -> Dict[str, Any]:
-        def parse_date(date_str: str) -> date:
-            """Парсинг даты в формат YYYY-MM-DD"""
-            try:
-                return datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат даты {date_str}. Ожидается YYYY-MM-DD") from e
-
-        try:
-            start_date_parsed = parse_date(start_date)
-            end_date_parsed = parse_date(end_date)
-            start_date2_parsed = parse_date(start_date2)
-            end_date2_parsed = parse_date(end_date2)
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        start_date_parsed, end_date_parsed, start_date2_parsed, end_date2_parsed = parse_periods(
+            start_date, end_date, start_date2, end_date2, "day"
+        )
 
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             return {"total": 0, "change_percent": 0.0}
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
-
-        total = await self._review_repo.count_by_product_and_period(session, product_ids, start_date_parsed, end_date_parsed, source=source)
-        prev_total = await self._review_repo.count_by_product_and_period(session, product_ids, start_date2_parsed, end_date2_parsed, source=source)
-        change_percent = round(((total - prev_total) / prev_total * 100), 1) if prev_total > 0 else 100.0 if total > 0 else 0.0
+        total = (await self._review_daily_fact_repo.get_totals(
+            session, product_id, start_date_parsed, end_date_parsed, source=source
+        ))["count"]
+        prev_total = (await self._review_daily_fact_repo.get_totals(
+            session, product_id, start_date2_parsed, end_date2_parsed, source=source
+        ))["count"]
+        change_percent = float(percentage_change(total, prev_total))
 
         return {
             "total": total,
@@ -746,34 +447,25 @@ class StatsService:
     async def get_small_bar_charts(
         self, session: AsyncSession, product_id: int, start_date: date, end_date: date, user: User, cluster_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        import logging
-        logging.basicConfig(level=logging.DEBUG)
-        logger = logging.getLogger(__name__)
-
         logger.debug(f"Fetching small bar charts for product_id={product_id}, cluster_id={cluster_id}, start_date={start_date}, end_date={end_date}")
 
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             logger.warning(f"Product with ID {product_id} not found")
             return []
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-            logger.debug(f"Product IDs (including descendants): {product_ids}")
-        else:
-            product_ids = [product_id]
-            logger.debug(f"Product ID: {product_id}")
+        subtree = self._subtree_condition(product)
 
         if cluster_id is not None:
-            cluster = await self._cluster_repo.get_by_id(session, cluster_id)
+            cluster = hierarchy.get_cluster(cluster_id)
             if not cluster:
                 logger.warning(f"Cluster with ID {cluster_id} not found")
                 return []
             clusters = [cluster]
             logger.debug(f"Processing single cluster: ID={cluster.id}, Name={cluster.name}")
         else:
-            clusters = await self._cluster_repo.get_all(session)
+            clusters = hierarchy.clusters
             logger.debug(f"Processing {len(clusters)} clusters: {[c.name for c in clusters]}")
 
         if not clusters:
@@ -782,64 +474,52 @@ class StatsService:
 
         result = []
         prev_start = start_date - timedelta(days=30)
-        
+
+        in_current = and_(ReviewProduct.review_date >= start_date, ReviewProduct.review_date <= end_date)
+        in_previous = and_(ReviewProduct.review_date >= prev_start, ReviewProduct.review_date < start_date)
+        effective_sentiment = func.coalesce(ReviewCluster.sentiment_contribution, ReviewProduct.sentiment)
+
+        def weighted_for(sentiment: str):
+            return func.coalesce(func.sum(case(
+                (and_(in_current, effective_sentiment == sentiment), ReviewCluster.topic_weight), else_=0.0
+            )), 0.0)
+
+        statement = select(
+            ReviewCluster.cluster_id,
+            func.count(func.distinct(case((in_current, ReviewProduct.review_id)))).label("total_count"),
+            func.count(func.distinct(case((in_previous, ReviewProduct.review_id)))).label("prev_count"),
+            weighted_for(Sentiment.POSITIVE.value).label("positive"),
+            weighted_for(Sentiment.NEUTRAL.value).label("neutral"),
+            weighted_for(Sentiment.NEGATIVE.value).label("negative")
+        ).select_from(ReviewCluster)\
+        .join(ReviewProduct, review_cluster_link()).where(
+            and_(
+                subtree,
+                or_(in_current, in_previous),
+                ReviewCluster.cluster_id.in_([c.id for c in clusters])
+            )
+        ).group_by(ReviewCluster.cluster_id)
+        rows_by_cluster = {row.cluster_id: row for row in (await session.execute(statement)).all()}
+
         for cluster in clusters:
-            total_count_query = select(func.count(func.distinct(Review.id))).select_from(ReviewCluster)\
-                .join(Review).join(ReviewProduct).where(
-                    and_(
-                        ReviewProduct.product_id.in_(product_ids),
-                        Review.date >= start_date,
-                        Review.date <= end_date,
-                        ReviewCluster.cluster_id == cluster.id
-                    )
-                )
-            total_count_result = await session.execute(total_count_query)
-            total_count = total_count_result.scalar() or 0
+            row = rows_by_cluster.get(cluster.id)
+            total_count = row.total_count if row else 0
             logger.debug(f"Total count for cluster {cluster.name}: {total_count}")
-            
+
             if total_count == 0:
                 continue
 
-            prev_count_query = select(func.count(func.distinct(Review.id))).select_from(ReviewCluster)\
-                .join(Review).join(ReviewProduct).where(
-                    and_(
-                        ReviewProduct.product_id.in_(product_ids),
-                        Review.date >= prev_start,
-                        Review.date < start_date,
-                        ReviewCluster.cluster_id == cluster.id
-                    )
-                )
-            prev_count_result = await session.execute(prev_count_query)
-            prev_count = prev_count_result.scalar() or 0
+            prev_count = row.prev_count
             logger.debug(f"Previous count: {prev_count}")
-            
+
             change_percent = round(((total_count - prev_count) / prev_count * 100), 1) if prev_count > 0 else 100.0 if total_count > 0 else 0.0
             logger.debug(f"Change percent: {change_percent}")
-            effective_sentiment = func.coalesce(ReviewCluster.sentiment_contribution, ReviewProduct.sentiment).label("effective_sentiment")
-            statement = select(
-                effective_sentiment,
-                func.sum(ReviewCluster.topic_weight).label("weighted_count")
-            ).select_from(ReviewCluster)\
-            .join(Review).join(ReviewProduct).where(
-                and_(
-                    ReviewProduct.product_id.in_(product_ids),
-                    Review.date >= start_date,
-                    Review.date <= end_date,
-                    ReviewCluster.cluster_id == cluster.id
-                )
-            ).group_by(effective_sentiment)
 
-            result_counts = await session.execute(statement)
-            rows = result_counts.fetchall()
-            logger.debug(f"Tonality query results for cluster {cluster.name}: {rows}")
-
-            tonality = {Sentiment.POSITIVE: 0.0, Sentiment.NEUTRAL: 0.0, Sentiment.NEGATIVE: 0.0}
-            for row in rows:
-                sentiment = row.effective_sentiment
-                if sentiment:
-                    tonality[sentiment] = float(row.weighted_count or 0.0)
-                else:
-                    logger.debug(f"Found null effective_sentiment for cluster {cluster.name}")
+            tonality = {
+                Sentiment.POSITIVE: float(row.positive or 0.0),
+                Sentiment.NEUTRAL: float(row.neutral or 0.0),
+                Sentiment.NEGATIVE: float(row.negative or 0.0)
+            }
 
             total_tonality = sum(tonality.values())
             logger.debug(f"Tonality for cluster {cluster.name}: {tonality}, Total: {total_tonality}")
@@ -865,7 +545,6 @@ class StatsService:
                 "data": data
             })
 
-        logger.debug(f"Final result: {result}")
         return result
 
     async def get_monthly_stacked_bars(
@@ -873,261 +552,118 @@ class StatsService:
         start_date2: str, end_date2: str, aggregation_type: str, source: Optional[str] = None, cluster_id: Optional[int] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
 
-        def parse_date(date_str: str, agg_type: str, is_start_date: bool) -> datetime.date:
-            """Парсинг даты с агрегацией."""
-            try:
-                if agg_type == "month":
-                    year, month = map(int, date_str.split("-"))
-                    if is_start_date:
-                        parsed_date = datetime(year, month, 1).date()
-                    else:
-                        _, last_day = monthrange(year, month)
-                        parsed_date = datetime(year, month, last_day).date()
-                else:
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                return parsed_date
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат даты {date_str}. Ожидается {'YYYY-MM' if agg_type == 'month' else 'YYYY-MM-DD'}") from e
-
-        try:
-            start_date_parsed = parse_date(start_date, aggregation_type, is_start_date=True)
-            end_date_parsed = parse_date(end_date, aggregation_type, is_start_date=False)
-            start_date2_parsed = parse_date(start_date2, aggregation_type, is_start_date=True) if start_date2 else None
-            end_date2_parsed = parse_date(end_date2, aggregation_type, is_start_date=False) if end_date2 else None
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed and end_date2_parsed and start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        check_aggregation_type(aggregation_type)
+        start_date_parsed, end_date_parsed, start_date2_parsed, end_date2_parsed = parse_periods(
+            start_date, end_date, start_date2, end_date2, aggregation_type, second_required=False
+        )
 
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             return {"period1": [], "period2": [], "changes": []}
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
-
-        if aggregation_type not in ["month", "week", "day"]:
-            raise ValueError("Неправильный aggregation type. Должно быть 'month', 'week', или 'day'.")
-
-        if aggregation_type == "month":
-            date_trunc = "month"
-            date_format = "%Y-%m"
-        elif aggregation_type == "week":
-            date_trunc = "week"
-            date_format = "%Y-%m-%d"
-        else:
-            date_trunc = "day"
-            date_format = "%Y-%m-%d"
+        subtree = self._subtree_condition(product)
 
         if cluster_id is not None:
-            cluster = await self._cluster_repo.get_by_id(session, cluster_id)
+            cluster = hierarchy.get_cluster(cluster_id)
             if not cluster:
                 return {"period1": [], "period2": [], "changes": []}
             clusters = [cluster]
         else:
-            clusters = await self._cluster_repo.get_all(session)
+            clusters = hierarchy.clusters
 
         if not clusters:
             return {"period1": [], "period2": [], "changes": []}
 
-        agg_date = func.date_trunc(date_trunc, Review.date).label("agg_date")
-        period1_query = select(
-            agg_date,
-            ReviewCluster.cluster_id,
-            func.count(func.distinct(Review.id)).label("total")
-        ).select_from(ReviewCluster)\
-        .join(Review).join(ReviewProduct).where(
-            and_(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date_parsed,
-                Review.date <= end_date_parsed,
-                ReviewCluster.cluster_id.in_([c.id for c in clusters])
-            )
-        )
-        if source:
-            period1_query = period1_query.where(Review.source == source)
-        period1_query = period1_query.group_by(
-            agg_date,
-            ReviewCluster.cluster_id
-        ).order_by(agg_date)
-
-        period1_result = await session.execute(period1_query)
-        period1_data = period1_result.all()
-
-        period1_dict = {}
         cluster_names = {c.id: c.name for c in clusters}
-        for row in period1_data:
-            agg_date_str = row.agg_date.strftime(date_format)
-            if agg_date_str not in period1_dict:
-                period1_dict[agg_date_str] = {}
-            cluster_name = cluster_names.get(row.cluster_id, f"Cluster_{row.cluster_id}")
-            period1_dict[agg_date_str][cluster_name] = row.total
-
-        period2_dict = {}
+        cluster_ids = [c.id for c in clusters]
+        agg_date = func.date_trunc(aggregation_type, ReviewProduct.review_date).label("agg_date")
+
+        periods = [(start_date_parsed, end_date_parsed)]
         if start_date2_parsed and end_date2_parsed:
-            period2_query = select(
+            periods.append((start_date2_parsed, end_date2_parsed))
+
+        async def load_periods() -> List[pd.DataFrame]:
+            """
+            Количество отзывов по интервалам и кластерам для всех периодов: помесячно без источника —
+            из ClusterStats, иначе одним сгруппированным запросом с колонкой на период
+            """
+            if aggregation_type == "month" and not source:
+                period_rows = []
+                for period_start, period_end in periods:
+                    rows = await self._cluster_stats_repo.get_monthly_review_counts(
+                        session, product_id, cluster_ids, period_start, period_end
+                    )
+                    period_rows.append(rows_frame(
+                        [(row.month, row.cluster_id, row.review_count) for row in rows],
+                        ["agg_date", "cluster_id", "total"]
+                    ))
+                return period_rows
+
+            in_periods = [
+                and_(ReviewProduct.review_date >= start, ReviewProduct.review_date <= end) for start, end in periods
+            ]
+            total_columns = [f"total_{i}" for i in range(len(periods))]
+            period_query = select(
                 agg_date,
                 ReviewCluster.cluster_id,
-                func.count(func.distinct(Review.id)).label("total")
+                *(
+                    func.count(func.distinct(case((in_period, ReviewProduct.review_id)))).label(column)
+                    for column, in_period in zip(total_columns, in_periods)
+                )
             ).select_from(ReviewCluster)\
-            .join(Review).join(ReviewProduct).where(
+            .join(ReviewProduct, review_cluster_link()).where(
                 and_(
-                    ReviewProduct.product_id.in_(product_ids),
-                    Review.date >= start_date2_parsed,
-                    Review.date <= end_date2_parsed,
-                    ReviewCluster.cluster_id.in_([c.id for c in clusters])
+                    subtree,
+                    or_(*in_periods),
+                    ReviewCluster.cluster_id.in_(cluster_ids)
                 )
             )
             if source:
-                period2_query = period2_query.where(Review.source == source)
-            period2_query = period2_query.group_by(
+                period_query = period_query.where(ReviewProduct.review_source == source)
+            period_query = period_query.group_by(
                 agg_date,
                 ReviewCluster.cluster_id
-            ).order_by(agg_date)
-
-            period2_result = await session.execute(period2_query)
-            period2_data = period2_result.all()
-
-            for row in period2_data:
-                agg_date_str = row.agg_date.strftime(date_format)
-                if agg_date_str not in period2_dict:
-                    period2_dict[agg_date_str] = {}
-                cluster_name = cluster_names.get(row.cluster_id, f"Cluster_{row.cluster_id}")
-                period2_dict[agg_date_str][cluster_name] = row.total
-
-        def generate_date_range(start: date, end: date, agg_type: str) -> List[str]:
-            result = []
-            current = start
-            if agg_type == "week":
-                days_to_monday = current.weekday()
-                current = current - timedelta(days=days_to_monday)
-            while current <= end:
-                if agg_type == "month":
-                    month_str = current.strftime("%Y-%m")
-                    result.append(month_str)
-                    if current.month == 12:
-                        current = date(current.year + 1, 1, 1)
-                    else:
-                        current = date(current.year, current.month + 1, 1)
-                elif agg_type == "week":
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=7)
-                else:
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=1)
-            return result
-
-        period1_dates = generate_date_range(start_date_parsed, end_date_parsed, aggregation_type)
-        period2_dates = generate_date_range(start_date2_parsed, end_date2_parsed, aggregation_type) if start_date2_parsed and end_date2_parsed else []
-
-        default_clusters = {c.name: 0 for c in clusters}
-        period1 = [
-            {
-                "aggregation": date,
-                "clusters": {**default_clusters, **period1_dict.get(date, {})}
-            }
-            for date in period1_dates
-        ]
+            )
+            frame = rows_frame((await session.execute(period_query)).all(), ["agg_date", "cluster_id", *total_columns])
+            return [
+                frame[["agg_date", "cluster_id", column]].rename(columns={column: "total"})
+                for column in total_columns
+            ]
 
-        period2 = [
-            {
-                "aggregation": date,
-                "clusters": {**default_clusters, **period2_dict.get(date, {})}
-            }
-            for date in period2_dates
+        frames = [
+            dense_frame(
+                frame, "agg_date", "cluster_id", "total",
+                bucket_labels(period_start, period_end, aggregation_type), cluster_ids, aggregation_type
+            ).rename(columns=cluster_names)
+            for frame, (period_start, period_end) in zip(await load_periods(), periods)
         ]
+        frame1 = frames[0]
+        frame2 = frames[1] if len(frames) > 1 else frame1.iloc[0:0]
 
-        changes = []
-        min_length = min(len(period1), len(period2))
-        
-        for i in range(min_length):
-            period1_item = period1[i]
-            period2_item = period2[i]
-            
-            period1_clusters = period1_item["clusters"]
-            period2_clusters = period2_item["clusters"]
-
-            percentage_change = {}
-            for cluster_name in default_clusters:
-                p1_count = period1_clusters[cluster_name]
-                p2_count = period2_clusters[cluster_name]
-                
-                if p2_count > 0:
-                    change_percent = round(((p1_count - p2_count) / p2_count * 100), 1)
-                elif p1_count > 0:
-                    change_percent = 100.0
-                elif p2_count > 0 and p1_count == 0:
-                    change_percent = -100.0
-                else:
-                    change_percent = 0.0 
-                    
-                percentage_change[cluster_name] = change_percent
-
-            changes.append({
-                "aggregation": period1_item["aggregation"],
-                "percentage_change": percentage_change
-            })
-
-        if len(period1) > min_length:
-            for i in range(min_length, len(period1)):
-                percentage_change = {}
-                for cluster_name in default_clusters:
-                    p1_count = period1_clusters[cluster_name]
-                    percentage_change[cluster_name] = -100.0 if p1_count > 0 else 0.0
-                    
-                changes.append({
-                    "aggregation": period1[i]["aggregation"],
-                    "percentage_change": percentage_change
-                })
-        elif len(period2) > min_length:
-            for i in range(min_length, len(period2)):
-                period2_clusters = period2[i]["clusters"]
-                percentage_change = {}
-                for cluster_name in default_clusters:
-                    p2_count = period2_clusters[cluster_name]
-                    percentage_change[cluster_name] = 100.0 if p2_count > 0 else 0.0
-                    
-                changes.append({
-                    "aggregation": period2[i]["aggregation"],
-                    "percentage_change": percentage_change
-                })
+        labels, current, previous = align_periods(frame1, frame2)
+        changes = percentage_change(current, previous).tolist()
+        names = list(frame1.columns)
 
         return {
-            "period1": period1,
-            "period2": period2,
-            "changes": changes
-        }                                                 
-    
+            "period1": [{"aggregation": label, "clusters": counts} for label, counts in frame1.to_dict("index").items()],
+            "period2": [{"aggregation": label, "clusters": counts} for label, counts in frame2.to_dict("index").items()],
+            "changes": [
+                {"aggregation": label, "percentage_change": dict(zip(names, row))}
+                for label, row in zip(labels, changes)
+            ]
+        }
+
     async def get_tonality_pie_chart(
         self, session: AsyncSession, product_id: int, start_date: str, end_date: str,
         start_date2: str, end_date2: str, source: Optional[str] = None
     ) -> Dict[str, Any]:
-        def parse_date(date_str: str) -> date:
-            try:
-                return datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError as e:
-                raise ValueError(f"Неправильный формат даты {date_str}. Ожидается YYYY-MM-DD") from e
-
-        try:
-            start_date_parsed = parse_date(start_date)
-            end_date_parsed = parse_date(end_date)
-            start_date2_parsed = parse_date(start_date2)
-            end_date2_parsed = parse_date(end_date2)
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        start_date_parsed, end_date_parsed, start_date2_parsed, end_date2_parsed = parse_periods(
+            start_date, end_date, start_date2, end_date2, "day"
+        )
 
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             return {
                 "period1": {"labels": [], "data": [], "colors": [], "total": 0, "absolute_data": {}},
@@ -1135,73 +671,29 @@ class StatsService:
                 "changes": {"labels": [], "percentage_point_changes": [], "absolute_changes": {}}
             }
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
-
-        total1 = await self._review_repo.count_by_product_and_period(session, product_ids, start_date_parsed, end_date_parsed, source)
-        tonality1 = await self._review_repo.get_tonality_counts_by_product_and_period(session, product_ids, start_date_parsed, end_date_parsed, source)
-        
-        absolute_data1 = {
-            "negative": tonality1.get('negative', 0),
-            "neutral": tonality1.get('neutral', 0),
-            "positive": tonality1.get('positive', 0)
-        }
-        
-        if total1 > 0:
-            data1 = [
-                round(tonality1.get('negative', 0) / total1 * 100, 1),
-                round(tonality1.get('neutral', 0) / total1 * 100, 1),
-                round(tonality1.get('positive', 0) / total1 * 100, 1)
-            ]
-        else:
-            data1 = [0.0, 0.0, 0.0]
-
-        total2 = await self._review_repo.count_by_product_and_period(session, product_ids, start_date2_parsed, end_date2_parsed, source)
-        tonality2 = await self._review_repo.get_tonality_counts_by_product_and_period(session, product_ids, start_date2_parsed, end_date2_parsed, source)
-        
-        absolute_data2 = {
-            "negative": tonality2.get('negative', 0),
-            "neutral": tonality2.get('neutral', 0),
-            "positive": tonality2.get('positive', 0)
-        }
-        
-        if total2 > 0:
-            data2 = [
-                round(tonality2.get('negative', 0) / total2 * 100, 1),
-                round(tonality2.get('neutral', 0) / total2 * 100, 1),
-                round(tonality2.get('positive', 0) / total2 * 100, 1)
-            ]
-        else:
-            data2 = [0.0, 0.0, 0.0]
-
-        percentage_point_changes = [data1[i] - data2[i] for i in range(3)]
-        
-        absolute_changes = {
-            "negative": absolute_data1["negative"] - absolute_data2["negative"],
-            "neutral": absolute_data1["neutral"] - absolute_data2["neutral"],
-            "positive": absolute_data1["positive"] - absolute_data2["positive"]
-        }
-        
-        percentage_changes = []
-        for i in range(3):
-            p1_value = data1[i]
-            p2_value = data2[i]
-
-            if p2_value > 0:
-                percentage_change = round(((p1_value - p2_value) / p2_value * 100), 1)
-            elif p1_value > 0:
-                percentage_change = 100.0 
-            elif p2_value > 0 and p1_value == 0:
-                percentage_change = -100.0 
-            else:
-                percentage_change = 0.0 
-                
-            percentage_changes.append(percentage_change)
-
         labels = ["negative", "neutral", "positive"]
+        tonality1 = await self._review_daily_fact_repo.get_totals(
+            session, product_id, start_date_parsed, end_date_parsed, source=source
+        )
+        tonality2 = await self._review_daily_fact_repo.get_totals(
+            session, product_id, start_date2_parsed, end_date2_parsed, source=source
+        )
+        total1 = tonality1["count"]
+        total2 = tonality2["count"]
+
+        counts1 = np.array([tonality1.get(label, 0) for label in labels])
+        counts2 = np.array([tonality2.get(label, 0) for label in labels])
+        shares1 = shares(counts1, total1)
+        shares2 = shares(counts2, total2)
+
+        absolute_data1 = dict(zip(labels, counts1.tolist()))
+        absolute_data2 = dict(zip(labels, counts2.tolist()))
+        data1 = shares1.tolist()
+        data2 = shares2.tolist()
+        percentage_point_changes = (shares1 - shares2).tolist()
+        absolute_changes = dict(zip(labels, (counts1 - counts2).tolist()))
+        percentage_changes = percentage_change(shares1, shares2).tolist()
+
         colors = ["red", "yellow", "green"]
 
         return {
@@ -1231,249 +723,71 @@ class StatsService:
         self, session: AsyncSession, product_id: int, start_date: str, end_date: str,
         start_date2: str, end_date2: str, aggregation_type: str, source: Optional[str] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        def parse_date(date_str: str, agg_type: str, is_start_date: bool) -> date:
-            """Парсинг даты с агрегацией."""
-            try:
-                if agg_type == "month":
-                    year, month = map(int, date_str.split("-"))
-                    if is_start_date:
-                        parsed_date = datetime(year, month, 1).date()
-                    else:
-                        _, last_day = monthrange(year, month)
-                        parsed_date = datetime(year, month, last_day).date()
-                else:
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                return parsed_date
-            except ValueError as e:
-                raise ValueError(f"Неправильный форммат даты {date_str}. Ожидается {'YYYY-MM' if agg_type == 'month' else 'YYYY-MM-DD'}") from e
-
-        try:
-            start_date_parsed = parse_date(start_date, aggregation_type, True)
-            end_date_parsed = parse_date(end_date, aggregation_type, False)
-            start_date2_parsed = parse_date(start_date2, aggregation_type, True)
-            end_date2_parsed = parse_date(end_date2, aggregation_type, False)
-        except ValueError as e:
-            raise ValueError(str(e))
-
-        if start_date_parsed > end_date_parsed:
-            raise ValueError("start_date должна быть до или равна end_date")
-        if start_date2_parsed > end_date2_parsed:
-            raise ValueError("start_date2 должна быть до или равна end_date2")
+        check_aggregation_type(aggregation_type)
+        start, end, start2, end2 = parse_periods(start_date, end_date, start_date2, end_date2, aggregation_type)
 
-        product = await self._product_repo.get_by_id(session, product_id)
-        if not product:
+        hierarchy = await self._product_hierarchy.get(session)
+        if not hierarchy.get_node(product_id):
             return {"period1": [], "period2": [], "changes": []}
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
-
-        if aggregation_type not in ["month", "week", "day"]:
-            raise ValueError("Неправильный aggregation type. Должно быть 'month', 'week', или 'day'.")
-
-        if aggregation_type == "month":
-            date_trunc = "month"
-            date_format = "%Y-%m"
-        elif aggregation_type == "week":
-            date_trunc = "week"
-            date_format = "%Y-%m-%d"
-        else:
-            date_trunc = "day"
-            date_format = "%Y-%m-%d"
-
-        sentiments = ['positive', 'neutral', 'negative']
         colors = {'positive': 'green', 'neutral': 'yellow', 'negative': 'red'}
 
-        agg_date = func.date_trunc(date_trunc, Review.date).label("agg_date")
-        period1_query = select(
-            agg_date,
-            ReviewProduct.sentiment,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
-            and_(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date_parsed,
-                Review.date <= end_date_parsed,
-                ReviewProduct.sentiment.isnot(None)
-            )
+        frame1, frame2 = await self._load_period_frames(
+            session, product_id, [(start, end), (start2, end2)], aggregation_type, source=source
         )
-        if source:
-            period1_query = period1_query.where(Review.source == source)
-        period1_query = period1_query.group_by(agg_date, ReviewProduct.sentiment).order_by(agg_date)
-        period1_result = await session.execute(period1_query)
-        period1_data_raw = period1_result.all()
-
-        period1_dict = {}
-        for row in period1_data_raw:
-            agg_date_str = row.agg_date.strftime(date_format)
-            if agg_date_str not in period1_dict:
-                period1_dict[agg_date_str] = {sentiment: 0 for sentiment in sentiments}
-            period1_dict[agg_date_str][row.sentiment] = row.count
-
-        period2_query = select(
-            agg_date,
-            ReviewProduct.sentiment,
-            func.count(func.distinct(Review.id)).label("count")
-        ).join(ReviewProduct).where(
-            and_(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= start_date2_parsed,
-                Review.date <= end_date2_parsed,
-                ReviewProduct.sentiment.isnot(None)
-            )
-        )
-        if source:
-            period2_query = period2_query.where(Review.source == source)
-        period2_query = period2_query.group_by(agg_date, ReviewProduct.sentiment).order_by(agg_date)
-        period2_result = await session.execute(period2_query)
-        period2_data_raw = period2_result.all()
-
-        period2_dict = {}
-        for row in period2_data_raw:
-            agg_date_str = row.agg_date.strftime(date_format)
-            if agg_date_str not in period2_dict:
-                period2_dict[agg_date_str] = {sentiment: 0 for sentiment in sentiments}
-            period2_dict[agg_date_str][row.sentiment] = row.count
-
-        def generate_date_range(start: date, end: date, agg_type: str) -> List[str]:
-            result = []
-            current = start
-            if agg_type == "week":
-                days_to_monday = current.weekday()
-                current = current - timedelta(days=days_to_monday)
-            while current <= end:
-                if agg_type == "month":
-                    month_str = current.strftime("%Y-%m")
-                    result.append(month_str)
-                    if current.month == 12:
-                        current = date(current.year + 1, 1, 1)
-                    else:
-                        current = date(current.year, current.month + 1, 1)
-                elif agg_type == "week":
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=7)
-                else:
-                    result.append(current.strftime("%Y-%m-%d"))
-                    current += timedelta(days=1)
-            return result
-
-        period1_dates = generate_date_range(start_date_parsed, end_date_parsed, aggregation_type)
-        period2_dates = generate_date_range(start_date2_parsed, end_date2_parsed, aggregation_type)
-
-        period1_data = []
-        for date_str in period1_dates:
-            tonality_data = period1_dict.get(date_str, {sentiment: 0 for sentiment in sentiments})
-            tonalities = []
-            for sentiment in sentiments:
-                tonalities.append({
-                    "sentiment": sentiment,
-                    "count": tonality_data[sentiment],
-                    "color": colors[sentiment]
-                })
-            period1_data.append({
-                "date": date_str,
-                "tonalities": tonalities
-            })
-
-        period2_data = []
-        for date_str in period2_dates:
-            tonality_data = period2_dict.get(date_str, {sentiment: 0 for sentiment in sentiments})
-            tonalities = []
-            for sentiment in sentiments:
-                tonalities.append({
-                    "sentiment": sentiment,
-                    "count": tonality_data[sentiment],
-                    "color": colors[sentiment]
-                })
-            period2_data.append({
-                "date": date_str,
-                "tonalities": tonalities
-            })
-
-        changes = []
-        min_length = min(len(period1_data), len(period2_data))
-        
-        for i in range(min_length):
-            p1_item = period1_data[i]
-            p2_item = period2_data[i]
-            
-            change_data = {"date": p1_item["date"], "tonalities": []}
-            
-            for p1_tonality, p2_tonality in zip(p1_item["tonalities"], p2_item["tonalities"]):
-                absolute_change = p1_tonality["count"] - p2_tonality["count"]
-                
-                if p2_tonality["count"] > 0:
-                    percentage_change = round((absolute_change / p2_tonality["count"] * 100), 1)
-                elif p1_tonality["count"] > 0:
-                    percentage_change = 100.0
-                elif p2_tonality["count"] > 0 and p1_tonality["count"] == 0:
-                    percentage_change = -100.0 
-                else:
-                    percentage_change = 0.0 
-                
-                change_data["tonalities"].append({
-                    "sentiment": p1_tonality["sentiment"],
-                    "change": absolute_change,
-                    "change_percent": percentage_change, 
-                    "color": p1_tonality["color"]
-                })
-            
-            changes.append(change_data)
-
-        if len(period1_data) > min_length:
-            for i in range(min_length, len(period1_data)):
-                change_data = {"date": period1_data[i]["date"], "tonalities": []}
-                for tonality in period1_data[i]["tonalities"]:
-                    absolute_change = tonality["count"]
-                    percentage_change = 100.0 if tonality["count"] > 0 else 0.0 
-                    
-                    change_data["tonalities"].append({
-                        "sentiment": tonality["sentiment"],
-                        "change": absolute_change,
-                        "change_percent": percentage_change,
-                        "color": tonality["color"]
-                    })
-                changes.append(change_data)
-        
-        elif len(period2_data) > min_length:
-            for i in range(min_length, len(period2_data)):
-                change_data = {"date": period2_data[i]["date"], "tonalities": []}
-                for tonality in period2_data[i]["tonalities"]:
-                    absolute_change = -tonality["count"] 
-                    percentage_change = -100.0 if tonality["count"] > 0 else 0.0 
-                    
-                    change_data["tonalities"].append({
-                        "sentiment": tonality["sentiment"],
-                        "change": absolute_change,
-                        "change_percent": percentage_change,
-                        "color": tonality["color"]
-                    })
-                changes.append(change_data)
+        labels, current, previous = align_periods(frame1[list(SENTIMENTS)], frame2[list(SENTIMENTS)])
+        absolute_changes = (current - previous).astype("int64").tolist()
+        percentage_changes = percentage_change(current, previous).tolist()
+
+        def period_data(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+            return [
+                {
+                    "date": label,
+                    "tonalities": [
+                        {"sentiment": sentiment, "count": counts[sentiment], "color": colors[sentiment]}
+                        for sentiment in SENTIMENTS
+                    ]
+                }
+                for label, counts in frame.to_dict("index").items()
+            ]
 
         return {
-            "period1": period1_data,
-            "period2": period2_data,
-            "changes": changes
+            "period1": period_data(frame1),
+            "period2": period_data(frame2),
+            "changes": [
+                {
+                    "date": label,
+                    "tonalities": [
+                        {
+                            "sentiment": sentiment,
+                            "change": change,
+                            "change_percent": change_percent,
+                            "color": colors[sentiment]
+                        }
+                        for sentiment, change, change_percent in zip(SENTIMENTS, change_row, percent_row)
+                    ]
+                }
+                for label, change_row, percent_row in zip(labels, absolute_changes, percentage_changes)
+            ]
         }
 
     async def _get_weighted_count_by_month(self, session: AsyncSession, product_id: int, cluster_id: int, month_date: date) -> int:
-        end_month = month_date + timedelta(days=31)
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             return 0
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids = [product_id]
+        if month_date.day == 1:
+            weight = await self._cluster_stats_repo.get_weighted_count(session, product_id, cluster_id, month_date)
+            return int(weight)
+
+        end_month = month_date + timedelta(days=31)
+        subtree = self._subtree_condition(product)
 
-        statement = select(func.sum(ReviewCluster.topic_weight)).join(Review).join(ReviewProduct).where(
+        statement = select(func.sum(ReviewCluster.topic_weight)).join(ReviewProduct, review_cluster_link()).where(
             and_(
-                ReviewProduct.product_id.in_(product_ids),
-                Review.date >= month_date,
-                Review.date < end_month,
+                subtree,
+                ReviewProduct.review_date >= month_date,
+                ReviewProduct.review_date < end_month,
                 ReviewCluster.cluster_id == cluster_id
             )
         )
@@ -1481,85 +795,72 @@ class StatsService:
         weight = result.scalar() or 0
         return int(weight)
 
+    @staticmethod
+    def _encode_review_cursor(review) -> str:
+        raw = f"{review.date.isoformat()}:{review.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_review_cursor(cursor: str) -> Tuple[date, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            date_str, review_id = raw.split(":")
+            return datetime.strptime(date_str, "%Y-%m-%d").date(), int(review_id)
+        except ValueError as e:
+            raise ValueError("Неправильный cursor") from e
+
     async def get_reviews(
         self, session: AsyncSession, product_id: int, start_date: Optional[date] = None, 
         end_date: Optional[date] = None, cluster_id: Optional[int] = None, 
         source: Optional[str] = None, sentiment: Optional[str] = None,
-        order_by: str = "desc", page: int = 0, size: int = 30
+        order_by: str = "desc", page: int = 0, size: int = 30,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
-        import logging
-        logging.basicConfig(level=logging.DEBUG)
-        logger = logging.getLogger(__name__)
-
+        """
+        Лента отзывов узла в порядке (date, id). С cursor страница берётся по ключу последнего
+        отзыва предыдущей (next_cursor ответа), page тогда игнорируется; без cursor — по номеру страницы.
+        total без cluster_id берётся из дневных агрегатов, с cluster_id это оценка планировщика
+        (total_is_estimate); точное значение считает count_reviews.
+        """
         logger.debug(f"Fetching reviews for product_id={product_id}, cluster_id={cluster_id}, source={source}, sentiment={sentiment}, start_date={start_date}, end_date={end_date}, order_by={order_by}, page={page}, size={size}")
 
         if order_by not in ["asc", "desc"]:
             raise ValueError("order_by должен быть 'asc' или 'desc'")
 
-        product = await self._product_repo.get_by_id(session, product_id)
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
         if not product:
             logger.warning(f"Product with ID {product_id} not found")
-            return {"total": 0, "reviews": []}
+            return {"total": 0, "total_is_estimate": False, "next_cursor": None, "reviews": []}
 
-        if product.type in [ProductType.CATEGORY, ProductType.SUBCATEGORY]:
-            descendants = await self._product_repo.get_all_descendants(session, product_id)
-            product_ids_for_filter = [p.id for p in descendants] + [product_id]
-        else:
-            product_ids_for_filter = [product_id]
-
-        count_subquery = select(Review.id).join(ReviewProduct).where(
-            ReviewProduct.product_id.in_(product_ids_for_filter)
-        ).distinct()
-
-        if start_date:
-            count_subquery = count_subquery.where(Review.date >= start_date)
-        if end_date:
-            count_subquery = count_subquery.where(Review.date <= end_date)
-        if source:
-            count_subquery = count_subquery.where(Review.source == source)
-        if sentiment:
-            count_subquery = count_subquery.where(ReviewProduct.sentiment == sentiment)
-        if cluster_id:
-            count_subquery = count_subquery.join(ReviewCluster).where(ReviewCluster.cluster_id == cluster_id)
-
-        count_statement = select(func.count()).select_from(count_subquery.subquery())
-        count_result = await session.execute(count_statement)
-        total_count = count_result.scalar() or 0
-        logger.debug(f"Total reviews count: {total_count}")
-
-        statement = select(Review).join(ReviewProduct).where(
-            ReviewProduct.product_id.in_(product_ids_for_filter)
-        ).distinct()
-
-        if start_date:
-            statement = statement.where(Review.date >= start_date)
-        if end_date:
-            statement = statement.where(Review.date <= end_date)
-        if source:
-            statement = statement.where(Review.source == source)
-        if sentiment:
-            statement = statement.where(ReviewProduct.sentiment == sentiment)
-        if cluster_id:
-            statement = statement.join(ReviewCluster).where(ReviewCluster.cluster_id == cluster_id)
-
-        if order_by == "asc":
-            statement = statement.order_by(Review.date.asc())
+        after = self._decode_review_cursor(cursor) if cursor else None
+        conditions = self._review_repo.feed_conditions(
+            self._subtree_condition(product), start_date, end_date, source, sentiment, cluster_id
+        )
+
+        if not cluster_id:
+            totals = await self._review_daily_fact_repo.get_totals(
+                session, product_id, start_date or date.min, end_date or date.max, source=source
+            )
+            total_count = totals[sentiment] if sentiment else totals["count"]
+            total_is_estimate = False
         else:
-            statement = statement.order_by(Review.date.desc())
-        
-        statement = statement.offset(page * size).limit(size)
+            total_count = await self._review_repo.estimate_feed_count(session, conditions)
+            total_is_estimate = True
+        logger.debug(f"Total reviews count: {total_count} (estimate={total_is_estimate})")
 
-        result = await session.execute(statement)
-        reviews = result.scalars().all()
-        logger.debug(f"Retrieved {len(reviews)} reviews for page {page}")
+        reviews = await self._review_repo.get_feed_page(
+            session, conditions, order_by, size, after=after, offset=0 if after else page * size
+        )
+        logger.debug(f"Retrieved {len(reviews)} reviews for page {page}, cursor={cursor}")
+        next_cursor = self._encode_review_cursor(reviews[-1]) if len(reviews) == size else None
 
-        review_ids = [r.id for r in reviews]
         product_info_query = select(
             ReviewProduct.review_id, 
             ReviewProduct.product_id,
             ReviewProduct.sentiment,
             ReviewProduct.sentiment_score
-        ).where(ReviewProduct.review_id.in_(review_ids))
+        ).where(*review_links_condition((r.id, r.date) for r in reviews))
         
         product_info_result = await session.execute(product_info_query)
         review_product_map = {}
@@ -1604,7 +905,6 @@ class StatsService:
                 "source": review.source,
                 "created_at": review.created_at,
                 "product_ids": all_product_ids,
-                "product_sentiments": all_sentiments
             }
             reviews_result.append(review_dict)
         
@@ -1612,16 +912,29 @@ class StatsService:
         
         return {
             "total": total_count,
+            "total_is_estimate": total_is_estimate,
+            "next_cursor": next_cursor,
             "reviews": reviews_result
         }
 
+    async def count_reviews(
+        self, session: AsyncSession, product_id: int, start_date: Optional[date] = None,
+        end_date: Optional[date] = None, cluster_id: Optional[int] = None,
+        source: Optional[str] = None, sentiment: Optional[str] = None
+    ) -> int:
+        """Точное количество отзывов ленты get_reviews с теми же фильтрами"""
+        hierarchy = await self._product_hierarchy.get(session)
+        product = hierarchy.get_node(product_id)
+        if not product:
+            return 0
+        conditions = self._review_repo.feed_conditions(
+            self._subtree_condition(product), start_date, end_date, source, sentiment, cluster_id
+        )
+        return await self._review_repo.count_feed(session, conditions)
+
     async def create_reviews_bulk(
         self, session: AsyncSession, reviews_data: ReviewBulkCreate
     ) -> Dict[str, Any]:
-        import logging
-        logging.basicConfig(level=logging.DEBUG)
-        logger = logging.getLogger(__name__)
-
         logger.debug(f"Creating {len(reviews_data.data)} reviews for model processing")
 
         current_time = datetime.utcnow()
@@ -1675,7 +988,3 @@ class StatsService:
             }
             for review in unprocessed_reviews
         ]
-
-    def _get_color_for_cluster(self, cluster_id: int) -> str:
-        colors = ["blue", "cyan", "pink", "purple", "green"]
-        return colors[cluster_id % len(colors)] 
\ No newline at end of file
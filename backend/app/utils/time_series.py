@@ -0,0 +1,128 @@
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+AGGREGATION_TYPES = ("month", "week", "day")
+AGGREGATION_FORMATS = {"month": "%Y-%m", "week": "%Y-%m-%d", "day": "%Y-%m-%d"}
+SENTIMENTS = ("positive", "neutral", "negative")
+
+
+def check_aggregation_type(aggregation_type: str) -> str:
+    if aggregation_type not in AGGREGATION_TYPES:
+        raise ValueError("Неправильный aggregation type. Должно быть 'month', 'week', или 'day'.")
+    return aggregation_type
+
+
+def parse_period_date(date_str: str, aggregation_type: Optional[str], is_start_date: bool) -> date:
+    """
+    Граница периода: для month — YYYY-MM (первый или последний день месяца),
+    без типа агрегации — YYYY-MM-DD или YYYY-MM, иначе — YYYY-MM-DD
+    """
+    month_only = aggregation_type == "month" or (aggregation_type is None and len(date_str.split("-")) == 2)
+    try:
+        if month_only:
+            year, month = map(int, date_str.split("-"))
+            return date(year, month, 1 if is_start_date else monthrange(year, month)[1])
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError as e:
+        if aggregation_type is None:
+            expected = "YYYY-MM-DD или YYYY-MM"
+        else:
+            expected = "YYYY-MM" if aggregation_type == "month" else "YYYY-MM-DD"
+        raise ValueError(f"Неправильный формат даты {date_str}. Ожидается {expected}") from e
+
+
+def parse_periods(
+    start_date: str, end_date: str, start_date2: Optional[str], end_date2: Optional[str],
+    aggregation_type: Optional[str] = None, second_required: bool = True
+) -> Tuple[date, date, Optional[date], Optional[date]]:
+    """Разобрать и проверить границы двух периодов; без second_required второй период может отсутствовать"""
+    start = parse_period_date(start_date, aggregation_type, is_start_date=True)
+    end = parse_period_date(end_date, aggregation_type, is_start_date=False)
+    if second_required or start_date2:
+        start2 = parse_period_date(start_date2, aggregation_type, is_start_date=True)
+    else:
+        start2 = None
+    if second_required or end_date2:
+        end2 = parse_period_date(end_date2, aggregation_type, is_start_date=False)
+    else:
+        end2 = None
+
+    if start > end:
+        raise ValueError("start_date должна быть до или равна end_date")
+    if start2 and end2 and start2 > end2:
+        raise ValueError("start_date2 должна быть до или равна end_date2")
+    return start, end, start2, end2
+
+
+def bucket_labels(start: date, end: date, aggregation_type: str) -> List[str]:
+    """Подписи всех интервалов агрегации периода, включая пустые; неделя начинается с понедельника"""
+    if aggregation_type == "month":
+        index = pd.date_range(start.replace(day=1), end, freq="MS")
+    elif aggregation_type == "week":
+        index = pd.date_range(start - timedelta(days=start.weekday()), end, freq="7D")
+    else:
+        index = pd.date_range(start, end, freq="D")
+    return index.strftime(AGGREGATION_FORMATS[aggregation_type]).tolist()
+
+
+def rows_frame(rows: Iterable[Any], columns: Sequence[str]) -> pd.DataFrame:
+    """Строки результата запроса в DataFrame с заданными именами колонок"""
+    return pd.DataFrame.from_records([tuple(row) for row in rows], columns=list(columns))
+
+
+def dense_frame(
+    frame: pd.DataFrame, bucket_column: str, key_column: str, value_column: str,
+    labels: List[str], keys: Sequence[Any], aggregation_type: str
+) -> pd.DataFrame:
+    """
+    Плотная таблица интервалы × ключи (кластеры, тональности) из сгруппированных строк:
+    отсутствующие интервалы и ключи заполняются нулями, строки вне labels отбрасываются
+    """
+    if frame.empty:
+        return pd.DataFrame(0, index=pd.Index(labels), columns=pd.Index(list(keys)), dtype="int64")
+    date_format = AGGREGATION_FORMATS[aggregation_type]
+    table = frame.assign(
+        _label=frame[bucket_column].map(lambda value: value.strftime(date_format))
+    ).pivot_table(index="_label", columns=key_column, values=value_column, aggfunc="sum", fill_value=0)
+    return table.reindex(index=labels, columns=list(keys), fill_value=0).astype("int64")
+
+
+def percentage_change(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """
+    Изменение current относительно previous в процентах с точностью 0.1:
+    при нулевой базе — 100, если значение появилось, и 0, если оба нулевые
+    """
+    current = np.asarray(current, dtype="float64")
+    previous = np.asarray(previous, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = np.round((current - previous) / previous * 100, 1)
+    return np.where(previous > 0, relative, np.where(current > 0, 100.0, 0.0))
+
+
+def shares(counts: np.ndarray, total: float) -> np.ndarray:
+    """Доли в процентах с точностью 0.1; при нулевом итоге — нули"""
+    counts = np.asarray(counts, dtype="float64")
+    if total <= 0:
+        return np.zeros_like(counts)
+    return np.round(counts / total * 100, 1)
+
+
+def align_periods(
+    frame1: pd.DataFrame, frame2: pd.DataFrame
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Сопоставить интервалы двух периодов по порядковому номеру. Более короткий период дополняется нулями,
+    подписи берутся из первого периода, а за его пределами — из второго.
+    """
+    length = max(len(frame1), len(frame2))
+    labels = list(frame1.index) + list(frame2.index[len(frame1):])
+
+    def padded(frame: pd.DataFrame) -> np.ndarray:
+        values = frame.to_numpy(dtype="float64")
+        return np.vstack([values, np.zeros((length - len(frame), frame.shape[1]))]) if len(frame) < length else values
+
+    return labels, padded(frame1), padded(frame2)